@@ -1,9 +1,15 @@
+import sys
 from datetime import datetime, timedelta
 from pathlib import Path
-import time
 
 import pandas as pd
-import requests
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+SRC_DIR = PROJECT_ROOT / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+from capastudy.carriers.common import get_http_client
 
 SCRIPT_DIR = Path(__file__).resolve().parent
 INPUT_XLSX = SCRIPT_DIR / "msk_service_port_seq_filled.xlsx"
@@ -64,19 +70,8 @@ def build_payload(start_geo_id, end_geo_id):
 
 def request_adjacent(start_geo_id, end_geo_id):
     payload = build_payload(start_geo_id, end_geo_id)
-    last_error = None
-    for attempt in range(1, 4):
-        try:
-            response = requests.post(QUERY_URL, headers=HEADERS, json=payload, timeout=60)
-            response.raise_for_status()
-            data = response.json()
-            return data.get("routings") if isinstance(data, dict) else []
-        except Exception as exc:
-            last_error = exc
-            if attempt < 3:
-                time.sleep(attempt * 2)
-            else:
-                raise last_error
+    data = get_http_client().request_json("POST", QUERY_URL, headers=HEADERS, json=payload, timeout=60)
+    return data.get("routings") if isinstance(data, dict) else []
 
 
 def pick_routing(service_code, routings):
@@ -1,9 +1,16 @@
 import csv
 import re
+import sys
 from pathlib import Path
 
 import pandas as pd
-import requests
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+SRC_DIR = PROJECT_ROOT / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+from capastudy.carriers.common import get_http_client
 
 SCRIPT_DIR = Path(__file__).resolve().parent
 SERVICE_PORT_SEQ_XLSX = SCRIPT_DIR / "msk_service_port_seq.xlsx"
@@ -96,15 +103,14 @@ def simplify_text(value):
 
 
 def download_locations_csv():
-    response = requests.get(LOCATIONS_URL, headers=DOWNLOAD_HEADERS, timeout=60)
-    response.raise_for_status()
+    response = get_http_client().get(LOCATIONS_URL, headers=DOWNLOAD_HEADERS, timeout=60)
     LOCATIONS_CSV.write_bytes(response.content)
     return LOCATIONS_CSV
 
 
 def fetch_online_candidates(port_name):
     def one_query(term):
-        response = requests.get(
+        response = get_http_client().get(
             LOOKUP_URL,
             headers=LOOKUP_HEADERS,
             params={
@@ -114,6 +120,7 @@ def fetch_online_candidates(port_name):
                 "type": "city",
             },
             timeout=30,
+            raise_for_status=False,
         )
         if response.status_code == 404:
             return pd.DataFrame()
@@ -0,0 +1,312 @@
+from __future__ import annotations
+
+import argparse
+import copy
+import gc
+import json
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from capastudy.settings import CSL_DIR, MSC_DIR, MSK_DIR
+
+
+CSL_PAYLOADS = [CSL_DIR / "csl_response.json", *sorted((CSL_DIR / "artifacts").glob("csl_schedule_response_*.json"))]
+MSC_PAYLOADS = [MSC_DIR / "msc_response.json"]
+MSK_PAYLOADS = [MSK_DIR / "response.json"]
+DEFAULT_SCALES = (1, 10, 100)
+CARRIERS = ("csl", "msc", "msk")
+
+# A case returns (input_rows, run) where run() performs the measured work and returns its output rows.
+Case = Callable[[int], Tuple[int, Callable[[], object]]]
+
+
+def load_json(path: Path) -> object:
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def copy_suffix(copy_index: int) -> str:
+    return "" if copy_index == 0 else f"~{copy_index}"
+
+
+def scale_csl_rows(rows: List[dict], factor: int) -> List[dict]:
+    scaled = []
+    for copy_index in range(factor):
+        suffix = copy_suffix(copy_index)
+        for row in rows:
+            cloned = dict(row)
+            cloned["vesselCode"] = f"{row.get('vesselCode') or ''}{suffix}"
+            scaled.append(cloned)
+    return scaled
+
+
+def scale_msc_response(response_json: dict, factor: int) -> dict:
+    sailings = []
+    for copy_index in range(factor):
+        suffix = copy_suffix(copy_index)
+        for sailing in response_json.get("Data") or []:
+            cloned = copy.deepcopy(sailing)
+            for route in cloned.get("Routes") or []:
+                for leg in route.get("RouteScheduleLegDetails") or []:
+                    vessel = leg.get("Vessel") or {}
+                    vessel["VesselImoCode"] = f"{vessel.get('VesselImoCode') or ''}{suffix}"
+            sailings.append(cloned)
+    return {**response_json, "Data": sailings}
+
+
+def msk_items_from_routings(response_json: dict) -> Dict[Tuple[str, str], List[dict]]:
+    # The recorded MSK payload is a routings response; flatten each leg end into a port-calls item.
+    items_by_port: Dict[Tuple[str, str], List[dict]] = {}
+    for routing in response_json.get("routings") or []:
+        for leg in routing.get("routingLegs") or []:
+            carriage = leg.get("carriage") or {}
+            vessel = carriage.get("vessel") or {}
+            for end_key in ("vesselPortCallStart", "vesselPortCallEnd"):
+                call = carriage.get(end_key) or {}
+                facility = (call.get("location") or {}).get("facility") or {}
+                geo_codes = [
+                    code.get("alternativeCode")
+                    for code in facility.get("alternativeCodes") or []
+                    if code.get("alternativeCodeType") == "GEO_ID"
+                ]
+                port_key = (facility.get("facilityCode") or "", geo_codes[0] if geo_codes else "")
+                arrival_service = call.get("arrivalService") or {}
+                departure_service = call.get("departureService") or {}
+                items_by_port.setdefault(port_key, []).append(
+                    {
+                        "vesselMaerskCode": vessel.get("vesselMaerskCode"),
+                        "vesselName": vessel.get("vesselName"),
+                        "arrivalServiceName": arrival_service.get("serviceName"),
+                        "arrivalServiceCode": arrival_service.get("serviceCode"),
+                        "arrivalVoyageNumber": call.get("arrivalVoyageNumber") or call.get("departureVoyageNumber"),
+                        "departureServiceName": departure_service.get("serviceName"),
+                        "departureServiceCode": departure_service.get("serviceCode"),
+                        "departureVoyageNumber": call.get("departureVoyageNumber") or call.get("arrivalVoyageNumber"),
+                        "arrivalTime": call.get("estimatedTimeOfArrival"),
+                        "departureTime": call.get("estimatedTimeOfDeparture"),
+                        "marineContainerTerminalRKSTCode": facility.get("facilityCode"),
+                        "marineContainerTerminalGeoCode": port_key[1],
+                    }
+                )
+    return items_by_port
+
+
+def scale_msk_items(items_by_port: Dict[Tuple[str, str], List[dict]], factor: int) -> Dict[Tuple[str, str], List[dict]]:
+    scaled: Dict[Tuple[str, str], List[dict]] = {}
+    for port_key, items in items_by_port.items():
+        port_items = scaled.setdefault(port_key, [])
+        for copy_index in range(factor):
+            suffix = copy_suffix(copy_index)
+            for item in items:
+                cloned = dict(item)
+                cloned["vesselMaerskCode"] = f"{item.get('vesselMaerskCode') or ''}{suffix}"
+                port_items.append(cloned)
+    return scaled
+
+
+def build_csl_cases() -> Dict[str, Case]:
+    from capastudy.carriers import csl_fetch
+
+    base_rows: List[dict] = []
+    for path in CSL_PAYLOADS:
+        if path.exists():
+            for row in csl_fetch.extract_port_call_rows(load_json(path)):
+                cloned = dict(row)
+                cloned["QueryPorts"] = [path.stem]
+                base_rows.append(cloned)
+    try:
+        service_rules = csl_fetch.load_service_rules()
+    except (OSError, ValueError):
+        service_rules = {}
+
+    def parse_case(scale: int):
+        rows = scale_csl_rows(base_rows, scale)
+        return len(rows), lambda: csl_fetch.parse_tables_from_rows(rows, service_rules)[1]
+
+    def dedupe_case(scale: int):
+        rows = scale_csl_rows(base_rows, scale)
+        return len(rows), lambda: csl_fetch.dedupe_port_calls(rows)
+
+    return {"csl.parse_tables_from_rows": parse_case, "csl.dedupe_port_calls": dedupe_case}
+
+
+def build_msc_cases() -> Dict[str, Case]:
+    from capastudy.carriers import msc_fetch
+
+    responses = [load_json(path) for path in MSC_PAYLOADS if path.exists()]
+
+    def route_inputs(scale: int):
+        inputs = []
+        for response_json in responses:
+            scaled = scale_msc_response(response_json, scale)
+            services = sorted(
+                {
+                    msc_fetch.normalize_text(sailing.get("LoadingService")).removesuffix(" SERVICE")
+                    for sailing in scaled.get("Data") or []
+                    if sailing.get("LoadingService")
+                }
+            )
+            for service_code in services:
+                inputs.append((service_code, scaled))
+        return inputs
+
+    def extract_all(inputs):
+        all_voyages, all_port_calls = [], []
+        for service_code, scaled in inputs:
+            voyages, port_calls = msc_fetch.extract_route_rows(service_code, "SHANGHAI", "ROTTERDAM", scaled)
+            all_voyages.extend(voyages)
+            all_port_calls.extend(port_calls)
+        return all_voyages, all_port_calls
+
+    def extract_case(scale: int):
+        inputs = route_inputs(scale)
+        input_rows = sum(len(route.get("Routes") or []) for _, scaled in inputs for route in scaled.get("Data") or [])
+        return input_rows, lambda: extract_all(inputs)[1]
+
+    def dedupe_voyages_case(scale: int):
+        voyages, _ = extract_all(route_inputs(scale))
+        return len(voyages), lambda: msc_fetch.dedupe_voyages(voyages)
+
+    def dedupe_port_calls_case(scale: int):
+        voyages, port_calls = extract_all(route_inputs(scale))
+        deduped_voyages = msc_fetch.dedupe_voyages(voyages)
+        return len(port_calls), lambda: msc_fetch.dedupe_port_calls(port_calls, deduped_voyages)
+
+    return {
+        "msc.extract_route_rows": extract_case,
+        "msc.dedupe_voyages": dedupe_voyages_case,
+        "msc.dedupe_port_calls": dedupe_port_calls_case,
+    }
+
+
+def build_msk_cases() -> Dict[str, Case]:
+    from capastudy.carriers import msk_fetch
+
+    items_by_port: Dict[Tuple[str, str], List[dict]] = {}
+    for path in MSK_PAYLOADS:
+        if path.exists():
+            for port_key, items in msk_items_from_routings(load_json(path)).items():
+                items_by_port.setdefault(port_key, []).extend(items)
+    allowed_services = sorted(
+        {
+            msk_fetch.normalize_text(item.get(field))
+            for items in items_by_port.values()
+            for item in items
+            for field in ("arrivalServiceName", "departureServiceName")
+            if item.get(field)
+        }
+    )
+
+    def match_all(scaled):
+        rows = []
+        for (city, geoid), items in scaled.items():
+            rows.extend(msk_fetch.build_port_call_rows(items, city, geoid, allowed_services))
+        return rows
+
+    def match_case(scale: int):
+        scaled = scale_msk_items(items_by_port, scale)
+        return sum(len(items) for items in scaled.values()), lambda: match_all(scaled)
+
+    def dedupe_case(scale: int):
+        rows = match_all(scale_msk_items(items_by_port, scale))
+        return len(rows), lambda: msk_fetch.dedupe_port_calls(rows)
+
+    def voyage_case(scale: int):
+        port_calls = msk_fetch.dedupe_port_calls(match_all(scale_msk_items(items_by_port, scale)))
+        return len(port_calls), lambda: msk_fetch.build_voyage_rows(port_calls)
+
+    return {
+        "msk.build_port_call_rows": match_case,
+        "msk.dedupe_port_calls": dedupe_case,
+        "msk.build_voyage_rows": voyage_case,
+    }
+
+
+CASE_BUILDERS = {"csl": build_csl_cases, "msc": build_msc_cases, "msk": build_msk_cases}
+
+
+def measure(run: Callable[[], object], repeat: int) -> Dict[str, object]:
+    best = None
+    output = None
+    for _ in range(max(repeat, 1)):
+        gc.collect()
+        started = time.perf_counter()
+        output = run()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    # Memory is traced in a separate pass so tracemalloc overhead does not skew timings.
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "seconds": best,
+        "output_rows": len(output) if hasattr(output, "__len__") else None,
+        "peak_mb": round(peak / (1024 * 1024), 2),
+    }
+
+
+def run_benchmarks(carriers: Sequence[str], scales: Sequence[int], repeat: int, case_filter: Optional[str] = None) -> List[Dict[str, object]]:
+    results: List[Dict[str, object]] = []
+    for carrier in carriers:
+        for name, case in CASE_BUILDERS[carrier]().items():
+            if case_filter and case_filter not in name:
+                continue
+            for scale in scales:
+                input_rows, run = case(scale)
+                result = measure(run, repeat)
+                seconds = result["seconds"] or 0.0
+                results.append(
+                    {
+                        "case": name,
+                        "scale": scale,
+                        "input_rows": input_rows,
+                        **result,
+                        "rows_per_sec": round(input_rows / seconds) if seconds > 0 else None,
+                    }
+                )
+                print_result(results[-1])
+    return results
+
+
+def print_header() -> None:
+    print(f"{'case':<28} {'scale':>6} {'input':>9} {'output':>9} {'seconds':>10} {'rows/sec':>12} {'peak_mb':>9}")
+
+
+def print_result(result: Dict[str, object]) -> None:
+    print(
+        f"{result['case']:<28} {result['scale']:>6} {result['input_rows']:>9} "
+        f"{result['output_rows'] if result['output_rows'] is not None else '-':>9} "
+        f"{result['seconds']:>10.4f} {result['rows_per_sec'] or '-':>12} {result['peak_mb']:>9.2f}"
+    )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Replay recorded carrier payloads through the parsers and report rows/sec and peak memory.")
+    parser.add_argument("--carrier", action="append", choices=CARRIERS, default=[], help="Only benchmark these carriers.")
+    parser.add_argument("--scale", action="append", type=int, default=[], help="Payload multipliers (default: 1, 10, 100).")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case; the fastest is reported.")
+    parser.add_argument("--case", default=None, help="Only run cases whose name contains this text.")
+    parser.add_argument("--output", default=None, help="Optional JSON file for the results.")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    carriers = args.carrier or list(CARRIERS)
+    scales = [scale for scale in (args.scale or DEFAULT_SCALES) if scale > 0]
+    print_header()
+    results = run_benchmarks(carriers, scales, args.repeat, args.case)
+    if args.output:
+        output_path = Path(args.output)
+        output_path.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"Benchmark results saved: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
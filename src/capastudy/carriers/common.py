@@ -1,10 +1,23 @@
 from __future__ import annotations
 
-from datetime import datetime
+import hashlib
+import importlib.util
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from pathlib import Path
 from typing import Awaitable, Callable, Iterable, Mapping, Sequence, TypeVar
+from urllib.parse import urlsplit
 
 import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
 
 T = TypeVar("T")
 
@@ -123,21 +136,313 @@ def collect_batch_result(
     return result_copy
 
 
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        self.rate = float(rate)
+        self.capacity = max(float(capacity or rate), 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                delay = (tokens - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+_HOST_BUCKETS: dict[str, TokenBucket] = {}
+_HOST_BUCKETS_LOCK = threading.Lock()
+
+
+def get_host_bucket(url: str, rate: float, capacity: float | None = None) -> TokenBucket:
+    host = urlsplit(url).netloc or url
+    with _HOST_BUCKETS_LOCK:
+        bucket = _HOST_BUCKETS.get(host)
+        if bucket is None or bucket.rate != rate:
+            bucket = TokenBucket(rate, capacity)
+            _HOST_BUCKETS[host] = bucket
+        return bucket
+
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# urllib3 only decodes brotli when one of these packages is installed.
+BROTLI_AVAILABLE = any(importlib.util.find_spec(name) is not None for name in ("brotli", "brotlicffi"))
+ACCEPT_ENCODING = "gzip, deflate, br" if BROTLI_AVAILABLE else "gzip, deflate"
+
+
+@dataclass
+class HostPolicy:
+    max_concurrency: int = 8
+    rate: float = 0.0
+    timeout: float = 30.0
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class HttpClient:
+    def __init__(
+        self,
+        default_policy: HostPolicy | None = None,
+        max_attempts: int = 3,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        max_retry_after: float = 120.0,
+        pool_size: int = 32,
+    ) -> None:
+        self.default_policy = default_policy or HostPolicy()
+        self.max_attempts = max(int(max_attempts), 1)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+        self.policies: dict[str, HostPolicy] = {}
+        self.semaphores: dict[str, threading.BoundedSemaphore] = {}
+        self.lock = threading.Lock()
+
+    def configure_host(self, url: str, **changes: object) -> HostPolicy:
+        host = urlsplit(url).netloc or url
+        with self.lock:
+            current = self.policies.get(host, self.default_policy)
+            policy = HostPolicy(
+                max_concurrency=int(changes.get("max_concurrency", current.max_concurrency)),
+                rate=float(changes.get("rate", current.rate)),
+                timeout=float(changes.get("timeout", current.timeout)),
+            )
+            self.policies[host] = policy
+            self.semaphores[host] = threading.BoundedSemaphore(max(policy.max_concurrency, 1))
+        return policy
+
+    def _host_limits(self, host: str) -> tuple[HostPolicy, threading.BoundedSemaphore]:
+        with self.lock:
+            policy = self.policies.get(host, self.default_policy)
+            semaphore = self.semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(max(policy.max_concurrency, 1))
+                self.semaphores[host] = semaphore
+        return policy, semaphore
+
+    def retry_delay(self, attempt: int, response: requests.Response | None) -> float:
+        # Full jitter keeps concurrent workers from retrying in lockstep.
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1))))
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, self.max_retry_after))
+        return delay
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        timeout: float | None = None,
+        max_attempts: int | None = None,
+        raise_for_status: bool = True,
+        validate: Callable[[requests.Response], None] | None = None,
+        **kwargs: object,
+    ) -> requests.Response:
+        # validate(response) runs on successful responses; a ValueError from it (bad JSON, an error flag in the
+        # body) is retried like a 5xx and re-raised once the attempts run out.
+        host = urlsplit(url).netloc
+        policy, semaphore = self._host_limits(host)
+        bucket = get_host_bucket(url, policy.rate) if policy.rate > 0 else None
+        attempts = max(int(max_attempts or self.max_attempts), 1)
+        response: requests.Response | None = None
+        error: Exception | None = None
+        for attempt in range(1, attempts + 1):
+            if bucket is not None:
+                bucket.acquire()
+            response, error = None, None
+            with semaphore:
+                try:
+                    response = self.session.request(method, url, timeout=timeout or policy.timeout, **kwargs)
+                except requests.HTTPError:
+                    raise
+                except requests.RequestException as exc:
+                    # Transport failures (connection, timeout, truncated or undecodable bodies) are all retried.
+                    error = exc
+            retryable = response is None or response.status_code in RETRY_STATUSES
+            if not retryable and validate is not None and response.ok:
+                try:
+                    validate(response)
+                except ValueError as exc:
+                    error, retryable = exc, True
+            if not retryable or attempt == attempts:
+                break
+            time.sleep(self.retry_delay(attempt, response))
+        if response is None:
+            raise error
+        if raise_for_status:
+            response.raise_for_status()
+        if error is not None:
+            raise error
+        return response
+
+    def request_json(
+        self,
+        method: str,
+        url: str,
+        *,
+        check: Callable[[object], None] | None = None,
+        **kwargs: object,
+    ) -> object:
+        # Decoded JSON body; undecodable bodies and ones rejected by check() (which raises ValueError) are retried.
+        parsed: dict[str, object] = {}
+
+        def validate(response: requests.Response) -> None:
+            obj = response.json()
+            if check is not None:
+                check(obj)
+            parsed["obj"] = obj
+
+        self.request(method, url, validate=validate, **kwargs)
+        return parsed["obj"]
+
+    def get(self, url: str, **kwargs: object) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: object) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_HTTP_CLIENT: HttpClient | None = None
+_HTTP_CLIENT_LOCK = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    global _HTTP_CLIENT
+    with _HTTP_CLIENT_LOCK:
+        if _HTTP_CLIENT is None:
+            _HTTP_CLIENT = HttpClient()
+        return _HTTP_CLIENT
+
+
+def reset_http_client() -> None:
+    global _HTTP_CLIENT
+    with _HTTP_CLIENT_LOCK:
+        client, _HTTP_CLIENT = _HTTP_CLIENT, None
+    if client is not None:
+        client.close()
+
+
+class JsonDiskCache:
+    def __init__(self, directory: Path, ttl_seconds: float, read: bool = True, write: bool = True) -> None:
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.read = read
+        self.write = write
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key_for(url: str, payload: object) -> str:
+        normalized = json.dumps({"url": url, "payload": payload}, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def path_for(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, url: str, payload: object) -> object | None:
+        entry: dict = {}
+        fresh = False
+        if self.read:
+            try:
+                entry = json.loads(self.path_for(self.key_for(url, payload)).read_text(encoding="utf-8"))
+                fresh = time.time() - float(entry["fetched_at"]) <= self.ttl_seconds
+            except (OSError, ValueError, KeyError, TypeError):
+                fresh = False
+        with self.lock:
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry["response"] if fresh else None
+
+    def put(self, url: str, payload: object, response: object) -> None:
+        if not self.write:
+            return
+        path = self.path_for(self.key_for(url, payload))
+        ensure_directory(path.parent)
+        entry = {"url": url, "payload": payload, "fetched_at": time.time(), "response": response}
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp_path.write_text(json.dumps(entry, ensure_ascii=False), encoding="utf-8")
+        tmp_path.replace(path)
+
+    def summary(self) -> str:
+        if not self.read and not self.write:
+            return "disabled"
+        mode = "refresh" if not self.read else f"ttl={self.ttl_seconds / 3600:g}h"
+        return f"hits={self.hits}, misses={self.misses} ({mode}, {self.directory})"
+
+
+def _call_item(process_item: Callable[[T], Mapping[str, object]], item: T) -> tuple[Mapping[str, object] | None, Exception | None]:
+    try:
+        return process_item(item), None
+    except Exception as exc:
+        return None, exc
+
+
 def run_item_batch(
     items: Iterable[T],
     process_item: Callable[[T], Mapping[str, object]],
     item_label: str,
+    max_workers: int = 1,
 ) -> tuple[list[dict[str, object]], list[object], list[object]]:
     results: list[dict[str, object]] = []
     batch_voyages: list[object] = []
     batch_port_calls: list[object] = []
-    for item in items:
-        try:
-            result = process_item(item)
-            results.append(collect_batch_result(result, batch_voyages, batch_port_calls))
-        except Exception as exc:
-            print(f"{item_label} {item} failed: {exc}")
-            results.append({item_label.lower(): item, "error": str(exc)})
+    item_list = list(items)
+    executor = ThreadPoolExecutor(max_workers=max_workers) if max_workers > 1 and len(item_list) > 1 else None
+    try:
+        if executor is None:
+            outcomes = (_call_item(process_item, item) for item in item_list)
+        else:
+            # Results are collected in submission order so batch output matches a sequential run.
+            futures = [executor.submit(_call_item, process_item, item) for item in item_list]
+            outcomes = (future.result() for future in futures)
+        for item, (result, exc) in zip(item_list, outcomes):
+            if exc is None:
+                results.append(collect_batch_result(result, batch_voyages, batch_port_calls))
+            else:
+                print(f"{item_label} {item} failed: {exc}")
+                results.append({item_label.lower(): item, "error": str(exc)})
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
     return results, batch_voyages, batch_port_calls
 
 
@@ -146,6 +451,7 @@ async def run_async_item_batch(
     process_item: Callable[[T], Awaitable[Mapping[str, object]]],
     item_label: str,
     after_success: Callable[[T, dict[str, object]], Awaitable[None]] | None = None,
+    log: Callable[[str], None] = print,
 ) -> tuple[list[dict[str, object]], list[object], list[object]]:
     results: list[dict[str, object]] = []
     batch_voyages: list[object] = []
@@ -158,11 +464,21 @@ async def run_async_item_batch(
             if after_success is not None:
                 await after_success(item, summary)
         except Exception as exc:
-            print(f"{item_label} {item} failed: {exc}")
+            log(f"{item_label} {item} failed: {exc}")
             results.append({item_label.lower(): item, "error": str(exc)})
     return results, batch_voyages, batch_port_calls
 
 
+def env_number(name: str, default: T, cast: Callable[[str], T]) -> T:
+    value = os.getenv(name, "").strip()
+    if not value:
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        return default
+
+
 def normalize_cli_tokens(argv: Sequence[str] | None) -> list[str]:
     if argv is None:
         return []
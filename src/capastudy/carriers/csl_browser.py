@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+from playwright.async_api import async_playwright
+from playwright_stealth import Stealth
+
+from capastudy.carriers.common import JsonDiskCache, ensure_directory, env_number
+from capastudy.settings import CSL_BROWSER_DIR
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/145.0.0.0 Safari/537.36"
+)
+LOCALE = "zh-CN"
+VIEWPORT = {"width": 1600, "height": 900}
+CONTEXT_MAX_USES_ENV_VAR = "CSL_CONTEXT_MAX_USES"
+DEFAULT_CONTEXT_MAX_USES = 25
+LEAN_ENV_VAR = "CSL_LEAN_PROFILE"
+STORAGE_STATE_TTL_ENV_VAR = "CSL_STORAGE_STATE_TTL_HOURS"
+DEFAULT_STORAGE_STATE_TTL_HOURS = 24.0
+ASSET_CACHE_TTL_ENV_VAR = "CSL_ASSET_CACHE_TTL_HOURS"
+DEFAULT_ASSET_CACHE_TTL_HOURS = 72.0
+STORAGE_STATE_PATH = CSL_BROWSER_DIR / "storage_state.json"
+ASSET_CACHE_DIR = CSL_BROWSER_DIR / "assets"
+# The schedule flow only needs the DOM, scripts, styles and XHR.
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font"}
+BLOCKED_HOST_SUFFIXES = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "hm.baidu.com",
+    "cnzz.com",
+    "facebook.net",
+    "hotjar.com",
+)
+CACHED_RESOURCE_TYPES = {"script", "stylesheet"}
+# route.fetch() hands back a decoded body, so encoding/length headers must not be replayed.
+DROPPED_ASSET_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+
+def is_lean_profile_enabled():
+    value = os.getenv(LEAN_ENV_VAR, "0").strip().lower()
+    return value in {"1", "true", "yes", "on"}
+
+
+def is_blocked_request(request) -> bool:
+    if request.resource_type in BLOCKED_RESOURCE_TYPES:
+        return True
+    host = urlsplit(request.url).hostname or ""
+    return any(host == suffix or host.endswith(f".{suffix}") for suffix in BLOCKED_HOST_SUFFIXES)
+
+
+def storage_state_created_path(path=STORAGE_STATE_PATH):
+    return path.with_name(f"{path.name}.created")
+
+
+def read_storage_state_created(path=STORAGE_STATE_PATH) -> Optional[float]:
+    try:
+        return float(json.loads(storage_state_created_path(path).read_text(encoding="utf-8"))["created_at"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def write_storage_state_created(path=STORAGE_STATE_PATH, created_at: Optional[float] = None) -> None:
+    created_path = storage_state_created_path(path)
+    tmp_path = created_path.with_name(f"{created_path.name}.tmp")
+    tmp_path.write_text(json.dumps({"created_at": created_at if created_at is not None else time.time()}), encoding="utf-8")
+    tmp_path.replace(created_path)
+
+
+def load_storage_state_path(path=STORAGE_STATE_PATH, ttl_hours: Optional[float] = None):
+    # The state is re-saved on every run, so its age comes from the creation time kept beside it, not its mtime.
+    ttl_hours = ttl_hours if ttl_hours is not None else env_number(STORAGE_STATE_TTL_ENV_VAR, DEFAULT_STORAGE_STATE_TTL_HOURS, float)
+    try:
+        modified_at = path.stat().st_mtime
+    except OSError:
+        return None
+    created_at = read_storage_state_created(path)
+    if created_at is None:
+        # State saved before creation times were kept: its mtime is the best estimate, pinned from now on.
+        created_at = modified_at
+        write_storage_state_created(path, created_at)
+    if time.time() - created_at > ttl_hours * 3600:
+        path.unlink(missing_ok=True)
+        storage_state_created_path(path).unlink(missing_ok=True)
+        return None
+    return path
+
+
+async def handle_lean_route(route, asset_cache: Optional[JsonDiskCache]) -> None:
+    request = route.request
+    if is_blocked_request(request):
+        await route.abort()
+        return
+    if asset_cache is None or request.method != "GET" or request.resource_type not in CACHED_RESOURCE_TYPES:
+        await route.continue_()
+        return
+    cached = asset_cache.get(request.url, None)
+    if cached is not None:
+        await route.fulfill(status=cached["status"], headers=cached["headers"], body=base64.b64decode(cached["body"]))
+        return
+    try:
+        response = await route.fetch()
+        body = await response.body()
+    except Exception:
+        await route.continue_()
+        return
+    headers = {key: value for key, value in response.headers.items() if key.lower() not in DROPPED_ASSET_HEADERS}
+    if response.status == 200:
+        asset_cache.put(request.url, None, {"status": 200, "headers": headers, "body": base64.b64encode(body).decode("ascii")})
+    await route.fulfill(status=response.status, headers=headers, body=body)
+
+
+class PooledPage:
+    def __init__(self, context, page) -> None:
+        self.context = context
+        self.page = page
+        self.uses = 0
+        # Per-context flags the flows keep between leases, e.g. whether the cookie banner was accepted.
+        self.state: Dict[str, object] = {}
+
+
+class BrowserPool:
+    def __init__(self, headless: bool = True, size: int = 1, max_uses: Optional[int] = None, lean: Optional[bool] = None) -> None:
+        self.headless = headless
+        self.lean = is_lean_profile_enabled() if lean is None else lean
+        self.storage_state = load_storage_state_path() if self.lean else None
+        self.asset_cache = (
+            JsonDiskCache(ASSET_CACHE_DIR, env_number(ASSET_CACHE_TTL_ENV_VAR, DEFAULT_ASSET_CACHE_TTL_HOURS, float) * 3600)
+            if self.lean
+            else None
+        )
+        self.size = max(1, size)
+        self.max_uses = max_uses if max_uses is not None else env_number(CONTEXT_MAX_USES_ENV_VAR, DEFAULT_CONTEXT_MAX_USES, int)
+        self.playwright = None
+        self.browser = None
+        self.idle: List[PooledPage] = []
+        self.slots = asyncio.Semaphore(self.size)
+        self.launch_lock = asyncio.Lock()
+        self.stats = {"launches": 0, "contexts": 0, "recycled": 0}
+
+    async def ensure_browser(self):
+        async with self.launch_lock:
+            if self.browser is not None and self.browser.is_connected():
+                return self.browser
+            if self.playwright is None:
+                self.playwright = await async_playwright().start()
+            # Contexts die with their browser, so a relaunch starts with an empty pool.
+            self.idle.clear()
+            self.browser = await self.playwright.chromium.launch(headless=self.headless)
+            self.stats["launches"] += 1
+            return self.browser
+
+    async def open_page(self) -> PooledPage:
+        browser = await self.ensure_browser()
+        options = {"user_agent": USER_AGENT, "locale": LOCALE, "viewport": VIEWPORT}
+        if self.storage_state is not None:
+            options["storage_state"] = str(self.storage_state)
+        context = await browser.new_context(**options)
+        try:
+            await Stealth().apply_stealth_async(context)
+            if self.lean:
+                await context.route("**/*", lambda route: handle_lean_route(route, self.asset_cache))
+            page = await context.new_page()
+        except BaseException:
+            await context.close()
+            raise
+        self.stats["contexts"] += 1
+        lease = PooledPage(context, page)
+        lease.state["restored_profile"] = self.storage_state is not None
+        return lease
+
+    async def save_storage_state(self, lease: PooledPage, path=STORAGE_STATE_PATH) -> None:
+        ensure_directory(path.parent)
+        try:
+            await lease.context.storage_state(path=str(path))
+        except Exception as exc:
+            print(f"Could not save CSL browser storage state: {exc}")
+            return
+        # Re-saving a restored state keeps its creation time, so the TTL still expires it; only a fresh one restarts it.
+        if self.storage_state is None or read_storage_state_created(path) is None:
+            write_storage_state_created(path)
+
+    async def discard(self, lease: PooledPage) -> None:
+        try:
+            await lease.context.close()
+        except Exception:
+            pass
+
+    async def acquire(self) -> PooledPage:
+        await self.slots.acquire()
+        try:
+            while self.idle:
+                lease = self.idle.pop()
+                if not lease.page.is_closed() and self.browser is not None and self.browser.is_connected():
+                    return lease
+                await self.discard(lease)
+            return await self.open_page()
+        except BaseException:
+            self.slots.release()
+            raise
+
+    async def release(self, lease: PooledPage, failed: bool = False) -> None:
+        try:
+            lease.uses += 1
+            worn_out = self.max_uses > 0 and lease.uses >= self.max_uses
+            if failed or worn_out or lease.page.is_closed():
+                self.stats["recycled"] += 1
+                await self.discard(lease)
+            else:
+                self.idle.append(lease)
+        finally:
+            self.slots.release()
+
+    @asynccontextmanager
+    async def lease(self):
+        lease = await self.acquire()
+        failed = False
+        try:
+            yield lease
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            await self.release(lease, failed=failed)
+
+    def summary(self) -> str:
+        text = f"launches={self.stats['launches']}, contexts={self.stats['contexts']}, recycled={self.stats['recycled']}"
+        if self.lean:
+            text += f", storage state {'reused' if self.storage_state else 'new'}, assets {self.asset_cache.summary()}"
+        return text
+
+    async def close(self) -> None:
+        idle, self.idle = self.idle, []
+        # Only contexts that finished their last lease cleanly are idle, so their cookies are worth keeping.
+        if self.lean and idle:
+            await self.save_storage_state(idle[-1])
+        for lease in idle:
+            await self.discard(lease)
+        if self.browser is not None:
+            try:
+                await self.browser.close()
+            except Exception:
+                pass
+        if self.playwright is not None:
+            await self.playwright.stop()
+        self.browser = None
+        self.playwright = None
+
+    async def __aenter__(self) -> "BrowserPool":
+        await self.ensure_browser()
+        return self
+
+    async def __aexit__(self, *_exc) -> None:
+        await self.close()
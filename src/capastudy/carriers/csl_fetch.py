@@ -6,8 +6,6 @@ import sys
 
 import pandas as pd
 from playwright.async_api import TimeoutError as PlaywrightTimeoutError
-from playwright.async_api import async_playwright
-from playwright_stealth import Stealth
 
 from capastudy.carriers.common import (
     PORT_CALL_COLUMNS,
@@ -18,18 +16,23 @@ from capastudy.carriers.common import (
     save_summary_workbook,
     save_timestamped_voyage_portcall_workbook,
 )
+from capastudy.carriers.csl_browser import BrowserPool
 from capastudy.settings import (
     CSL_ARTIFACT_DIR as ARTIFACT_DIR,
     CSL_QUERY_DIR as QUERY_DIR,
     CSL_SERVICE_RULES_XLSX as SERVICE_RULES_XLSX,
 )
+from capastudy.timestamps import MINUTE_FORMAT, TimestampParser
 
-TARGET_URL = "https://elines.coscoshipping.com/ebusiness/sailingSchedule/searchByService"
+TARGET_URL = os.getenv("CSL_TARGET_URL", "https://elines.coscoshipping.com/ebusiness/sailingSchedule/searchByService")
 DEFAULT_SERVICE_CODE = "SERVICE"
 DEFAULT_PORT_CODE = "PORT"
 FETCH_RETRY_ATTEMPTS = 5
 RETRY_BASE_DELAY_SECONDS = 2
 HEADLESS_ENV_VAR = "CSL_HEADLESS"
+SCHEDULE_PATH = "/ebschedule/public/purpoShipment/service/port"
+SCHEDULE_RESPONSE_TIMEOUT_MS = 10000
+PORT_CALL_TIMESTAMPS = TimestampParser((MINUTE_FORMAT, "%Y-%m-%d %H:%M:%S"))
 
 def sanitize_filename(name):
     cleaned = re.sub(r'[\\/:*?"<>|]', "_", str(name)).strip()
@@ -49,6 +52,12 @@ def debug_log(message):
     return None
 
 
+def format_csl_datetime(value):
+    if value in (None, ""):
+        return value
+    return PORT_CALL_TIMESTAMPS.format(str(value)) or value
+
+
 def normalize_port_name(name):
     return str(name).strip().upper() if name is not None else ""
 
@@ -227,10 +236,10 @@ def parse_tables_from_rows(raw_port_calls, service_rules):
                 "Voyage": extract_westbound_voyage(row.get("voy")),
                 "PortCallSeq": len(voyage_groups[group_key]) + 1,
                 "PortName": row.get("protName"),
-                "ArrDtlocAct": row.get("arrDtlocAct"),
-                "DepDtlocAct": row.get("depDtlocAct"),
-                "ArrDtlocCos": row.get("arrDtlocCos"),
-                "DepDtlocCos": row.get("depDtlocCos"),
+                "ArrDtlocAct": format_csl_datetime(row.get("arrDtlocAct")),
+                "DepDtlocAct": format_csl_datetime(row.get("depDtlocAct")),
+                "ArrDtlocCos": format_csl_datetime(row.get("arrDtlocCos")),
+                "DepDtlocCos": format_csl_datetime(row.get("depDtlocCos")),
             }
         )
 
@@ -299,10 +308,6 @@ def save_batch_detail_tables(voyage_rows, port_call_rows):
     )
 
 
-async def prepare_page(page):
-    await page.set_viewport_size({"width": 1600, "height": 900})
-
-
 async def open_search_page(page):
     debug_log(f"Opening: {TARGET_URL}")
     await page.goto(TARGET_URL, wait_until="domcontentloaded", timeout=60000)
@@ -352,6 +357,13 @@ async def select_service_in_group(page, service_group, service_code, timeout=200
     debug_log(f"Selected service: {service_code}")
 
 
+async def wait_until_hidden(locator, timeout):
+    try:
+        await locator.wait_for(state="hidden", timeout=timeout)
+    except PlaywrightTimeoutError:
+        pass
+
+
 async def choose_port(page, port_name, timeout=2500):
     port_input = page.locator("input[placeholder='港口名称 (城市,省,国家/地区)']").first
     await port_input.wait_for(state="visible", timeout=timeout)
@@ -367,8 +379,9 @@ async def choose_port(page, port_name, timeout=2500):
     for suggestion in suggestion_candidates:
         try:
             await suggestion.wait_for(state="visible", timeout=timeout)
-            await suggestion.click(timeout=timeout)
             chosen_text = (await suggestion.inner_text()).strip()
+            await suggestion.click(timeout=timeout)
+            await wait_until_hidden(suggestion, timeout=timeout)
             debug_log(f"Selected suggestion: {chosen_text}")
             return
         except Exception as exc:
@@ -409,103 +422,106 @@ async def fetch_response_text_in_page(page, url):
     )
 
 
-async def choose_period_and_capture(page, timeout=3000):
+async def read_schedule_response_text(page, response):
+    # The captured response already holds the body; re-request it only when the browser no longer has it.
+    try:
+        if response.ok:
+            return await response.text()
+    except Exception as exc:
+        debug_log(f"Captured response body unavailable, fetching again: {exc}")
+    return await fetch_response_text_in_page(page, response.url)
+
+
+def is_schedule_response(response, period=None):
+    if SCHEDULE_PATH not in response.url:
+        return False
+    return period is None or f"period={period}" in response.url
+
+
+async def capture_schedule_response(page, action, timeout=SCHEDULE_RESPONSE_TIMEOUT_MS):
+    # Returns as soon as the 8-week response arrives; otherwise the last schedule response seen while waiting.
     matched_responses = []
 
     def on_response(response):
-        if "/ebschedule/public/purpoShipment/service/port" not in response.url:
-            return
-        matched_responses.append(
-            {
-                "url": response.url,
-                "method": response.request.method,
-                "resource_type": response.request.resource_type,
-                "status": response.status,
-                "content_type": response.headers.get("content-type", ""),
-            }
-        )
+        if is_schedule_response(response):
+            matched_responses.append(response)
 
     page.on("response", on_response)
-    period_error = None
-    for _ in range(3):
-        try:
-            await choose_period(page, "八周内", timeout=timeout)
-            period_error = None
-            break
-        except Exception as exc:
-            period_error = exc
-            await page.wait_for_timeout(1200)
-    if period_error is not None:
+    action_done = False
+    try:
+        async with page.expect_response(lambda response: is_schedule_response(response, period=56), timeout=timeout) as response_info:
+            await action()
+            action_done = True
+        return await response_info.value
+    except PlaywrightTimeoutError:
+        if not action_done:
+            raise
+        if matched_responses:
+            return matched_responses[-1]
+        raise RuntimeError("No matching schedule responses were observed after selecting the period.")
+    finally:
         page.remove_listener("response", on_response)
-        raise period_error
-    await page.wait_for_timeout(3000)
-    page.remove_listener("response", on_response)
 
-    if not matched_responses:
-        raise RuntimeError("No matching schedule responses were observed after selecting the period.")
 
-    target_response = None
-    for item in reversed(matched_responses):
-        if "period=56" in item["url"]:
-            target_response = item
-            break
-    if target_response is None:
-        target_response = matched_responses[-1]
+async def choose_period_and_capture(page, timeout=3000, capture=None):
+    async def select_eight_weeks():
+        period_error = None
+        for _ in range(3):
+            try:
+                await choose_period(page, "八周内", timeout=timeout)
+                return
+            except Exception as exc:
+                period_error = exc
+        raise period_error
 
-    response_text = await fetch_response_text_in_page(page, target_response["url"])
-    debug_log(f"Captured response URL: {target_response['url']}")
+    target_response = await capture_schedule_response(page, select_eight_weeks)
+    if capture is not None:
+        capture["url"] = target_response.url
+    response_text = await read_schedule_response_text(page, target_response)
+    debug_log(f"Captured response URL: {target_response.url}")
     debug_log(f"Captured response preview: {response_text[:100]}")
     return json.loads(response_text)
 
 
-async def fetch_response_json(service_code, query_port):
+async def fetch_response_json(service_code, query_port, pool, capture=None):
     service_group = normalize_service_group(service_code)
     debug_log(f"Service group: {service_group}")
     debug_log(f"Query port: {query_port}")
-    headless = is_headless_enabled()
-    debug_log(f"Headless mode: {headless}")
-
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=headless)
-        context = await browser.new_context(
-            user_agent=(
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/145.0.0.0 Safari/537.36"
-            ),
-            locale="zh-CN",
-        )
-        await Stealth().apply_stealth_async(context)
-        page = await context.new_page()
+
+    # A failed attempt recycles its context, so the retry starts from a clean page.
+    async with pool.lease() as lease:
+        page = lease.page
         try:
-            await prepare_page(page)
             await open_search_page(page)
-            for step_text in ["允许全部", "欧洲航线"]:
-                await click_by_text(page, step_text, timeout=1200)
-                await page.wait_for_timeout(1500)
+            if not lease.state.get("cookies_accepted"):
+                try:
+                    await click_by_text(page, "允许全部", timeout=1200)
+                except RuntimeError:
+                    # A restored lean profile already carries the consent cookie, so the banner may not show.
+                    if not lease.state.get("restored_profile"):
+                        raise
+                lease.state["cookies_accepted"] = True
+            await click_by_text(page, "欧洲航线", timeout=1200)
             await select_service_in_group(page, service_group, service_code, timeout=3000)
-            await page.wait_for_timeout(1500)
             await choose_port(page, query_port, timeout=2500)
-            await page.wait_for_timeout(1000)
             await trigger_search(page, timeout=1200)
-            await page.wait_for_timeout(1000)
-            return await choose_period_and_capture(page, timeout=3000)
+            return await choose_period_and_capture(page, timeout=3000, capture=capture)
         except PlaywrightTimeoutError as exc:
             raise RuntimeError(f"Timed out while loading or waiting for the page: {exc}") from exc
-        finally:
-            await browser.close()
 
 
 async def fetch_response_json_with_retry(
     service_code,
     query_port,
+    pool,
     max_attempts=FETCH_RETRY_ATTEMPTS,
     base_delay_seconds=RETRY_BASE_DELAY_SECONDS,
+    capture=None,
 ):
     last_error = None
     for attempt in range(1, max_attempts + 1):
         try:
-            return await fetch_response_json(service_code, query_port)
+            return await fetch_response_json(service_code, query_port, pool, capture=capture)
         except Exception as exc:
             last_error = exc
             print(f"Fetch failed for {service_code}/{query_port} attempt {attempt}/{max_attempts}: {exc}")
@@ -514,7 +530,7 @@ async def fetch_response_json_with_retry(
     raise RuntimeError(f"Failed to fetch {service_code}/{query_port} after {max_attempts} attempts: {last_error}")
 
 
-async def process_service(service_code, service_rules):
+async def process_service(service_code, service_rules, pool, fetch=fetch_response_json_with_retry, suffix="DEDUPED"):
     service_rule = service_rules[service_code]
     multi_ports = build_query_ports(service_rule, include_alternatives=True)
     print(f"Target service: {service_code}")
@@ -523,7 +539,7 @@ async def process_service(service_code, service_rules):
     for port in multi_ports:
         try:
             print(f"Query {service_code} / {port}")
-            response_json = await fetch_response_json_with_retry(service_code, port)
+            response_json = await fetch(service_code, port, pool)
         except Exception as exc:
             print(f"Skipped port {port} for {service_code}: {exc}")
             continue
@@ -537,7 +553,7 @@ async def process_service(service_code, service_rules):
 
     deduped_rows = dedupe_port_calls(multi_raw_rows)
     multi_voyages, multi_calls = parse_tables_from_rows(deduped_rows, service_rules)
-    multi_file = save_tables_to_excel(multi_voyages, multi_calls, service_code, "MULTIPORT", "DEDUPED")
+    multi_file = save_tables_to_excel(multi_voyages, multi_calls, service_code, "MULTIPORT", suffix)
     print(f"起运港+备选港去重结果已保存: {multi_file}")
 
     total_voyages = []
@@ -568,14 +584,16 @@ async def main():
     ensure_query_dir()
     print(f"Services to process: {target_services}")
 
-    async def _run_service(service_code):
-        return await process_service(service_code, service_rules)
+    async with BrowserPool(headless=is_headless_enabled()) as pool:
+        async def _run_service(service_code):
+            return await process_service(service_code, service_rules, pool)
 
-    results, batch_voyages, batch_port_calls = await run_async_item_batch(
-        target_services,
-        _run_service,
-        item_label="Service",
-    )
+        results, batch_voyages, batch_port_calls = await run_async_item_batch(
+            target_services,
+            _run_service,
+            item_label="Service",
+        )
+        print(f"Browser pool: {pool.summary()}")
 
     summary_path = save_summary_workbook(QUERY_DIR, "CSL_FETCH_BATCH_SUMMARY", results)
     detail_path = save_batch_detail_tables(batch_voyages, batch_port_calls)
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import sys
+import time
+from urllib.parse import parse_qsl, quote, urlsplit
+
+from capastudy.carriers.common import (
+    ensure_directory,
+    run_async_item_batch,
+    save_summary_workbook,
+    save_timestamped_voyage_portcall_workbook,
+)
+from capastudy.carriers.csl_browser import BrowserPool
+from capastudy.carriers.csl_fetch import (
+    QUERY_DIR,
+    TARGET_URL,
+    ensure_query_dir,
+    fetch_response_json_with_retry,
+    get_target_services,
+    is_headless_enabled,
+    load_service_rules,
+    normalize_port_name,
+    open_search_page,
+    process_service,
+)
+from capastudy.settings import CSL_API_PORTS_JSON
+
+SCHEDULE_PERIOD = "56"
+
+
+def load_api_ports(path=CSL_API_PORTS_JSON):
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def save_api_ports(port_entries, path=CSL_API_PORTS_JSON):
+    ensure_directory(path.parent)
+    tmp_path = path.with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps(port_entries, ensure_ascii=False, indent=2, sort_keys=True), encoding="utf-8")
+    tmp_path.replace(path)
+    return path
+
+
+def parse_schedule_url(url):
+    parts = urlsplit(url)
+    return {
+        "base": f"{parts.scheme}://{parts.netloc}{parts.path}",
+        "params": parse_qsl(parts.query, keep_blank_values=True),
+    }
+
+
+def port_entry_from_url(url):
+    params = dict(parse_schedule_url(url)["params"])
+    return {"portCode": params.get("portCode", ""), "portName": params.get("portName", "")}
+
+
+def build_schedule_url(template, service_code, port_entry, timestamp_ms=None):
+    overrides = {
+        "serviceCode": service_code,
+        "portCode": port_entry["portCode"],
+        "portName": port_entry["portName"],
+        "period": SCHEDULE_PERIOD,
+        "timestamp": str(timestamp_ms if timestamp_ms is not None else int(time.time() * 1000)),
+    }
+    # Keep the captured parameter order; the site sends portName with literal commas.
+    params = [(key, overrides.pop(key, value)) for key, value in template["params"]]
+    params.extend(overrides.items())
+    query = "&".join(f"{key}={quote(str(value), safe=',')}" for key, value in params)
+    return f"{template['base']}?{query}"
+
+
+async def fetch_schedule_in_page(page, url):
+    result = await page.evaluate(
+        """
+        async (targetUrl) => {
+            const response = await fetch(targetUrl, {
+                method: 'GET',
+                credentials: 'include',
+            });
+            return {status: response.status, text: await response.text()};
+        }
+        """,
+        url,
+    )
+    if result["status"] != 200:
+        raise RuntimeError(f"HTTP {result['status']} from {url}")
+    response_json = json.loads(result["text"])
+    if not isinstance(response_json, dict) or "data" not in response_json:
+        raise RuntimeError(f"Unexpected schedule response from {url}")
+    return response_json
+
+
+class ApiReplay:
+    def __init__(self, port_entries):
+        self.template = None
+        self.port_entries = port_entries
+        self.stats = {"api": 0, "ui": 0, "fallback": 0}
+
+    def learn(self, port, url):
+        if self.template is None:
+            self.template = parse_schedule_url(url)
+            print(f"Learned CSL schedule endpoint: {self.template['base']}")
+        self.port_entries[normalize_port_name(port)] = port_entry_from_url(url)
+
+    async def fetch_direct(self, pool, url):
+        async with pool.lease() as lease:
+            page = lease.page
+            # The call must come from the CSL origin so the session cookies go with it.
+            if urlsplit(page.url or "").netloc != urlsplit(TARGET_URL).netloc:
+                await open_search_page(page)
+            return await fetch_schedule_in_page(page, url)
+
+    async def fetch(self, service_code, port, pool):
+        entry = self.port_entries.get(normalize_port_name(port))
+        if self.template is not None and entry:
+            try:
+                response_json = await self.fetch_direct(pool, build_schedule_url(self.template, service_code, entry))
+                self.stats["api"] += 1
+                return response_json
+            except Exception as exc:
+                self.stats["fallback"] += 1
+                print(f"API call failed for {service_code}/{port}, using the UI flow: {exc}")
+        capture = {}
+        response_json = await fetch_response_json_with_retry(service_code, port, pool, capture=capture)
+        self.stats["ui"] += 1
+        if capture.get("url"):
+            self.learn(port, capture["url"])
+        return response_json
+
+    def summary(self):
+        return f"api={self.stats['api']}, ui={self.stats['ui']}, fallback={self.stats['fallback']}"
+
+
+async def main():
+    service_rules = load_service_rules()
+    target_services = get_target_services(service_rules, argv=sys.argv[1:])
+    ensure_query_dir()
+    print(f"Services to process: {target_services}")
+
+    replay = ApiReplay(load_api_ports())
+    async with BrowserPool(headless=is_headless_enabled()) as pool:
+        async def _run_service(service_code):
+            return await process_service(service_code, service_rules, pool, fetch=replay.fetch, suffix="API_DEDUPED")
+
+        results, batch_voyages, batch_port_calls = await run_async_item_batch(
+            target_services,
+            _run_service,
+            item_label="Service",
+        )
+        print(f"Browser pool: {pool.summary()}")
+
+    ports_path = save_api_ports(replay.port_entries)
+    print(f"CSL queries: {replay.summary()}; port codes saved: {ports_path}")
+    summary_path = save_summary_workbook(QUERY_DIR, "CSL_FETCH_BATCH_SUMMARY_API", results)
+    detail_path = save_timestamped_voyage_portcall_workbook(
+        QUERY_DIR,
+        "CSL_FETCH_BATCH_DETAIL_API",
+        voyage_rows=batch_voyages,
+        port_call_rows=batch_port_calls,
+        voyage_sheet_name="Total Voyages",
+        port_call_sheet_name="Total PortCalls",
+    )
+
+    print(f"Batch summary saved: {summary_path}")
+    print(f"Batch detail tables saved: {detail_path}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
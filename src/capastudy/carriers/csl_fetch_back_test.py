@@ -1,18 +1,24 @@
+import argparse
 import asyncio
+import contextvars
 import json
-from playwright.async_api import async_playwright
-from playwright_stealth import Stealth
+import sys
+
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 
 from capastudy.carriers.common import (
+    env_number,
     run_async_item_batch,
     save_summary_workbook,
     save_timestamped_voyage_portcall_workbook,
 )
+from capastudy.carriers.csl_browser import BrowserPool
 from capastudy.carriers.csl_fetch import (
     QUERY_DIR,
     RETRY_BASE_DELAY_SECONDS,
     TARGET_URL,
     build_query_ports,
+    capture_schedule_response,
     choose_port,
     click_by_text,
     dedupe_port_calls,
@@ -23,13 +29,24 @@ from capastudy.carriers.csl_fetch import (
     load_service_rules,
     normalize_service_group,
     parse_tables_from_rows,
-    prepare_page,
+    read_schedule_response_text,
     save_tables_to_excel,
     select_service_in_group,
     trigger_search,
+    wait_until_hidden,
 )
 
 QUERY_RETRY_ATTEMPTS = 4
+SETTLE_TIMEOUT_MS = 3000
+SHARDS_ENV_VAR = "CSL_SHARDS"
+CONCURRENCY_ENV_VAR = "CSL_SHARD_CONCURRENCY"
+DEFAULT_SHARDS = 1
+SHARD_LABEL = contextvars.ContextVar("csl_back_shard_label", default="")
+
+
+def log(message):
+    # Shards interleave on one event loop; each shard task carries its own label in its context.
+    print(f"{SHARD_LABEL.get()}{message}")
 
 
 async def ensure_search_root(page, cookie_state):
@@ -44,20 +61,12 @@ async def ensure_search_root(page, cookie_state):
 
 
 async def wait_result_ready(page, timeout=12000):
-    # Wait until any typical result container appears after search.
-    candidates = [
-        page.locator("tr.ivu-table-row").first,
-        page.locator(".result-service-content").first,
-        page.locator(".time-line-wrap").first,
-    ]
-    for locator in candidates:
-        try:
-            await locator.wait_for(state="visible", timeout=timeout)
-            return
-        except Exception:
-            continue
-    # Soft fallback: keep flow moving while still giving page time to render.
-    await page.wait_for_timeout(1500)
+    # Any typical result container counts; waiting on the union avoids paying the timeout per candidate.
+    results = page.locator("tr.ivu-table-row, .result-service-content, .time-line-wrap").first
+    try:
+        await results.wait_for(state="visible", timeout=timeout)
+    except PlaywrightTimeoutError:
+        await settle(page)
 
 
 async def open_search_once(page):
@@ -65,13 +74,19 @@ async def open_search_once(page):
     await page.wait_for_load_state("networkidle", timeout=60000)
 
 
+async def settle(page, timeout=SETTLE_TIMEOUT_MS):
+    try:
+        await page.wait_for_load_state("networkidle", timeout=timeout)
+    except PlaywrightTimeoutError:
+        pass
+
+
 async def maybe_accept_cookie_once(page, cookie_state):
     if cookie_state["attempted"]:
         return
     cookie_state["attempted"] = True
     try:
         await click_by_text(page, "允许全部", timeout=2500)
-        await page.wait_for_timeout(500)
         cookie_state["accepted"] = True
     except Exception:
         cookie_state["accepted"] = False
@@ -86,43 +101,34 @@ async def ensure_search_form_visible(page, timeout=6000):
 async def back_to_search(page):
     try:
         await page.go_back(wait_until="domcontentloaded", timeout=8000)
-        await page.wait_for_load_state("networkidle", timeout=8000)
-        await page.wait_for_timeout(600)
+        await settle(page)
     except Exception:
         # Fallback to fresh search page when history is not usable.
         await open_search_once(page)
-        await page.wait_for_timeout(500)
 
 
 async def back_to_service_selection(page):
     try:
         # 1st back: resultByServicePorts -> serviceDetails
         await page.go_back(wait_until="domcontentloaded", timeout=8000)
-        await page.wait_for_load_state("networkidle", timeout=8000)
-        await page.wait_for_timeout(500)
+        await settle(page)
         # 2nd back: serviceDetails -> searchByService
         await page.go_back(wait_until="domcontentloaded", timeout=8000)
-        await page.wait_for_load_state("networkidle", timeout=8000)
-        await page.wait_for_timeout(700)
+        await settle(page)
     except Exception:
         await open_search_once(page)
-        await page.wait_for_timeout(500)
 
 
 async def enter_service(page, service_code):
     service_group = normalize_service_group(service_code)
     await click_by_text(page, "欧洲航线", timeout=1500)
-    # await page.wait_for_timeout(300)
     await click_by_text(page, service_group, timeout=3000)
-    # await page.wait_for_timeout(500)
     await select_service_in_group(page, service_group, service_code, timeout=3500)
     await ensure_search_form_visible(page, timeout=5000)
-    await page.wait_for_timeout(400)
 
 
 async def query_first_port(page, service_code, port):
     await choose_port(page, port, timeout=3000)
-    await page.wait_for_timeout(400)
     await trigger_search(page, timeout=1500)
     await wait_result_ready(page, timeout=5000)
     return await select_period_and_capture_from_details(page, timeout=4000)
@@ -133,7 +139,6 @@ async def query_port_from_details_placeholder(page, port):
     await input_locator.wait_for(state="visible", timeout=5000)
     await input_locator.click(timeout=2000)
     await input_locator.fill(port, timeout=2000)
-    await page.wait_for_timeout(300)
 
     suggestion_candidates = [
         page.locator(".ivu-select-dropdown .ivu-select-item", has_text=port).first,
@@ -144,6 +149,7 @@ async def query_port_from_details_placeholder(page, port):
         try:
             await item.wait_for(state="visible", timeout=1500)
             await item.click(timeout=1500)
+            await wait_until_hidden(item, timeout=1500)
             break
         except Exception:
             continue
@@ -158,21 +164,7 @@ async def query_port_from_details_placeholder(page, port):
 
 
 async def select_period_and_capture_from_details(page, timeout=4000):
-    matched_responses = []
-
-    def on_response(response):
-        if "/ebschedule/public/purpoShipment/service/port" not in response.url:
-            return
-        matched_responses.append(
-            {
-                "url": response.url,
-                "status": response.status,
-                "content_type": response.headers.get("content-type", ""),
-            }
-        )
-
-    page.on("response", on_response)
-    try:
+    async def select_eight_weeks():
         # Prefer the period selector right next to "查询期间" on detail page.
         candidates = [
             page.locator("xpath=//*[contains(normalize-space(),'查询期间')]/following::*[contains(@class,'ivu-select-selection')][1]").first,
@@ -195,33 +187,9 @@ async def select_period_and_capture_from_details(page, timeout=4000):
         option = page.locator(".ivu-select-dropdown .ivu-select-item", has_text="八周内").first
         await option.wait_for(state="visible", timeout=timeout)
         await option.click(timeout=timeout)
-        await page.wait_for_timeout(2500)
-    finally:
-        page.remove_listener("response", on_response)
-
-    if not matched_responses:
-        raise RuntimeError("No schedule response captured after selecting 八周内.")
 
-    target = None
-    for item in reversed(matched_responses):
-        if "period=56" in item["url"]:
-            target = item
-            break
-    if target is None:
-        target = matched_responses[-1]
-
-    response_text = await page.evaluate(
-        """
-        async (targetUrl) => {
-            const response = await fetch(targetUrl, {
-                method: 'GET',
-                credentials: 'include',
-            });
-            return await response.text();
-        }
-        """,
-        target["url"],
-    )
+    target = await capture_schedule_response(page, select_eight_weeks)
+    response_text = await read_schedule_response_text(page, target)
     return json.loads(response_text)
 
 
@@ -234,7 +202,7 @@ async def query_with_retry(page, service_code, port, use_placeholder):
             return await query_first_port(page, service_code, port)
         except Exception as exc:
             last_error = exc
-            print(f"Fetch failed for {service_code}/{port} attempt {attempt}/{QUERY_RETRY_ATTEMPTS}: {exc}")
+            log(f"Fetch failed for {service_code}/{port} attempt {attempt}/{QUERY_RETRY_ATTEMPTS}: {exc}")
             if attempt < QUERY_RETRY_ATTEMPTS:
                 await asyncio.sleep(RETRY_BASE_DELAY_SECONDS * attempt)
     raise RuntimeError(f"Failed to fetch {service_code}/{port}: {last_error}")
@@ -243,12 +211,12 @@ async def query_with_retry(page, service_code, port, use_placeholder):
 async def process_service(page, service_code, service_rules):
     service_rule = service_rules[service_code]
     ports = build_query_ports(service_rule, include_alternatives=True)
-    print(f"Target service: {service_code}")
+    log(f"Target service: {service_code}")
 
     raw_rows = []
     for idx, port in enumerate(ports):
         try:
-            print(f"Query {service_code} / {port}")
+            log(f"Query {service_code} / {port}")
             if idx == 0:
                 await enter_service(page, service_code)
                 response_json = await query_with_retry(page, service_code, port, use_placeholder=False)
@@ -263,18 +231,18 @@ async def process_service(page, service_code, service_rules):
                     response_json = await query_with_retry(page, service_code, port, use_placeholder=False)
             rows = extract_port_call_rows(response_json)
             port_voyages, port_calls = parse_tables_from_rows(rows, service_rules)
-            print(f"Result {service_code} / {port}: voyages={len(port_voyages)}, port calls={len(port_calls)}")
+            log(f"Result {service_code} / {port}: voyages={len(port_voyages)}, port calls={len(port_calls)}")
             for row in rows:
                 cloned = dict(row)
                 cloned["QueryPorts"] = [port]
                 raw_rows.append(cloned)
         except Exception as exc:
-            print(f"Skipped port {port} for {service_code}: {exc}")
+            log(f"Skipped port {port} for {service_code}: {exc}")
 
     deduped_rows = dedupe_port_calls(raw_rows)
     voyages, calls = parse_tables_from_rows(deduped_rows, service_rules)
     result_file = save_tables_to_excel(voyages, calls, service_code, "MULTIPORT", "BACK_DEDUPED")
-    print(f"后退按钮多港去重结果已保存: {result_file}")
+    log(f"后退按钮多港去重结果已保存: {result_file}")
 
     total_voyages = []
     for row in voyages:
@@ -298,56 +266,106 @@ async def process_service(page, service_code, service_rules):
     }
 
 
+async def run_back_flow(page, target_services, service_rules):
+    cookie_state = {"attempted": False, "accepted": False}
+    await open_search_once(page)
+    await maybe_accept_cookie_once(page, cookie_state)
+
+    async def _run_service(service_code):
+        await ensure_search_root(page, cookie_state)
+        return await process_service(page, service_code, service_rules)
+
+    async def _after_success(service_code, _summary):
+        if service_code != target_services[-1]:
+            try:
+                await back_to_service_selection(page)
+                await ensure_search_root(page, cookie_state)
+            except Exception as exc:
+                # Transition failure should not invalidate already-saved service result.
+                log(f"Warning: service switch back-steps failed after {service_code}: {exc}")
+                await open_search_once(page)
+                await maybe_accept_cookie_once(page, cookie_state)
+
+    return await run_async_item_batch(
+        target_services,
+        _run_service,
+        item_label="Service",
+        after_success=_after_success,
+        log=log,
+    )
+
+
+def split_into_shards(items, shard_count):
+    # Contiguous slices, so concatenating shard outputs keeps the requested service order.
+    shard_count = max(1, min(shard_count, len(items)))
+    size, extra = divmod(len(items), shard_count)
+    shards = []
+    start = 0
+    for index in range(shard_count):
+        end = start + size + (1 if index < extra else 0)
+        shards.append(items[start:end])
+        start = end
+    return [shard for shard in shards if shard]
+
+
+async def run_shard(pool, shard_index, shard_count, services, service_rules):
+    if shard_count > 1:
+        SHARD_LABEL.set(f"[shard {shard_index}/{shard_count}] ")
+    try:
+        # Each lease is its own browser context, so shards never share cookies or history.
+        async with pool.lease() as lease:
+            return await run_back_flow(lease.page, services, service_rules)
+    except Exception as exc:
+        log(f"Shard failed: {exc}")
+        return [{"service": service_code, "error": str(exc)} for service_code in services], [], []
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch CSL schedules through the back-navigation UI flow.")
+    parser.add_argument("services", nargs="*", help="Optional service codes to fetch.")
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=env_number(SHARDS_ENV_VAR, DEFAULT_SHARDS, int),
+        help=f"Split the services across this many isolated browser contexts (env {SHARDS_ENV_VAR}).",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=env_number(CONCURRENCY_ENV_VAR, 0, int),
+        help=f"Max shards running at once, 0 for all (env {CONCURRENCY_ENV_VAR}).",
+    )
+    return parser.parse_args(argv)
+
+
 async def main():
+    args = parse_args(sys.argv[1:])
     service_rules = load_service_rules()
-    target_services = get_target_services(service_rules)
+    target_services = get_target_services(service_rules, argv=args.services)
     ensure_query_dir()
     print(f"Services to process: {target_services}")
 
-    cookie_state = {"attempted": False, "accepted": False}
-    headless = is_headless_enabled()
-
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=headless)
-        context = await browser.new_context(
-            user_agent=(
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/145.0.0.0 Safari/537.36"
-            ),
-            locale="zh-CN",
-        )
-        await Stealth().apply_stealth_async(context)
-        page = await context.new_page()
-
-        try:
-            await prepare_page(page)
-            await open_search_once(page)
-            await maybe_accept_cookie_once(page, cookie_state)
-            async def _run_service(service_code):
-                await ensure_search_root(page, cookie_state)
-                return await process_service(page, service_code, service_rules)
-
-            async def _after_success(service_code, _summary):
-                await page.wait_for_timeout(800)
-                if service_code != target_services[-1]:
-                    try:
-                        await back_to_service_selection(page)
-                        await ensure_search_root(page, cookie_state)
-                    except Exception as exc:
-                        # Transition failure should not invalidate already-saved service result.
-                        print(f"Warning: service switch back-steps failed after {service_code}: {exc}")
-                        await open_search_once(page)
-                        await maybe_accept_cookie_once(page, cookie_state)
-
-            results, batch_voyages, batch_port_calls = await run_async_item_batch(
-                target_services,
-                _run_service,
-                item_label="Service",
-                after_success=_after_success,
+    shards = split_into_shards(target_services, args.shards)
+    concurrency = min(args.concurrency, len(shards)) if args.concurrency > 0 else len(shards)
+    if len(shards) > 1:
+        print(f"Running {len(shards)} shards, up to {concurrency} at once.")
+        for index, services in enumerate(shards, start=1):
+            print(f"Shard {index}: {services}")
+
+    results, batch_voyages, batch_port_calls = [], [], []
+    async with BrowserPool(headless=is_headless_enabled(), size=max(concurrency, 1)) as pool:
+        shard_outputs = await asyncio.gather(
+            *(
+                run_shard(pool, index, len(shards), services, service_rules)
+                for index, services in enumerate(shards, start=1)
             )
-        finally:
-            await browser.close()
+        )
+        if len(shards) > 1:
+            print(f"Browser pool: {pool.summary()}")
+    for shard_results, shard_voyages, shard_port_calls in shard_outputs:
+        results.extend(shard_results)
+        batch_voyages.extend(shard_voyages)
+        batch_port_calls.extend(shard_port_calls)
 
     summary_path = save_summary_workbook(QUERY_DIR, "CSL_FETCH_BATCH_SUMMARY_BACK", results)
     detail_path = save_timestamped_voyage_portcall_workbook(
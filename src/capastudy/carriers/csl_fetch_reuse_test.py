@@ -1,12 +1,11 @@
 import asyncio
-from playwright.async_api import async_playwright
-from playwright_stealth import Stealth
 
 from capastudy.carriers.common import (
     run_async_item_batch,
     save_summary_workbook,
     save_timestamped_voyage_portcall_workbook,
 )
+from capastudy.carriers.csl_browser import BrowserPool
 from capastudy.carriers.csl_fetch import (
     QUERY_DIR,
     RETRY_BASE_DELAY_SECONDS,
@@ -23,7 +22,6 @@ from capastudy.carriers.csl_fetch import (
     load_service_rules,
     normalize_service_group,
     parse_tables_from_rows,
-    prepare_page,
     save_tables_to_excel,
     select_service_in_group,
     trigger_search,
@@ -43,7 +41,6 @@ async def maybe_accept_cookie_once(page, cookie_state):
     cookie_state["attempted"] = True
     try:
         await click_by_text(page, "允许全部", timeout=2500)
-        await page.wait_for_timeout(500)
         cookie_state["accepted"] = True
     except Exception:
         cookie_state["accepted"] = False
@@ -55,15 +52,10 @@ async def query_single_port(page, service_code, port, cookie_state):
     await maybe_accept_cookie_once(page, cookie_state)
 
     await click_by_text(page, "欧洲航线", timeout=2500)
-    await page.wait_for_timeout(300)
     await click_by_text(page, service_group, timeout=3000)
-    await page.wait_for_timeout(500)
     await select_service_in_group(page, service_group, service_code, timeout=3500)
-    await page.wait_for_timeout(800)
     await choose_port(page, port, timeout=3000)
-    await page.wait_for_timeout(400)
     await trigger_search(page, timeout=1500)
-    await page.wait_for_timeout(700)
     return await choose_period_and_capture(page, timeout=3500)
 
 
@@ -136,35 +128,16 @@ async def main():
     cookie_state = {"attempted": False, "accepted": False}
     headless = is_headless_enabled()
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=headless)
-        context = await browser.new_context(
-            user_agent=(
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/145.0.0.0 Safari/537.36"
-            ),
-            locale="zh-CN",
-        )
-        await Stealth().apply_stealth_async(context)
-        page = await context.new_page()
+    async with BrowserPool(headless=headless) as pool, pool.lease() as lease:
+        page = lease.page
+        async def _run_service(service_code):
+            return await process_service(page, service_code, service_rules, cookie_state)
 
-        try:
-            await prepare_page(page)
-            async def _run_service(service_code):
-                return await process_service(page, service_code, service_rules, cookie_state)
-
-            async def _after_success(_service_code, _summary):
-                await page.wait_for_timeout(800)
-
-            results, batch_voyages, batch_port_calls = await run_async_item_batch(
-                target_services,
-                _run_service,
-                item_label="Service",
-                after_success=_after_success,
-            )
-        finally:
-            await browser.close()
+        results, batch_voyages, batch_port_calls = await run_async_item_batch(
+            target_services,
+            _run_service,
+            item_label="Service",
+        )
 
     summary_path = save_summary_workbook(QUERY_DIR, "CSL_FETCH_BATCH_SUMMARY_RELOAD", results)
     detail_path = save_timestamped_voyage_portcall_workbook(
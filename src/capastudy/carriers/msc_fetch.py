@@ -1,27 +1,50 @@
-﻿import re
+﻿import argparse
+import os
+import re
 import sys
-import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 import pandas as pd
-import requests
 
 from capastudy.carriers.common import (
     PORT_CALL_COLUMNS,
     VOYAGE_COLUMNS,
     choose_requested_items,
+    JsonDiskCache,
     ensure_directory,
+    env_number,
+    get_http_client,
     run_item_batch,
     save_timestamped_voyage_portcall_workbook,
 )
+from capastudy.carriers.msc_od_stats import (
+    load_od_stats,
+    pair_coverage,
+    pair_label,
+    record_run,
+    save_od_stats,
+    select_pairs,
+)
 from capastudy.settings import (
+    MSC_CACHE_DIR as CACHE_DIR,
     MSC_QUERY_DIR as QUERY_DIR,
     MSC_SERVICE_RULES_XLSX as SERVICE_RULES_XLSX_PRIMARY,
     MSC_SERVICE_RULES_XLSX_FALLBACK as SERVICE_RULES_XLSX_FALLBACK,
 )
+from capastudy.timestamps import TimestampParser
 
-SEARCH_URL = "https://www.msc.com/api/feature/tools/SearchSailingRoutes"
+SEARCH_URL = os.getenv("MSC_SEARCH_URL", "https://www.msc.com/api/feature/tools/SearchSailingRoutes")
 DATA_SOURCE_ID = "{E9CCBD25-6FBA-4C5C-85F6-FC4F9E5A931F}"
+WORKERS_ENV_VAR = "MSC_WORKERS"
+RATE_ENV_VAR = "MSC_RATE"
+DEFAULT_WORKERS = 4
+DEFAULT_RATE = 0.0
+CACHE_TTL_ENV_VAR = "MSC_CACHE_TTL_HOURS"
+DEFAULT_CACHE_TTL_HOURS = 12.0
+DEFAULT_SMART_WINDOW = 3
+DEFAULT_FULL_SWEEP_DAYS = 7.0
 
 HEADERS = {
     "Accept": "application/json, text/plain, */*",
@@ -54,28 +77,38 @@ def service_matches_loading(service_code, loading_service):
     return loading_norm in {service_norm, f"{service_norm}SERVICE"}
 
 
-def parse_msc_datetime(date_text, hour_text=None):
+MSC_DATETIME_FORMATS = ("%a %d %b %Y %H:%M", "%a %d %b %Y", "%Y-%m-%dT%H:%M:%S")
+
+
+def strip_ordinals(text):
+    return re.sub(r"(\d{1,2})(st|nd|rd|th)", r"\1", text)
+
+
+# Route ETD/ETA and port-call dates come in different formats, so each gets its own parser.
+ROUTE_TIMESTAMPS = TimestampParser(MSC_DATETIME_FORMATS, clean=strip_ordinals)
+PORT_CALL_TIMESTAMPS = TimestampParser(MSC_DATETIME_FORMATS, clean=strip_ordinals)
+
+
+def msc_datetime_text(date_text, hour_text=None):
     date_part = str(date_text).strip() if date_text else ""
     hour_part = str(hour_text).strip() if hour_text else ""
     if not date_part:
-        return None
-    cleaned = re.sub(r"(\d{1,2})(st|nd|rd|th)", r"\1", date_part)
-    candidate = f"{cleaned} {hour_part}".strip()
-    for fmt in ("%a %d %b %Y %H:%M", "%a %d %b %Y", "%Y-%m-%dT%H:%M:%S"):
-        try:
-            return datetime.strptime(candidate, fmt)
-        except ValueError:
-            continue
-    return None
+        return ""
+    return f"{date_part} {hour_part}".strip()
 
 
-def format_msc_datetime(date_text, hour_text=None):
-    dt = parse_msc_datetime(date_text, hour_text)
-    return dt.strftime("%Y-%m-%d %H:%M") if dt else None
+def parse_msc_datetime(date_text, hour_text=None, parser=PORT_CALL_TIMESTAMPS):
+    text = msc_datetime_text(date_text, hour_text)
+    return parser.parse(text) if text else None
+
+
+def format_msc_datetime(date_text, hour_text=None, parser=PORT_CALL_TIMESTAMPS):
+    text = msc_datetime_text(date_text, hour_text)
+    return parser.format(text) if text else None
 
 
 def format_route_datetime(route_text):
-    return format_msc_datetime(route_text)
+    return format_msc_datetime(route_text, parser=ROUTE_TIMESTAMPS)
 
 
 def ensure_query_dir():
@@ -183,22 +216,25 @@ def build_payload(from_port_id, to_port_id, from_date):
     }
 
 
-def request_schedule(payload):
-    last_error = None
-    for attempt in range(1, 4):
-        try:
-            response = requests.post(SEARCH_URL, headers=HEADERS, json=payload, timeout=30)
-            response.raise_for_status()
-            obj = response.json()
-            if not obj.get("IsSuccess", True):
-                raise RuntimeError(f"MSC response IsSuccess=false for payload {payload}")
-            return obj
-        except Exception as exc:
-            last_error = exc
-            if attempt < 3:
-                time.sleep(2 * attempt)
-            else:
-                raise last_error
+def check_schedule_response(obj):
+    if not isinstance(obj, dict) or not obj.get("IsSuccess", True):
+        raise ValueError("MSC response IsSuccess=false")
+
+
+def request_schedule(payload, cache=None):
+    if cache is not None:
+        cached = cache.get(SEARCH_URL, payload)
+        if cached is not None:
+            return cached
+    try:
+        obj = get_http_client().request_json(
+            "POST", SEARCH_URL, check=check_schedule_response, headers=HEADERS, json=payload, timeout=30
+        )
+    except ValueError as exc:
+        raise RuntimeError(f"{exc} for payload {payload}") from exc
+    if cache is not None:
+        cache.put(SEARCH_URL, payload, obj)
+    return obj
 
 
 def extract_route_rows(service_code, query_port_name, end_port_name, response_json):
@@ -405,43 +441,172 @@ def save_detail(voyage_rows, port_call_rows):
     )
 
 
-def process_service(service_code, service_rule, from_date):
+def service_pairs(service_rule):
+    starts = dedupe_name_id_pairs(service_rule.get("starts", []))
+    ends = dedupe_name_id_pairs(service_rule.get("ends", []))
+    return [(start, end) for start in starts for end in ends]
+
+
+def payload_key(payload):
+    return (payload["fromPortId"], payload["toPortId"], payload["FromDate"])
+
+
+class QueryCoalescer:
+    def __init__(self, fetch, executor):
+        self.fetch = fetch
+        self.executor = executor
+        self.futures = {}
+        self.lock = threading.Lock()
+
+    def submit(self, payload):
+        key = payload_key(payload)
+        with self.lock:
+            future = self.futures.get(key)
+            if future is None:
+                future = self.executor.submit(self.fetch, payload)
+                self.futures[key] = future
+            return future
+
+    def result(self, payload):
+        return self.submit(payload).result()
+
+
+def plan_queries(target_services, pairs_by_service, from_date):
+    planned = {}
+    pair_count = 0
+    for service_code in target_services:
+        for (_, start_id), (_, end_id) in pairs_by_service[service_code]:
+            payload = build_payload(start_id, end_id, from_date)
+            planned.setdefault(payload_key(payload), payload)
+            pair_count += 1
+    return list(planned.values()), pair_count
+
+
+def process_service(service_code, service_rule, from_date, fetch=request_schedule, pairs=None, coverage=None):
     all_voyages = []
     all_port_calls = []
 
-    starts = dedupe_name_id_pairs(service_rule.get("starts", []))
-    ends = dedupe_name_id_pairs(service_rule.get("ends", []))
-    if not starts or not ends:
+    if pairs is None:
+        pairs = service_pairs(service_rule)
+    if not pairs:
         return [], []
 
-    for start_name, start_id in starts:
-        for end_name, end_id in ends:
-            payload = build_payload(start_id, end_id, from_date)
-            response_json = request_schedule(payload)
-            voyage_rows, port_call_rows = extract_route_rows(
-                service_code,
-                start_name,
-                end_name,
-                response_json,
-            )
-            all_voyages.extend(voyage_rows)
-            all_port_calls.extend(port_call_rows)
+    for pair in pairs:
+        (start_name, start_id), (end_name, end_id) = pair
+        response_json = fetch(build_payload(start_id, end_id, from_date))
+        voyage_rows, port_call_rows = extract_route_rows(
+            service_code,
+            start_name,
+            end_name,
+            response_json,
+        )
+        if coverage is not None:
+            coverage[pair_label(pair)] = pair_coverage(voyage_rows, port_call_rows)
+        all_voyages.extend(voyage_rows)
+        all_port_calls.extend(port_call_rows)
 
     deduped_voyages = dedupe_voyages(all_voyages)
     deduped_port_calls = dedupe_port_calls(all_port_calls, deduped_voyages)
     return deduped_voyages, deduped_port_calls
 
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch MSC sailing schedules for the configured services.")
+    parser.add_argument("services", nargs="*", help="Optional service codes to fetch.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=env_number(WORKERS_ENV_VAR, DEFAULT_WORKERS, int),
+        help=f"Concurrent SearchSailingRoutes requests across services and OD pairs (env {WORKERS_ENV_VAR}).",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=env_number(RATE_ENV_VAR, DEFAULT_RATE, float),
+        help=f"Max requests per second to the MSC host, 0 for unlimited (env {RATE_ENV_VAR}).",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=env_number(CACHE_TTL_ENV_VAR, DEFAULT_CACHE_TTL_HOURS, float),
+        help=f"Hours a cached SearchSailingRoutes response stays valid (env {CACHE_TTL_ENV_VAR}).",
+    )
+    parser.add_argument(
+        "--smart",
+        action="store_true",
+        help="Skip OD pairs that added no voyages or port calls beyond the other pairs over recent runs.",
+    )
+    parser.add_argument(
+        "--smart-window",
+        type=int,
+        default=DEFAULT_SMART_WINDOW,
+        help="Number of recent runs whose pair coverage --smart must preserve.",
+    )
+    parser.add_argument(
+        "--full-sweep-days",
+        type=float,
+        default=DEFAULT_FULL_SWEEP_DAYS,
+        help="With --smart, query every pair of a service again once its last full sweep is this old.",
+    )
+    cache_mode = parser.add_mutually_exclusive_group()
+    cache_mode.add_argument("--no-cache", action="store_true", help="Neither read nor write the response cache.")
+    cache_mode.add_argument("--refresh", action="store_true", help="Ignore cached responses but store fresh ones.")
+    return parser.parse_args(argv)
+
+
 def main():
+    args = parse_args(sys.argv[1:])
     service_rules = load_service_rules()
-    target_services = get_target_services(service_rules, argv=sys.argv[1:])
+    target_services = get_target_services(service_rules, argv=args.services)
     from_date = datetime.now().strftime("%Y-%m-%d")
+    workers = max(args.workers, 1)
     print(f"Services to process: {target_services}")
     print(f"FromDate: {from_date}")
+    print(f"Workers: {workers}, rate limit: {args.rate or 'none'} req/s")
+    get_http_client().configure_host(SEARCH_URL, rate=args.rate, max_concurrency=workers, timeout=30)
+
+    cache = JsonDiskCache(
+        CACHE_DIR,
+        ttl_seconds=max(args.cache_ttl, 0.0) * 3600,
+        read=not (args.no_cache or args.refresh),
+        write=not args.no_cache,
+    )
+    request_executor = ThreadPoolExecutor(max_workers=workers)
+    coalescer = QueryCoalescer(lambda payload: request_schedule(payload, cache), request_executor)
+    now = datetime.now()
+    od_stats = load_od_stats()
+    pairs_by_service = {service_code: service_pairs(service_rules[service_code]) for service_code in target_services}
+    full_services = set(target_services)
+    if args.smart:
+        for service_code in target_services:
+            all_pairs = pairs_by_service[service_code]
+            selected, reason = select_pairs(od_stats, service_code, all_pairs, args.smart_window, args.full_sweep_days, now)
+            if len(selected) < len(all_pairs):
+                full_services.discard(service_code)
+                skipped = [pair_label(pair) for pair in all_pairs if pair not in selected]
+                print(f"Smart plan {service_code}: {len(selected)}/{len(all_pairs)} OD pairs ({reason}; skipped {', '.join(skipped)})")
+            pairs_by_service[service_code] = selected
+
+    planned_payloads, pair_count = plan_queries(target_services, pairs_by_service, from_date)
+    print(f"Planned {len(planned_payloads)} distinct OD queries for {pair_count} service OD pairs")
+    # Every distinct query starts now; services then pick up the shared responses in rule order.
+    for payload in planned_payloads:
+        coalescer.submit(payload)
+
+    coverage_by_service = {}
 
     def _run_service(service_code):
         print(f"Target service: {service_code}")
-        voyages, port_calls = process_service(service_code, service_rules[service_code], from_date)
+        coverage = {}
+        voyages, port_calls = process_service(
+            service_code,
+            service_rules[service_code],
+            from_date,
+            coalescer.result,
+            pairs=pairs_by_service[service_code],
+            coverage=coverage,
+        )
+        coverage_by_service[service_code] = coverage
         print(f"Retained voyages: {len(voyages)}")
         print(f"Retained port calls: {len(port_calls)}")
         return {
@@ -452,16 +617,21 @@ def main():
             "total_port_calls": port_calls,
         }
 
-    _results, batch_voyages, batch_port_calls = run_item_batch(
-        target_services,
-        _run_service,
-        item_label="Service",
-    )
+    try:
+        _results, batch_voyages, batch_port_calls = run_item_batch(
+            target_services,
+            _run_service,
+            item_label="Service",
+        )
+    finally:
+        request_executor.shutdown(wait=True, cancel_futures=True)
 
+    print(f"Response cache: {cache.summary()}")
+    record_run(od_stats, pairs_by_service, coverage_by_service, full_services, from_date, now)
+    print(f"OD pair stats saved: {save_od_stats(od_stats)}")
     detail_path = save_detail(batch_voyages, batch_port_calls)
     print(f"Batch detail tables saved: {detail_path}")
 
 
 if __name__ == "__main__":
     main()
-
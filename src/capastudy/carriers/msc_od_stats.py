@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Sequence, Set, Tuple
+
+from capastudy.carriers.common import ensure_directory
+from capastudy.settings import MSC_OD_PAIR_STATS_JSON
+
+MAX_RUNS = 10
+
+Pair = Tuple[Tuple[str, int], Tuple[str, int]]
+
+
+def pair_label(pair: Pair) -> str:
+    (_, start_id), (_, end_id) = pair
+    return f"{start_id}>{end_id}"
+
+
+def voyage_key(row: Mapping[str, object]) -> str:
+    return f"{row.get('VesselCode') or ''}|{row.get('Voyage') or ''}"
+
+
+def call_key(row: Mapping[str, object]) -> str:
+    return f"{voyage_key(row)}|{row.get('PortName') or ''}"
+
+
+def pair_coverage(voyage_rows: Iterable[Mapping[str, object]], port_call_rows: Iterable[Mapping[str, object]]) -> Dict[str, Set[str]]:
+    return {
+        "voyages": {voyage_key(row) for row in voyage_rows},
+        "calls": {call_key(row) for row in port_call_rows},
+    }
+
+
+def load_od_stats(path: Path = MSC_OD_PAIR_STATS_JSON) -> Dict[str, object]:
+    try:
+        stats = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        stats = {}
+    stats.setdefault("last_full_sweep", {})
+    stats.setdefault("runs", [])
+    return stats
+
+
+def save_od_stats(stats: Dict[str, object], path: Path = MSC_OD_PAIR_STATS_JSON) -> Path:
+    ensure_directory(path.parent)
+    stats["runs"] = stats["runs"][-MAX_RUNS:]
+    tmp_path = path.with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps(stats, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp_path.replace(path)
+    return path
+
+
+def marginal_counts(pair_items: Mapping[str, Set[str]]) -> Dict[str, int]:
+    counts = {}
+    for label, items in pair_items.items():
+        others: Set[str] = set()
+        for other_label, other_items in pair_items.items():
+            if other_label != label:
+                others |= other_items
+        counts[label] = len(items - others)
+    return counts
+
+
+def greedy_cover(pair_items: Mapping[str, Set[str]], order: Sequence[str]) -> List[str]:
+    candidates = [label for label in order if label in pair_items]
+    uncovered = set().union(*(pair_items[label] for label in candidates)) if candidates else set()
+    chosen: List[str] = []
+    while uncovered:
+        # Ties go to the earlier pair in rule order, so primary START/END pairs win.
+        best = max(candidates, key=lambda label: (len(pair_items[label] & uncovered), -candidates.index(label)))
+        if not pair_items[best] & uncovered:
+            break
+        chosen.append(best)
+        uncovered -= pair_items[best]
+    return chosen
+
+
+def full_sweep_due(stats: Mapping[str, object], service_code: str, full_sweep_days: float, now: datetime) -> bool:
+    last_full = stats["last_full_sweep"].get(service_code)
+    if not last_full:
+        return True
+    try:
+        return now - datetime.fromisoformat(last_full) >= timedelta(days=full_sweep_days)
+    except ValueError:
+        return True
+
+
+def select_pairs(
+    stats: Mapping[str, object],
+    service_code: str,
+    pairs: Sequence[Pair],
+    window: int,
+    full_sweep_days: float,
+    now: datetime,
+) -> Tuple[List[Pair], str]:
+    if not pairs:
+        return [], "no pairs"
+    if full_sweep_due(stats, service_code, full_sweep_days, now):
+        return list(pairs), "full sweep due"
+
+    history = [run["services"][service_code] for run in stats["runs"] if service_code in run.get("services", {})]
+    labels = [pair_label(pair) for pair in pairs]
+    observed = {label for entry in history for label in entry}
+    keep = {label for label in labels if label not in observed}
+    # Cover port calls, not just voyages: alternate END ports add the calls beyond the primary end.
+    for entry in history[-max(window, 1):]:
+        pair_calls = {label: set(info.get("calls") or info.get("voyages") or []) for label, info in entry.items()}
+        keep.update(greedy_cover(pair_calls, labels))
+    if not keep:
+        keep.add(labels[0])
+    selected = [pair for pair, label in zip(pairs, labels) if label in keep]
+    return selected, f"set cover over last {min(len(history), max(window, 1))} runs"
+
+
+def record_run(
+    stats: Dict[str, object],
+    pairs_by_service: Mapping[str, Sequence[Pair]],
+    coverage_by_service: Mapping[str, Mapping[str, Mapping[str, Set[str]]]],
+    full_services: Iterable[str],
+    from_date: str,
+    now: datetime,
+) -> None:
+    services = {}
+    for service_code, coverage in coverage_by_service.items():
+        marginal_voyages = marginal_counts({label: item["voyages"] for label, item in coverage.items()})
+        marginal_calls = marginal_counts({label: item["calls"] for label, item in coverage.items()})
+        entry = {}
+        for pair in pairs_by_service[service_code]:
+            label = pair_label(pair)
+            if label not in coverage:
+                continue
+            (start_name, _), (end_name, _) = pair
+            entry[label] = {
+                "start": start_name,
+                "end": end_name,
+                "marginal_voyages": marginal_voyages[label],
+                "marginal_calls": marginal_calls[label],
+                "voyages": sorted(coverage[label]["voyages"]),
+                "calls": sorted(coverage[label]["calls"]),
+            }
+        services[service_code] = entry
+    for service_code in full_services:
+        if service_code in services:
+            stats["last_full_sweep"][service_code] = now.isoformat(timespec="seconds")
+    stats["runs"].append({"run_at": now.isoformat(timespec="seconds"), "from_date": from_date, "services": services})
@@ -1,16 +1,18 @@
-﻿import re
+﻿import argparse
+import os
+import re
 import sys
-import time
-from datetime import date, datetime, timedelta
+from datetime import date, timedelta
 
 import pandas as pd
-import requests
 
 from capastudy.carriers.common import (
     PORT_CALL_COLUMNS,
     VOYAGE_COLUMNS,
     choose_requested_items,
     ensure_directory,
+    env_number,
+    get_http_client,
     run_item_batch,
     save_timestamped_voyage_portcall_workbook,
 )
@@ -18,8 +20,14 @@ from capastudy.settings import (
     MSK_PORTS_XLSX as PORTS_XLSX,
     MSK_QUERY_DIR as QUERY_DIR,
 )
+from capastudy.timestamps import ISO_FORMAT, TimestampParser
+from capastudy.weeks import week_bounds
 
-PORT_CALLS_URL = 'https://api.maersk.com/synergy/schedules/port-calls'
+PORT_CALLS_URL = os.getenv('MSK_PORT_CALLS_URL', 'https://api.maersk.com/synergy/schedules/port-calls')
+WORKERS_ENV_VAR = 'MSK_WORKERS'
+RATE_ENV_VAR = 'MSK_RATE'
+DEFAULT_WORKERS = 4
+DEFAULT_RATE = 2.0
 
 HEADERS = {
     'accept': 'application/json',
@@ -49,13 +57,14 @@ def guess_direction(voyage):
 
 
 
+PORT_CALL_TIMESTAMPS = TimestampParser((ISO_FORMAT,))
+
+
 def format_iso_datetime(value):
     if not value:
         return None
-    try:
-        return datetime.fromisoformat(str(value)).strftime('%Y-%m-%d %H:%M')
-    except ValueError:
-        return str(value)
+    text = str(value)
+    return PORT_CALL_TIMESTAMPS.format(text) or text
 
 
 
@@ -131,19 +140,8 @@ def build_params(port_code, from_date, to_date):
 
 def request_port_calls(port_code, from_date, to_date):
     params = build_params(port_code, from_date, to_date)
-    last_error = None
-    for attempt in range(1, 4):
-        try:
-            response = requests.get(PORT_CALLS_URL, headers=HEADERS, params=params, timeout=60)
-            response.raise_for_status()
-            obj = response.json()
-            return obj.get('portCalls') if isinstance(obj, dict) else []
-        except Exception as exc:
-            last_error = exc
-            if attempt < 3:
-                time.sleep(attempt * 2)
-            else:
-                raise last_error
+    obj = get_http_client().request_json('GET', PORT_CALLS_URL, headers=HEADERS, params=params, timeout=60)
+    return obj.get('portCalls') if isinstance(obj, dict) else []
 
 
 
@@ -192,13 +190,10 @@ def choose_matched_service_and_voyage(item, allowed_services):
 
 
 
-def process_port_record(rec, from_date, to_date, allowed_services):
+def build_port_call_rows(items, city, geoid, allowed_services):
     allowed_services = {normalize_text(x) for x in allowed_services}
-    city = rec['city']
-    geoid = rec['geoid']
-    print(f'Querying {city} ({geoid})')
     port_rows = []
-    for item in request_port_calls(geoid, from_date, to_date) or []:
+    for item in items or []:
         matched = choose_matched_service_and_voyage(item, allowed_services)
         if not matched:
             continue
@@ -229,7 +224,15 @@ def process_port_record(rec, from_date, to_date, allowed_services):
                 'VesselIMONumber': item.get('vesselIMONumber'),
             }
         )
-    time.sleep(1)
+    return port_rows
+
+
+
+def process_port_record(rec, from_date, to_date, allowed_services):
+    city = rec['city']
+    geoid = rec['geoid']
+    print(f'Querying {city} ({geoid})')
+    port_rows = build_port_call_rows(request_port_calls(geoid, from_date, to_date), city, geoid, allowed_services)
     return {
         'port': city,
         'queried_voyages': count_unique_voyages(port_rows),
@@ -239,35 +242,52 @@ def process_port_record(rec, from_date, to_date, allowed_services):
     }
 
 
-def dedupe_port_calls(rows):
-    unique = {}
-    for row in rows:
-        key = (
-            row.get('LoopAbbrv'),
-            row.get('VesselCode'),
-            row.get('Voyage'),
-            row.get('PortName'),
-            row.get('ArrDtlocCos'),
-            row.get('DepDtlocCos'),
-        )
-        if key not in unique:
-            unique[key] = row
-    result = list(unique.values())
-    grouped = {}
-    for row in result:
-        key = (row.get('LoopAbbrv'), row.get('VesselCode'), row.get('Voyage'))
-        grouped.setdefault(key, []).append(row)
+class PortCallDeduper:
+    def __init__(self):
+        self.unique = {}
+        self.groups = {}
 
-    sequenced = []
-    for _, group in grouped.items():
-        group.sort(key=lambda x: (x.get('ArrDtlocCos') or x.get('DepDtlocCos') or '', x.get('PortName') or ''))
-        for seq, row in enumerate(group, start=1):
-            merged = dict(row)
-            merged['PortCallSeq'] = seq
-            sequenced.append(merged)
+    def add(self, rows):
+        for row in rows:
+            key = (
+                row.get('LoopAbbrv'),
+                row.get('VesselCode'),
+                row.get('Voyage'),
+                row.get('PortName'),
+                row.get('ArrDtlocCos'),
+                row.get('DepDtlocCos'),
+            )
+            if key in self.unique:
+                continue
+            self.unique[key] = row
+            self.groups.setdefault(key[:3], []).append(row)
+
+    @property
+    def voyage_count(self):
+        return len(self.groups)
+
+    @property
+    def port_call_count(self):
+        return len(self.unique)
+
+    def rows(self):
+        sequenced = []
+        for group in self.groups.values():
+            ordered = sorted(group, key=lambda x: (x.get('ArrDtlocCos') or x.get('DepDtlocCos') or '', x.get('PortName') or ''))
+            for seq, row in enumerate(ordered, start=1):
+                merged = dict(row)
+                merged['PortCallSeq'] = seq
+                sequenced.append(merged)
 
-    sequenced.sort(key=lambda x: (x.get('LoopAbbrv') or '', x.get('Voyage') or '', x.get('PortCallSeq') or 0, x.get('VesselCode') or ''))
-    return sequenced
+        sequenced.sort(key=lambda x: (x.get('LoopAbbrv') or '', x.get('Voyage') or '', x.get('PortCallSeq') or 0, x.get('VesselCode') or ''))
+        return sequenced
+
+
+
+def dedupe_port_calls(rows):
+    deduper = PortCallDeduper()
+    deduper.add(rows)
+    return deduper.rows()
 
 
 
@@ -328,19 +348,35 @@ def save_detail(voyage_rows, port_call_rows):
 def build_query_window(reference_date=None):
     if reference_date is None:
         reference_date = date.today()
-    # Keep consistent with project week convention: Saturday is week start.
-    week_start_day = 5  # Monday=0 ... Saturday=5
-    delta = (reference_date.weekday() - week_start_day) % 7
-    current_week_start = reference_date - timedelta(days=delta)
-    current_week_end = current_week_start + timedelta(days=6)
+    # Same Saturday-start weeks as the merge week numbers.
+    current_week_start, current_week_end = week_bounds(reference_date)
     from_date = current_week_start - timedelta(weeks=8)
     to_date = current_week_end + timedelta(weeks=12)
     return from_date.isoformat(), to_date.isoformat(), current_week_start.isoformat(), current_week_end.isoformat()
 
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Fetch MSK port calls for the configured ports.')
+    parser.add_argument('ports', nargs='*', help='Optional port names to fetch.')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=env_number(WORKERS_ENV_VAR, DEFAULT_WORKERS, int),
+        help=f'Ports queried concurrently (env {WORKERS_ENV_VAR}).',
+    )
+    parser.add_argument(
+        '--rate',
+        type=float,
+        default=env_number(RATE_ENV_VAR, DEFAULT_RATE, float),
+        help=f'Max port-call requests per second to the MSK host, 0 for unlimited (env {RATE_ENV_VAR}).',
+    )
+    return parser.parse_args(argv)
+
+
 def main():
+    args = parse_args(sys.argv[1:])
     port_df = load_ports()
-    target_ports = get_target_ports(port_df, argv=sys.argv[1:])
+    target_ports = get_target_ports(port_df, argv=args.ports)
     allowed_services = load_allowed_services()
     from_date, to_date, week_start, week_end = build_query_window()
 
@@ -349,6 +385,8 @@ def main():
     print(f'Current week: {week_start} ~ {week_end} (week start=Saturday)')
     print(f'fromDate: {from_date}')
     print(f'toDate: {to_date}')
+    print(f'Workers: {args.workers}, rate limit: {args.rate or "none"} req/s')
+    get_http_client().configure_host(PORT_CALLS_URL, rate=args.rate, max_concurrency=args.workers, timeout=60)
 
     def _run_port(rec):
         return process_port_record(rec, from_date, to_date, allowed_services)
@@ -357,28 +395,27 @@ def main():
         target_ports.to_dict(orient='records'),
         _run_port,
         item_label='Port',
+        max_workers=args.workers,
     )
-    running_rows = []
+    # Rows arrive in port order, so each port's slice is the next queried_port_calls rows.
+    deduper = PortCallDeduper()
+    offset = 0
     for result in port_results:
+        row_count = result.get('queried_port_calls', 0)
+        deduper.add(raw_port_call_rows[offset:offset + row_count])
+        offset += row_count
         port_name = result.get('port')
         if port_name is None:
             continue
-        matched_rows = [
-            row
-            for row in raw_port_call_rows
-            if normalize_text(row.get('PortName')) == normalize_text(port_name)
-        ]
-        running_rows.extend(matched_rows)
-        retained_rows = dedupe_port_calls(running_rows)
         print(
             f"Port {port_name}: "
             f"queried voyages={result.get('queried_voyages', 0)}, "
             f"queried port calls={result.get('queried_port_calls', 0)}, "
-            f"retained voyages={count_unique_voyages(retained_rows)}, "
-            f"retained port calls={len(retained_rows)}"
+            f"retained voyages={deduper.voyage_count}, "
+            f"retained port calls={deduper.port_call_count}"
         )
 
-    port_call_rows = dedupe_port_calls(raw_port_call_rows)
+    port_call_rows = deduper.rows()
     voyage_rows = build_voyage_rows(port_call_rows)
 
     print(f'Retained voyages: {len(voyage_rows)}')
@@ -3,11 +3,23 @@ from __future__ import annotations
 import argparse
 import asyncio
 import importlib
+import os
 import sys
 from contextlib import contextmanager
 from typing import Iterable, Sequence
 
 
+# Commands whose arguments are handed to the target module's own parser untouched.
+PASSTHROUGH_COMMANDS = {
+    "pipeline": "capastudy.pipeline",
+    "merge": "capastudy.merge_all_carriers",
+    "sync": "capastudy.sync_to_rds",
+    "stats": "capastudy.stats",
+    "bench": "capastudy.bench",
+    "fake-server": "capastudy.fake_carriers",
+}
+
+
 @contextmanager
 def temporary_argv(args: Sequence[str]):
     old_argv = sys.argv[:]
@@ -20,14 +32,12 @@ def temporary_argv(args: Sequence[str]):
 
 def run_sync_main(main_func, args: Sequence[str]) -> int:
     with temporary_argv(args):
-        main_func()
-    return 0
+        return main_func() or 0
 
 
 def run_async_main(main_func, args: Sequence[str]) -> int:
     with temporary_argv(args):
-        asyncio.run(main_func())
-    return 0
+        return asyncio.run(main_func()) or 0
 
 
 def build_parser() -> argparse.ArgumentParser:
@@ -43,17 +53,30 @@ def build_parser() -> argparse.ArgumentParser:
     csl_parser = fetch_subparsers.add_parser("csl", help="Fetch CSL schedules.")
     csl_parser.add_argument(
         "--mode",
-        choices=["back", "reload", "direct"],
+        choices=["back", "reload", "direct", "api"],
         default="back",
         help="Choose the CSL fetch flow to run.",
     )
     csl_parser.add_argument("services", nargs="*", help="Optional service codes to fetch.")
+    csl_parser.add_argument("--shards", type=int, default=None, help="Back flow: split services across N browser contexts.")
+    csl_parser.add_argument("--concurrency", type=int, default=None, help="Back flow: max shards running at once.")
+    csl_parser.add_argument("--lean", action="store_true", help="Block heavy resources and reuse cookies and static assets between runs.")
 
     msc_parser = fetch_subparsers.add_parser("msc", help="Fetch MSC schedules.")
     msc_parser.add_argument("services", nargs="*", help="Optional service codes to fetch.")
+    msc_parser.add_argument("--workers", type=int, default=None, help="Concurrent MSC requests.")
+    msc_parser.add_argument("--rate", type=float, default=None, help="Max MSC requests per second (0 = unlimited).")
+    msc_parser.add_argument("--cache-ttl", type=float, default=None, help="Hours a cached MSC response stays valid.")
+    msc_parser.add_argument("--no-cache", action="store_true", help="Disable the MSC response cache.")
+    msc_parser.add_argument("--refresh", action="store_true", help="Ignore cached MSC responses but store fresh ones.")
+    msc_parser.add_argument("--smart", action="store_true", help="Skip OD pairs with no marginal voyages in recent runs.")
+    msc_parser.add_argument("--smart-window", type=int, default=None, help="Recent runs considered by --smart.")
+    msc_parser.add_argument("--full-sweep-days", type=float, default=None, help="Days between forced full sweeps in --smart mode.")
 
     msk_parser = fetch_subparsers.add_parser("msk", help="Fetch MSK schedules.")
     msk_parser.add_argument("ports", nargs="*", help="Optional port names to fetch.")
+    msk_parser.add_argument("--workers", type=int, default=None, help="Ports queried concurrently.")
+    msk_parser.add_argument("--rate", type=float, default=None, help="Max MSK requests per second (0 = unlimited).")
 
     merge_parser = subparsers.add_parser("merge", help="Merge the latest carrier outputs.")
     merge_parser.add_argument("args", nargs=argparse.REMAINDER, help="Arguments passed through to merge.")
@@ -61,6 +84,15 @@ def build_parser() -> argparse.ArgumentParser:
     sync_parser = subparsers.add_parser("sync", help="Sync current/history workbooks to RDS.")
     sync_parser.add_argument("args", nargs=argparse.REMAINDER, help="Arguments passed through to sync.")
 
+    stats_parser = subparsers.add_parser("stats", help="Show per-step performance trends across recent pipeline runs.")
+    stats_parser.add_argument("args", nargs=argparse.REMAINDER, help="Arguments passed through to stats.")
+
+    bench_parser = subparsers.add_parser("bench", help="Benchmark carrier response parsers on recorded payloads.")
+    bench_parser.add_argument("args", nargs=argparse.REMAINDER, help="Arguments passed through to bench.")
+
+    fake_parser = subparsers.add_parser("fake-server", help="Serve recorded carrier fixtures as local stand-in APIs.")
+    fake_parser.add_argument("args", nargs=argparse.REMAINDER, help="Arguments passed through to fake-server.")
+
     return parser
 
 
@@ -71,17 +103,31 @@ def normalize_passthrough(args: Iterable[str]) -> list[str]:
     return items
 
 
+def forward_options(args: argparse.Namespace, names: Sequence[str]) -> list[str]:
+    items: list[str] = []
+    for name in names:
+        value = getattr(args, name, None)
+        flag = f"--{name.replace('_', '-')}"
+        if value is True:
+            items.append(flag)
+        elif value is not None and value is not False:
+            items += [flag, str(value)]
+    return items
+
+
 def load_callable(module_name: str, attr_name: str = "main"):
     module = importlib.import_module(module_name)
     return getattr(module, attr_name)
 
 
 def main(argv: Sequence[str] | None = None) -> int:
-    parser = build_parser()
-    args = parser.parse_args(list(argv) if argv is not None else None)
+    items = list(argv) if argv is not None else sys.argv[1:]
+    # argparse.REMAINDER drops leading options such as "--only-fetch", so dispatch these directly.
+    if items and items[0] in PASSTHROUGH_COMMANDS:
+        return run_sync_main(load_callable(PASSTHROUGH_COMMANDS[items[0]]), normalize_passthrough(items[1:]))
 
-    if args.command == "pipeline":
-        return run_sync_main(load_callable("capastudy.pipeline"), normalize_passthrough(args.args))
+    parser = build_parser()
+    args = parser.parse_args(items)
 
     if args.command == "fetch":
         if args.carrier == "csl":
@@ -89,18 +135,21 @@ def main(argv: Sequence[str] | None = None) -> int:
                 "back": "capastudy.carriers.csl_fetch_back_test",
                 "reload": "capastudy.carriers.csl_fetch_reuse_test",
                 "direct": "capastudy.carriers.csl_fetch",
+                "api": "capastudy.carriers.csl_fetch_api",
             }
-            return run_async_main(load_callable(csl_main_by_mode[args.mode]), list(args.services))
+            shard_options = [f"--{name}" for name in ("shards", "concurrency") if getattr(args, name) is not None]
+            if shard_options and args.mode != "back":
+                parser.error(f"{', '.join(shard_options)} only apply to --mode back")
+            csl_options = forward_options(args, ("shards", "concurrency"))
+            if args.lean:
+                # Every CSL mode builds its BrowserPool from the environment.
+                os.environ["CSL_LEAN_PROFILE"] = "1"
+            return run_async_main(load_callable(csl_main_by_mode[args.mode]), [*args.services, *csl_options])
         if args.carrier == "msc":
-            return run_sync_main(load_callable("capastudy.carriers.msc_fetch"), list(args.services))
+            msc_options = forward_options(args, ("workers", "rate", "cache_ttl", "no_cache", "refresh", "smart", "smart_window", "full_sweep_days"))
+            return run_sync_main(load_callable("capastudy.carriers.msc_fetch"), [*args.services, *msc_options])
         if args.carrier == "msk":
-            return run_sync_main(load_callable("capastudy.carriers.msk_fetch"), list(args.ports))
-
-    if args.command == "merge":
-        return run_sync_main(load_callable("capastudy.merge_all_carriers"), normalize_passthrough(args.args))
-
-    if args.command == "sync":
-        return run_sync_main(load_callable("capastudy.sync_to_rds"), normalize_passthrough(args.args))
+            return run_sync_main(load_callable("capastudy.carriers.msk_fetch"), [*args.ports, *forward_options(args, ("workers", "rate"))])
 
     parser.error(f"Unsupported command: {args.command}")
     return 2
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from capastudy.bench import CSL_PAYLOADS, MSC_PAYLOADS, MSK_PAYLOADS, load_json, msk_items_from_routings
+from capastudy.settings import PROJECT_ROOT
+
+
+MSC_PATH = "/api/feature/tools/SearchSailingRoutes"
+MSK_PATH = "/synergy/schedules/port-calls"
+CSL_PATH = "/ebschedule/public/purpoShipment/service/port"
+STATS_PATH = "/__stats"
+
+
+@dataclass
+class FakeServerConfig:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    retry_after: float = 1.0
+    seed: Optional[int] = None
+
+
+@dataclass
+class FakeServerState:
+    config: FakeServerConfig
+    msc_response: dict
+    msk_items: Dict[str, List[dict]]
+    csl_responses: Dict[str, dict]
+    counts: Dict[str, int] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    rng: random.Random = field(default_factory=random.Random)
+
+    def count(self, key: str) -> None:
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def roll(self) -> float:
+        with self.lock:
+            return self.rng.random()
+
+
+def load_fixtures(config: FakeServerConfig) -> FakeServerState:
+    msc_response = load_json(MSC_PAYLOADS[0]) if MSC_PAYLOADS[0].exists() else {"IsSuccess": True, "Data": []}
+
+    msk_items: Dict[str, List[dict]] = {}
+    for path in MSK_PAYLOADS:
+        if path.exists():
+            for (_facility, geoid), items in msk_items_from_routings(load_json(path)).items():
+                msk_items.setdefault(geoid, []).extend(items)
+
+    csl_responses: Dict[str, dict] = {}
+    for path in CSL_PAYLOADS:
+        if not path.exists():
+            continue
+        # csl_schedule_response_<SERVICE>_8weeks.json serves that service; everything else is the default.
+        parts = path.stem.split("_")
+        service_code = parts[3].upper() if len(parts) == 5 else ""
+        csl_responses.setdefault(service_code, load_json(path))
+
+    state = FakeServerState(config=config, msc_response=msc_response, msk_items=msk_items, csl_responses=csl_responses)
+    if config.seed is not None:
+        state.rng.seed(config.seed)
+    return state
+
+
+def build_handler(state: FakeServerState):
+    class FakeCarrierHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *_args) -> None:
+            return None
+
+        def send_json(self, status: int, body: object, headers: Optional[Dict[str, str]] = None) -> None:
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def read_body(self) -> bytes:
+            length = int(self.headers.get("Content-Length") or 0)
+            return self.rfile.read(length) if length else b""
+
+        def simulate(self, key: str) -> bool:
+            config = state.config
+            delay_ms = config.latency_ms + (state.roll() * config.jitter_ms if config.jitter_ms else 0.0)
+            if delay_ms > 0:
+                time.sleep(delay_ms / 1000)
+            roll = state.roll()
+            if roll < config.throttle_rate:
+                state.count(f"{key}:429")
+                self.send_json(429, {"error": "Too Many Requests"}, {"Retry-After": f"{config.retry_after:g}"})
+                return False
+            if roll < config.throttle_rate + config.error_rate:
+                state.count(f"{key}:500")
+                self.send_json(500, {"error": "Injected failure"})
+                return False
+            state.count(f"{key}:200")
+            return True
+
+        def do_GET(self) -> None:
+            parsed = urlsplit(self.path)
+            query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+            if parsed.path == STATS_PATH:
+                with state.lock:
+                    self.send_json(200, dict(state.counts))
+                return
+            if parsed.path.endswith(MSK_PATH):
+                if self.simulate("msk"):
+                    port_code = query.get("portCode", "")
+                    items = state.msk_items.get(port_code)
+                    if items is None:
+                        items = [item for port_items in state.msk_items.values() for item in port_items]
+                    self.send_json(200, {"portCalls": items})
+                return
+            if parsed.path.endswith(CSL_PATH):
+                if self.simulate("csl"):
+                    service_code = query.get("serviceCode", "").upper()
+                    response = state.csl_responses.get(service_code) or state.csl_responses.get("") or {"data": {}}
+                    self.send_json(200, response)
+                return
+            self.send_json(404, {"error": f"Unknown path: {parsed.path}"})
+
+        def do_POST(self) -> None:
+            parsed = urlsplit(self.path)
+            self.read_body()
+            if parsed.path.endswith(MSC_PATH):
+                if self.simulate("msc"):
+                    self.send_json(200, state.msc_response)
+                return
+            self.send_json(404, {"error": f"Unknown path: {parsed.path}"})
+
+    return FakeCarrierHandler
+
+
+def start_fake_server(
+    config: Optional[FakeServerConfig] = None,
+    host: str = "127.0.0.1",
+    port: int = 0,
+) -> Tuple[ThreadingHTTPServer, threading.Thread]:
+    state = load_fixtures(config or FakeServerConfig())
+    server = ThreadingHTTPServer((host, port), build_handler(state))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, thread
+
+
+def base_url_for(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def override_env(base_url: str) -> Dict[str, str]:
+    return {
+        "MSC_SEARCH_URL": f"{base_url}{MSC_PATH}",
+        "MSK_PORT_CALLS_URL": f"{base_url}{MSK_PATH}",
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve recorded MSC/MSK/CSL fixtures as local stand-in carrier APIs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Fixed delay added to every response.")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Extra random delay up to this many milliseconds.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500.")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 429.")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429 responses.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible latency/error injection.")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    config = FakeServerConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+    server, thread = start_fake_server(config, host=args.host, port=args.port)
+    base_url = base_url_for(server)
+    print(f"Fake carrier APIs listening on {base_url} (fixtures from {PROJECT_ROOT})")
+    print("Point the fetchers at it with:")
+    for key, value in override_env(base_url).items():
+        print(f"  {key}={value}")
+    print(f"CSL schedule JSON: {base_url}{CSL_PATH}?serviceCode=AEU1")
+    print(f"Request counts: {base_url}{STATS_PATH}")
+    try:
+        thread.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
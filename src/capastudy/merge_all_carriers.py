@@ -1,8 +1,9 @@
 from __future__ import annotations
 
 import argparse
+import os
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List
 
 from capastudy.merge_enrichment import (
     add_alliance_trade_columns,
@@ -14,7 +15,7 @@ from capastudy.merge_enrichment import (
     ensure_vessel_db_coverage,
 )
 from capastudy.merge_loading import load_latest_all, load_service_meta_map, load_vessel_maps
-from capastudy.merge_state import save_merged, save_update_outputs
+from capastudy.merge_state import ROW_HASH_FORMATS, save_merged, save_update_outputs
 
 
 def parse_args() -> argparse.Namespace:
@@ -24,12 +25,36 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Only produce timestamped merged file; do not maintain current/history/changes state.",
     )
+    parser.add_argument(
+        "--source",
+        action="append",
+        default=[],
+        metavar="CARRIER=PATH",
+        help="Use this batch detail workbook for a carrier instead of the latest one (repeatable).",
+    )
+    parser.add_argument(
+        "--row-hash",
+        choices=("auto", *ROW_HASH_FORMATS),
+        default=os.getenv("MERGE_ROW_HASH", "auto"),
+        help="Change-detection hash for the current state (default: keep the stored format; x64 for a new state). "
+        "Switching format migrates stored hashes without reporting unchanged rows as updates.",
+    )
     return parser.parse_args()
 
 
+def parse_source_overrides(items: List[str]) -> Dict[str, Path]:
+    overrides: Dict[str, Path] = {}
+    for item in items:
+        carrier, sep, path = item.partition("=")
+        if not sep or not carrier.strip() or not path.strip():
+            raise ValueError(f"Invalid --source value (expected CARRIER=PATH): {item}")
+        overrides[carrier.strip().upper()] = Path(path.strip())
+    return overrides
+
+
 def main() -> None:
     args = parse_args()
-    voyages, port_calls, selected = load_latest_all()
+    voyages, port_calls, selected = load_latest_all(parse_source_overrides(args.source))
     ensure_vessel_db_coverage(voyages, port_calls)
     teu_map, imo_map = load_vessel_maps()
     service_meta = load_service_meta_map()
@@ -42,7 +67,7 @@ def main() -> None:
     output = save_merged(voyages, port_calls, selected)
     update_outputs: Dict[str, Path] = {}
     if not args.no_update_state:
-        update_outputs = save_update_outputs(voyages, port_calls, selected)
+        update_outputs = save_update_outputs(voyages, port_calls, selected, hash_format=args.row_hash)
 
     print("Selected source files:")
     for carrier, path in selected.items():
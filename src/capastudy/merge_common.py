@@ -1,12 +1,15 @@
 from __future__ import annotations
 
 import re
-from datetime import timedelta
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, List, Optional
 
 import pandas as pd
 
+from capastudy.timestamps import MEMO_LIMIT, coerce_timestamp
+from capastudy.weeks import WEEK_CALENDAR
+
 
 ANA_PORT_PRIORITY = [
     "SHANGHAI",
@@ -95,23 +98,31 @@ def get_first(d: Dict[str, object], keys: List[str]) -> object:
 
 
 def excel_weeknum_type16(dep_dt: object) -> Optional[int]:
-    if dep_dt is None or (isinstance(dep_dt, float) and pd.isna(dep_dt)):
-        return None
-    dt = pd.to_datetime(dep_dt, errors="coerce")
-    if pd.isna(dt):
-        return None
-    d = dt.date()
-    jan1 = d.replace(month=1, day=1)
-    start_weekday = 5
-    offset = (jan1.weekday() - start_weekday) % 7
-    week1_start = jan1 - timedelta(days=offset)
-    return ((d - week1_start).days // 7) + 1
+    week = WEEK_CALENDAR.week_of(dep_dt)
+    return week[0] if week else None
+
+
+def excel_weeknum_column(values: pd.Series) -> pd.Series:
+    return WEEK_CALENDAR.week_numbers(values)
+
+
+@lru_cache(maxsize=MEMO_LIMIT, typed=True)
+def _stable_cell_to_str_cached(value: object) -> str:
+    ts = coerce_timestamp(value)
+    if ts is not None:
+        return ts.strftime("%Y-%m-%d %H:%M:%S")
+    return str(value).strip()
+
+
+def reset_caches() -> None:
+    _stable_cell_to_str_cached.cache_clear()
 
 
 def stable_cell_to_str(value: object) -> str:
     if value is None or (isinstance(value, float) and pd.isna(value)):
         return ""
-    ts = pd.to_datetime(value, errors="coerce")
-    if pd.notna(ts):
-        return ts.strftime("%Y-%m-%d %H:%M:%S")
-    return str(value).strip()
+    try:
+        return _stable_cell_to_str_cached(value)
+    except TypeError:
+        ts = coerce_timestamp(value)
+        return ts.strftime("%Y-%m-%d %H:%M:%S") if ts is not None else str(value).strip()
@@ -11,7 +11,7 @@ import requests
 
 from capastudy.merge_common import (
     ANA_PORT_PRIORITY,
-    excel_weeknum_type16,
+    excel_weeknum_column,
     get_first,
     load_env,
     normalize_port_key,
@@ -21,6 +21,7 @@ from capastudy.merge_common import (
     walk_dicts,
 )
 from capastudy.settings import VESSEL_DB_XLSX, VESSEL_ENV_PATH
+from capastudy.timestamps import to_timestamp_column
 
 
 ENV_PATH = VESSEL_ENV_PATH
@@ -167,7 +168,7 @@ def add_ana_etd_weeknum(voyages: pd.DataFrame, port_calls: pd.DataFrame) -> pd.D
         return voyages
     p = port_calls.copy()
     p["_port_key"] = p["PortName"].map(normalize_port_key)
-    p["_dep_dt"] = pd.to_datetime(p["DepDtlocCos"], errors="coerce")
+    p["_dep_dt"] = to_timestamp_column(p["DepDtlocCos"])
     priority_index = {k: i for i, k in enumerate(ANA_PORT_PRIORITY)}
     p = p[p["_port_key"].isin(priority_index.keys())].copy()
     if p.empty:
@@ -176,7 +177,7 @@ def add_ana_etd_weeknum(voyages: pd.DataFrame, port_calls: pd.DataFrame) -> pd.D
         return out
     p["_prio"] = p["_port_key"].map(priority_index)
     p["_seq"] = pd.to_numeric(p.get("PortCallSeq"), errors="coerce")
-    p["_ana_week"] = p["DepDtlocCos"].map(excel_weeknum_type16)
+    p["_ana_week"] = excel_weeknum_column(p["DepDtlocCos"])
     p = p.sort_values(["voyage_id", "_prio", "_seq", "_dep_dt"], kind="stable")
     first = p.drop_duplicates(subset=["voyage_id"], keep="first")
     week_map = {str(r["voyage_id"]): r["_ana_week"] for r in first.to_dict(orient="records")}
@@ -189,6 +190,7 @@ def add_ana_etd_weeknum(voyages: pd.DataFrame, port_calls: pd.DataFrame) -> pd.D
     return out.reindex(columns=cols)
 
 
+# Per-row definitions of the keys; the column forms below are checked against them in tests/test_merge_keys.py.
 def vessel_key_from_row(row: pd.Series, imo_map: Dict[str, int]) -> str:
     vessel_code = normalize_text(row.get("VesselCode"))
     if vessel_code:
@@ -202,15 +204,35 @@ def build_core_key(carrier: object, loop_abbrv: object, vessel_key: object, voya
     return "|".join([normalize_text(carrier) or "NA", normalize_text(loop_abbrv) or "NA", normalize_text(vessel_key) or "NA", normalize_text(voyage) or "NA"])
 
 
+def normalized_column(df: pd.DataFrame, col: str) -> pd.Series:
+    if col not in df.columns:
+        return pd.Series("", index=df.index, dtype=object)
+    return df[col].map(normalize_text).astype(object)
+
+
+def vessel_key_column(df: pd.DataFrame, imo_map: Dict[str, int]) -> pd.Series:
+    # Column form of vessel_key_from_row.
+    imo_text = {name: str(imo) for name, imo in imo_map.items() if imo}
+    vessel_code = normalized_column(df, "VesselCode")
+    fallback = normalized_column(df, "VesselName").map(imo_text).fillna("NA").astype(object)
+    return vessel_code.where(vessel_code != "", fallback).astype(str)
+
+
+def core_key_column(df: pd.DataFrame) -> pd.Series:
+    # Column form of build_core_key.
+    parts = [normalized_column(df, col).replace("", "NA") for col in ("Carrier", "LoopAbbrv", "VesselKey", "Voyage")]
+    return parts[0].str.cat(parts[1:], sep="|")
+
+
 def enrich_voyages_with_ids(voyages: pd.DataFrame, imo_map: Dict[str, int]) -> pd.DataFrame:
     out = voyages.copy()
     out["IMO"] = out["VesselName"].map(lambda x: imo_map.get(normalize_text(x))).astype("Int64")
-    out["VesselKey"] = out.apply(lambda r: vessel_key_from_row(r, imo_map), axis=1)
-    out["_core_key"] = out.apply(lambda r: build_core_key(r.get("Carrier"), r.get("LoopAbbrv"), r.get("VesselKey"), r.get("Voyage")), axis=1)
-    out["_tail_dep_dt"] = pd.to_datetime(out["LastDepDtlocCos"], errors="coerce")
+    out["VesselKey"] = vessel_key_column(out, imo_map)
+    out["_core_key"] = core_key_column(out)
+    out["_tail_dep_dt"] = to_timestamp_column(out["LastDepDtlocCos"])
     out = out.sort_values(["_core_key", "_tail_dep_dt", "SourceFile"], kind="stable").reset_index(drop=True)
     out["_cycle_no"] = out.groupby("_core_key").cumcount() + 1
-    out["voyage_id"] = out.apply(lambda r: f"{r['_core_key']}|{int(r['_cycle_no']):03d}", axis=1)
+    out["voyage_id"] = out["_core_key"] + "|" + out["_cycle_no"].astype(str).str.zfill(3)
     out = out.drop(columns=["_tail_dep_dt", "_core_key", "_cycle_no"])
     ordered = list(out.columns)
     for col in ["IMO", "VesselKey", "voyage_id"]:
@@ -220,37 +242,68 @@ def enrich_voyages_with_ids(voyages: pd.DataFrame, imo_map: Dict[str, int]) -> p
     return out.reindex(columns=ordered)
 
 
+LINK_KEY_COLUMNS = ["Carrier", "LoopAbbrv", "VesselKey", "Voyage"]
+
+
+def normalized_link_keys(df: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame(
+        {f"_k{i}": normalized_column(df, col) for i, col in enumerate(LINK_KEY_COLUMNS)},
+        index=df.index,
+    )
+
+
+def as_datetime_ns(series: pd.Series) -> pd.Series:
+    # Departures compare on their local wall clock, as weeks.to_days does: a single zone is dropped, and mixed
+    # offsets (left as an object column) drop each value's own zone.
+    ts = to_timestamp_column(series)
+    if not pd.api.types.is_datetime64_any_dtype(ts):
+        ts = pd.to_datetime(
+            ts.map(lambda t: t.tz_localize(None) if isinstance(t, pd.Timestamp) and t.tz is not None else t),
+            errors="coerce",
+        )
+    if ts.dt.tz is not None:
+        ts = ts.dt.tz_localize(None)
+    return ts.astype("datetime64[ns]")
+
+
+def link_nearest_voyage_ids(port_calls: pd.DataFrame, voyages: pd.DataFrame) -> List[str]:
+    # Candidates per key are ranked by (last departure, NaT last; voyage_id). A port call takes the only
+    # candidate, the first one when its own departure is NaT or no candidate has one, else the nearest
+    # departure with ties going to the earlier departure and then the smaller voyage_id.
+    key_cols = [f"_k{i}" for i in range(len(LINK_KEY_COLUMNS))]
+    cand = normalized_link_keys(voyages)
+    cand["_dep"] = as_datetime_ns(voyages["LastDepDtlocCos"])
+    cand["_id"] = voyages["voyage_id"].map(str)
+    cand = cand.sort_values(["_dep", "_id"], na_position="last", kind="stable")
+    ranked = cand.groupby(key_cols, sort=False).agg(_first=("_id", "first"), _count=("_id", "size")).reset_index()
+
+    calls = normalized_link_keys(port_calls).reset_index(drop=True)
+    calls["_dep"] = as_datetime_ns(port_calls["DepDtlocCos"]).reset_index(drop=True)
+    calls["_pos"] = range(len(calls))
+    calls = calls.merge(ranked, on=key_cols, how="left")
+    linked = calls["_first"].fillna("").astype(object)
+
+    timed = calls[(calls["_count"] > 1) & calls["_dep"].notna()]
+    # Of candidates sharing a departure only the first-ranked can win, so keep just that one per time.
+    timed_cand = cand[cand["_dep"].notna()].drop_duplicates(subset=key_cols + ["_dep"], keep="first")
+    if not timed.empty and not timed_cand.empty:
+        nearest = pd.merge_asof(
+            timed.sort_values("_dep")[key_cols + ["_dep", "_pos"]],
+            timed_cand.sort_values("_dep")[key_cols + ["_dep", "_id"]],
+            on="_dep",
+            by=key_cols,
+            direction="nearest",
+        )
+        nearest = nearest.dropna(subset=["_id"])
+        linked.iloc[nearest["_pos"].to_numpy()] = nearest["_id"].to_numpy()
+    return linked.tolist()
+
+
 def attach_ids_to_port_calls(port_calls: pd.DataFrame, voyages: pd.DataFrame, imo_map: Dict[str, int]) -> pd.DataFrame:
     out = port_calls.copy()
     out["IMO"] = out["VesselName"].map(lambda x: imo_map.get(normalize_text(x))).astype("Int64")
-    out["VesselKey"] = out.apply(lambda r: vessel_key_from_row(r, imo_map), axis=1)
-    candidates: Dict[Tuple[str, str, str, str], List[Tuple[pd.Timestamp, str]]] = {}
-    v = voyages.copy()
-    v["_tail_dep_dt"] = pd.to_datetime(v["LastDepDtlocCos"], errors="coerce")
-    for row in v.to_dict(orient="records"):
-        base_key = (normalize_text(row.get("Carrier")), normalize_text(row.get("LoopAbbrv")), normalize_text(row.get("VesselKey")), normalize_text(row.get("Voyage")))
-        dep_dt = pd.to_datetime(row.get("_tail_dep_dt"), errors="coerce")
-        candidates.setdefault(base_key, []).append((dep_dt, str(row.get("voyage_id"))))
-    for key in list(candidates.keys()):
-        candidates[key].sort(key=lambda x: (pd.Timestamp.max if pd.isna(x[0]) else x[0], x[1]))
-    voyage_ids: List[str] = []
-    dep_series = pd.to_datetime(out["DepDtlocCos"], errors="coerce")
-    for idx, row in out.iterrows():
-        base_key = (normalize_text(row.get("Carrier")), normalize_text(row.get("LoopAbbrv")), normalize_text(row.get("VesselKey")), normalize_text(row.get("Voyage")))
-        items = candidates.get(base_key, [])
-        if not items:
-            voyage_ids.append("")
-            continue
-        if len(items) == 1:
-            voyage_ids.append(items[0][1])
-            continue
-        dep_dt = dep_series.iloc[idx]
-        if pd.isna(dep_dt):
-            voyage_ids.append(items[0][1])
-            continue
-        picked = min(items, key=lambda x: abs((dep_dt - x[0]).total_seconds()) if not pd.isna(x[0]) else float("inf"))
-        voyage_ids.append(picked[1])
-    out["voyage_id"] = voyage_ids
+    out["VesselKey"] = vessel_key_column(out, imo_map)
+    out["voyage_id"] = link_nearest_voyage_ids(out, voyages)
     ordered = list(out.columns)
     for col in ["IMO", "VesselKey", "voyage_id"]:
         ordered.remove(col)
@@ -261,7 +314,7 @@ def attach_ids_to_port_calls(port_calls: pd.DataFrame, voyages: pd.DataFrame, im
 
 def enrich_port_calls(port_calls: pd.DataFrame, teu_map: Dict[str, int]) -> pd.DataFrame:
     out = port_calls.copy()
-    out["weekNum"] = out["DepDtlocCos"].map(excel_weeknum_type16).astype("Int64")
+    out["weekNum"] = excel_weeknum_column(out["DepDtlocCos"])
     out["TEU"] = out["VesselName"].map(lambda x: teu_map.get(normalize_text(x))).astype("Int64")
     ordered_cols = list(out.columns)
     if "weekNum" in ordered_cols:
@@ -276,7 +329,7 @@ def enrich_port_calls(port_calls: pd.DataFrame, teu_map: Dict[str, int]) -> pd.D
 def enrich_voyages_with_teu(voyages: pd.DataFrame, teu_map: Dict[str, int]) -> pd.DataFrame:
     out = voyages.copy()
     out["TEU"] = out["VesselName"].map(lambda x: teu_map.get(normalize_text(x))).astype("Int64")
-    out["FirstETDWeekNum"] = out["FirstDepDtlocCos"].map(excel_weeknum_type16).astype("Int64")
+    out["FirstETDWeekNum"] = excel_weeknum_column(out["FirstDepDtlocCos"])
     ordered_cols = list(out.columns)
     if "TEU" in ordered_cols:
         ordered_cols.remove("TEU")
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import pandas as pd
 
@@ -81,13 +81,19 @@ def read_and_normalize_sheet(path: Path, sheet: str, columns: List[str], carrier
     return df
 
 
-def load_latest_all() -> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, Path]]:
+def load_latest_all(overrides: Optional[Dict[str, Path]] = None) -> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, Path]]:
     voyages_all: List[pd.DataFrame] = []
     port_calls_all: List[pd.DataFrame] = []
     selected: Dict[str, Path] = {}
+    overrides = overrides or {}
+    unknown = sorted(set(overrides) - set(CARRIER_CONFIG))
+    if unknown:
+        raise ValueError(f"Unknown carriers in source overrides: {unknown}")
 
     for carrier, query_dir in CARRIER_CONFIG.items():
-        latest = find_latest_detail_file(carrier, query_dir)
+        latest = overrides.get(carrier) or find_latest_detail_file(carrier, query_dir)
+        if not latest.exists():
+            raise FileNotFoundError(f"Batch detail file not found for {carrier}: {latest}")
         selected[carrier] = latest
 
         voyages_df = read_and_normalize_sheet(latest, "Total Voyages", VOYAGE_COLUMNS, carrier)
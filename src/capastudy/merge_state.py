@@ -4,12 +4,14 @@ import hashlib
 import shutil
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
 from capastudy.merge_common import AUDIT_COLUMNS, normalize_text, stable_cell_to_str
 from capastudy.settings import DATA_MERGED_DIR, DATA_STATE_DIR, LEGACY_MERGED_DIR, LEGACY_STATE_DIR
+from capastudy.timestamps import CANONICAL_FORMATS, ISO_FORMAT, detect_format, to_timestamp_column
 
 
 OUTPUT_DIR = DATA_MERGED_DIR
@@ -17,6 +19,12 @@ UPDATE_DIR = DATA_STATE_DIR
 LEGACY_OUTPUT_DIR = LEGACY_MERGED_DIR
 LEGACY_UPDATE_DIR = LEGACY_STATE_DIR
 
+ROW_HASH_FORMATS = ("sha1", "x64", "x128")
+DEFAULT_ROW_HASH_FORMAT = "x64"
+ROW_HASH_PREFIXES = {"x64": "x64:", "x128": "x128:"}
+ROW_HASH_WORDS = {"x64": 1, "x128": 2}
+ROW_HASH_KEYS = ("capastudy.rowh.1", "capastudy.rowh.2")
+
 
 def save_merged(voyages: pd.DataFrame, port_calls: pd.DataFrame, selected: Dict[str, Path]) -> Path:
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
@@ -44,12 +52,98 @@ def save_merged(voyages: pd.DataFrame, port_calls: pd.DataFrame, selected: Dict[
     return output_path
 
 
-def build_row_hash(df: pd.DataFrame, compare_cols: List[str]) -> pd.Series:
-    def _row_hash(row: pd.Series) -> str:
-        text = "|".join(stable_cell_to_str(row.get(c)) for c in compare_cols)
-        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+def number_text(series: pd.Series) -> pd.Series:
+    # Integral floats print like ints, so a column that gains a NaN (and turns float) keeps its hashes.
+    num = pd.to_numeric(series, errors="coerce").astype("float64")
+    text = num.astype(str)
+    integral = num.notna() & (num % 1 == 0) & (num.abs() < 2**53)
+    text[integral] = num[integral].astype("int64").astype(str)
+    text[num.isna()] = ""
+    return text
+
+
+def cell_text(value: object) -> str:
+    if value is None or value is pd.NaT or value is pd.NA or (isinstance(value, float) and pd.isna(value)):
+        return ""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, (bool, np.bool_)):
+        return str(bool(value))
+    if isinstance(value, (int, np.integer)):
+        return str(int(value))
+    if isinstance(value, (float, np.floating)):
+        number = float(value)
+        return str(int(number)) if number.is_integer() and abs(number) < 2**53 else str(number)
+    return str(value).strip()
+
+
+def date_column_text(series: pd.Series) -> Optional[pd.Series]:
+    # A text/object column whose every value is a date hashes like a datetime64 column, as sha1 did per cell,
+    # so "2026-01-05 10:00" read back from Excel matches the Timestamp it was written from.
+    present = series.notna() & (series.astype(str).str.strip() != "")
+    if not present.any():
+        return None
+    first = series[present].iat[0]
+    if isinstance(first, str):
+        if detect_format([first.strip()], (*CANONICAL_FORMATS, ISO_FORMAT)) is None:
+            return None
+    elif not isinstance(first, datetime):
+        return None
+    ts = to_timestamp_column(series.where(present).map(lambda v: v.strip() if isinstance(v, str) else v))
+    if (ts.notna() != present).any():
+        return None
+    if pd.api.types.is_datetime64_any_dtype(ts):
+        return ts.dt.strftime("%Y-%m-%d %H:%M:%S").fillna("")
+    # Mixed UTC offsets stay per-value objects; each keeps its own wall clock.
+    return ts.map(lambda t: t.strftime("%Y-%m-%d %H:%M:%S") if not pd.isna(t) else "")
+
+
+def column_text(series: pd.Series) -> pd.Series:
+    if pd.api.types.is_bool_dtype(series):
+        return series.astype(str)
+    if pd.api.types.is_numeric_dtype(series):
+        return number_text(series)
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.dt.strftime("%Y-%m-%d %H:%M:%S").fillna("")
+    dates = date_column_text(series)
+    if dates is not None:
+        return dates
+    if pd.api.types.is_string_dtype(series) and not pd.api.types.is_object_dtype(series):
+        return series.fillna("").astype(str).str.strip()
+    return series.map(cell_text)
+
+
+def row_hash_format(value: object) -> Optional[str]:
+    text = stable_cell_to_str(value)
+    if not text:
+        return None
+    for fmt, prefix in ROW_HASH_PREFIXES.items():
+        if text.startswith(prefix):
+            return fmt
+    return "sha1"
 
-    return df.apply(_row_hash, axis=1)
+
+def resolve_row_hash_format(requested: str, current_hashes: pd.Series) -> str:
+    if requested != "auto":
+        return requested
+    # Keep whatever the state file already holds; only an explicit format migrates it.
+    stored = current_hashes.map(row_hash_format).dropna()
+    return stored.mode().iat[0] if not stored.empty else DEFAULT_ROW_HASH_FORMAT
+
+
+def build_row_hash(df: pd.DataFrame, compare_cols: List[str], fmt: str = "sha1") -> pd.Series:
+    if df.empty:
+        return pd.Series([], index=df.index, dtype=object)
+    if fmt == "sha1":
+        # Compatible with state files written before x64/x128: same cell strings, same "|" join. The old
+        # row-wise apply saw object cells, so nullable NA reads "<NA>" and NaT reads "NaT"; astype(object) keeps that.
+        parts = [df[c].astype(object).map(stable_cell_to_str) for c in compare_cols]
+        text = parts[0].str.cat(parts[1:], sep="|") if len(parts) > 1 else parts[0]
+        return pd.Series([hashlib.sha1(t.encode("utf-8")).hexdigest() for t in text], index=df.index, dtype=object)
+    texts = pd.DataFrame({i: column_text(df[c]) for i, c in enumerate(compare_cols)}, index=df.index)
+    words = [pd.util.hash_pandas_object(texts, index=False, hash_key=key).to_numpy() for key in ROW_HASH_KEYS[: ROW_HASH_WORDS[fmt]]]
+    prefix = ROW_HASH_PREFIXES[fmt]
+    return pd.Series(["".join([prefix, *(f"{int(w[i]):016x}" for w in words)]) for i in range(len(df))], index=df.index, dtype=object)
 
 
 def build_portcall_key(df: pd.DataFrame) -> pd.Series:
@@ -74,61 +168,75 @@ def ensure_audit_columns(df: pd.DataFrame) -> pd.DataFrame:
     return out
 
 
-def merge_current_entity(entity_name: str, new_df: pd.DataFrame, current_df: pd.DataFrame, key_col: str, snapshot_date: str, updated_at: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+def merge_current_entity(
+    entity_name: str,
+    new_df: pd.DataFrame,
+    current_df: pd.DataFrame,
+    key_col: str,
+    snapshot_date: str,
+    updated_at: str,
+    hash_format: str = "auto",
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
     new_core = new_df.copy().drop_duplicates(subset=[key_col], keep="first")
     cur = ensure_audit_columns(current_df.copy())
     compare_cols = [c for c in new_core.columns if c not in AUDIT_COLUMNS]
-    new_core["_row_hash"] = build_row_hash(new_core, compare_cols)
+    hash_format = resolve_row_hash_format(hash_format, cur["_row_hash"])
+    new_core["_row_hash"] = build_row_hash(new_core, compare_cols, hash_format)
+    # Rows stored in another format are compared in that format, then rewritten in the new one.
+    stored_formats = set(cur["_row_hash"].map(row_hash_format).dropna()) - {hash_format}
+    legacy_hash_cols = [f"_row_hash_{fmt}" for fmt in sorted(stored_formats)]
+    for fmt in sorted(stored_formats):
+        new_core[f"_row_hash_{fmt}"] = build_row_hash(new_core, compare_cols, fmt)
     for col in compare_cols + AUDIT_COLUMNS:
         if col not in cur.columns:
             cur[col] = pd.NA
-    cur = cur.reindex(columns=compare_cols + AUDIT_COLUMNS)
-    new_core = new_core.reindex(columns=compare_cols + ["_row_hash"])
-    cur_idx = cur.set_index(key_col, drop=False)
-    new_idx = new_core.set_index(key_col, drop=False)
-    cur_keys = set(cur_idx.index.tolist())
-    new_keys = set(new_idx.index.tolist())
+    # Keys match one-to-one: like the new rows, a key repeated in the current state keeps only its first row.
+    cur = cur.reindex(columns=compare_cols + AUDIT_COLUMNS).drop_duplicates(subset=[key_col], keep="first")
+    # Object columns keep ints as ints where the outer join leaves holes, as the row-by-row updates did.
+    new_core = new_core.reindex(columns=compare_cols + ["_row_hash"] + legacy_hash_cols).astype(object)
+
+    # One outer join classifies every key; rows keep the current-state order with inserts appended in key order.
+    cur["_order"] = range(len(cur))
+    cur[key_col] = cur[key_col].astype(object)
+    joined = cur.merge(new_core, on=key_col, how="outer", suffixes=("", "_new"), indicator=True)
+    new_only = joined["_merge"] == "right_only"
+    insert_rank = {k: len(cur) + i for i, k in enumerate(sorted(joined.loc[new_only, key_col]))}
+    joined.loc[new_only, "_order"] = joined.loc[new_only, key_col].map(insert_rank)
+    joined = joined.sort_values("_order", kind="stable").reset_index(drop=True)
+    inserted = (joined["_merge"] == "right_only").to_numpy()
+    matched = (joined["_merge"] == "both").to_numpy()
+    disappeared = (joined["_merge"] == "left_only").to_numpy()
+
+    old_hash = joined["_row_hash"].map(stable_cell_to_str)
+    new_hash = joined["_row_hash_new"].map(stable_cell_to_str)
+    old_format = joined["_row_hash"].map(row_hash_format)
+    compare_hash = new_hash
+    for fmt in sorted(stored_formats):
+        compare_hash = compare_hash.where(old_format != fmt, joined[f"_row_hash_{fmt}"].map(stable_cell_to_str))
+    changed = matched & (old_hash != compare_hash).to_numpy()
+    migrated = matched & old_format.isin(stored_formats).to_numpy()
+    active_num = pd.to_numeric(joined["is_active"], errors="coerce")
+    was_active = disappeared & (active_num.fillna(1).astype(int) == 1).to_numpy()
+    replaced = inserted | changed
+
+    out = pd.DataFrame(index=joined.index)
+    for col in compare_cols:
+        if col == key_col:
+            out[col] = joined[col]
+        else:
+            out[col] = joined[f"{col}_new"].where(replaced, joined[col])
+    out["first_seen_date"] = joined["first_seen_date"].where(~inserted, snapshot_date)
+    out["last_seen_date"] = joined["last_seen_date"].where(disappeared, snapshot_date)
+    out["snapshot_date"] = snapshot_date
+    out["updated_at"] = joined["updated_at"].where(~(replaced | was_active), updated_at)
+    out["is_active"] = (~disappeared).astype(int)
+    out["_row_hash"] = joined["_row_hash"].where(~inserted, joined["_row_hash_new"]).where(~(changed | migrated), new_hash)
+
     change_rows: List[Dict[str, object]] = []
-    out = cur_idx.copy()
-
-    for k in sorted(new_keys - cur_keys):
-        row = new_idx.loc[k]
-        out.loc[k, compare_cols] = row[compare_cols]
-        out.loc[k, "first_seen_date"] = snapshot_date
-        out.loc[k, "last_seen_date"] = snapshot_date
-        out.loc[k, "snapshot_date"] = snapshot_date
-        out.loc[k, "updated_at"] = updated_at
-        out.loc[k, "is_active"] = 1
-        out.loc[k, "_row_hash"] = row["_row_hash"]
-        change_rows.append({"entity": entity_name, "change_type": "insert", key_col: k})
-
-    for k in sorted(new_keys & cur_keys):
-        old_hash = stable_cell_to_str(out.at[k, "_row_hash"])
-        new_hash = stable_cell_to_str(new_idx.at[k, "_row_hash"])
-        out.loc[k, "snapshot_date"] = snapshot_date
-        out.loc[k, "last_seen_date"] = snapshot_date
-        out.loc[k, "is_active"] = 1
-        if old_hash != new_hash:
-            out.loc[k, compare_cols] = new_idx.loc[k, compare_cols]
-            out.loc[k, "_row_hash"] = new_hash
-            out.loc[k, "updated_at"] = updated_at
-            change_rows.append({"entity": entity_name, "change_type": "update", key_col: k})
-
-    for k in sorted(cur_keys - new_keys):
-        active_num = pd.to_numeric(out.at[k, "is_active"], errors="coerce")
-        was_active = int(active_num) if pd.notna(active_num) else 1
-        out.loc[k, "snapshot_date"] = snapshot_date
-        out.loc[k, "is_active"] = 0
-        if was_active == 1:
-            out.loc[k, "updated_at"] = updated_at
-            change_rows.append({"entity": entity_name, "change_type": "disappear", key_col: k})
-
-    updated = out.reset_index(drop=True)
-    ordered = list(updated.columns)
-    for col in [key_col] + AUDIT_COLUMNS:
-        if col in ordered:
-            ordered.remove(col)
-    updated = updated.reindex(columns=[key_col] + AUDIT_COLUMNS + ordered)
+    for change_type, mask in (("insert", inserted), ("update", changed), ("disappear", was_active)):
+        change_rows.extend({"entity": entity_name, "change_type": change_type, key_col: k} for k in sorted(joined.loc[mask, key_col]))
+
+    updated = out.reindex(columns=[key_col] + AUDIT_COLUMNS + [c for c in compare_cols if c != key_col])
     return updated, pd.DataFrame(change_rows)
 
 
@@ -141,7 +249,12 @@ def load_sheet_or_empty(path: Path, sheet: str) -> pd.DataFrame:
         return pd.DataFrame()
 
 
-def save_update_outputs(voyages_new: pd.DataFrame, port_calls_new: pd.DataFrame, selected: Dict[str, Path]) -> Dict[str, Path]:
+def save_update_outputs(
+    voyages_new: pd.DataFrame,
+    port_calls_new: pd.DataFrame,
+    selected: Dict[str, Path],
+    hash_format: str = "auto",
+) -> Dict[str, Path]:
     UPDATE_DIR.mkdir(parents=True, exist_ok=True)
     LEGACY_UPDATE_DIR.mkdir(parents=True, exist_ok=True)
     ts = datetime.now().strftime("%y%m%d%H%M%S")
@@ -155,8 +268,8 @@ def save_update_outputs(voyages_new: pd.DataFrame, port_calls_new: pd.DataFrame,
     portcalls_cur = load_sheet_or_empty(current_path, "Total PortCalls")
     port_calls_new = port_calls_new.copy()
     port_calls_new["portcall_key"] = build_portcall_key(port_calls_new)
-    voyages_updated, v_changes = merge_current_entity("voyages", voyages_new, voyages_cur, "voyage_id", snapshot_date, updated_at)
-    portcalls_updated, p_changes = merge_current_entity("portcalls", port_calls_new, portcalls_cur, "portcall_key", snapshot_date, updated_at)
+    voyages_updated, v_changes = merge_current_entity("voyages", voyages_new, voyages_cur, "voyage_id", snapshot_date, updated_at, hash_format)
+    portcalls_updated, p_changes = merge_current_entity("portcalls", port_calls_new, portcalls_cur, "portcall_key", snapshot_date, updated_at, hash_format)
     source_df = pd.DataFrame([{"Carrier": c, "SourceFile": p.name, "SourcePath": str(p)} for c, p in selected.items()])
     with pd.ExcelWriter(current_path, engine="openpyxl") as writer:
         source_df.to_excel(writer, index=False, sheet_name="Sources")
@@ -1,14 +1,21 @@
 from __future__ import annotations
 
 import argparse
+import json
+import re
 import subprocess
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import List, Sequence
+from typing import Dict, List, Optional, Sequence
 
 from capastudy.settings import LOGS_DIR
+from capastudy.stats import count_workbook_rows, profile_path_for, wait_with_usage, write_profile
+from capastudy.workers import WarmWorkerPool
 
 
 BASE_DIR = Path(__file__).resolve().parents[2]
@@ -17,12 +24,34 @@ MSK_DIR = BASE_DIR / "MSK FETCH"
 CSL_DIR = BASE_DIR / "CSL FETCH"
 MERGE_SCRIPT = BASE_DIR / "merge_all_carriers.py"
 
+OUTPUT_LINE_PATTERN = re.compile(r"(?:Batch detail tables saved|Merged output):\s*(.+?)\s*$")
+
+_OUTPUT_LOCK = threading.Lock()
+_MANIFEST_LOCK = threading.Lock()
+_PROFILE_LOCK = threading.Lock()
+
 
 @dataclass
 class Step:
     label: str
     work_dir: Path
     script: Path
+    carrier: str = ""
+    args: Sequence[str] = ()
+    module: str = ""
+    is_async: bool = False
+
+    @property
+    def key(self) -> str:
+        return self.carrier or "MERGE"
+
+
+@dataclass
+class StepRun:
+    returncode: int
+    output_file: Optional[Path]
+    wall_seconds: float
+    usage: Dict[str, object]
 
 
 def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
@@ -30,7 +59,28 @@ def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
     mode = parser.add_mutually_exclusive_group()
     mode.add_argument("--only-fetch", action="store_true", help="Run carrier fetch steps only.")
     mode.add_argument("--only-merge", action="store_true", help="Run merge step only.")
-    return parser.parse_args(list(argv) if argv is not None else None)
+    parser.add_argument(
+        "--parallel-fetch",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Run up to N carrier fetch steps concurrently (default: 1, sequential).",
+    )
+    parser.add_argument(
+        "--executor",
+        choices=["subprocess", "warm"],
+        default="subprocess",
+        help="Run each step in a fresh Python subprocess, or in a pool of pre-warmed worker processes.",
+    )
+    parser.add_argument(
+        "--resume",
+        metavar="RUN_ID",
+        help="Resume a previous run: skip steps that already succeeded and merge their exact outputs.",
+    )
+    args = parser.parse_args(list(argv) if argv is not None else None)
+    if args.parallel_fetch < 1:
+        parser.error("--parallel-fetch must be >= 1")
+    return args
 
 
 def resolve_mode(args: argparse.Namespace) -> str:
@@ -47,39 +97,220 @@ def require_path(path: Path) -> None:
 
 
 def log_line(message: str, log_path: Path) -> None:
-    print(message)
-    with log_path.open("a", encoding="utf-8") as f:
-        f.write(message + "\n")
+    with _OUTPUT_LOCK:
+        try:
+            print(message)
+        except UnicodeEncodeError:
+            stdout_encoding = sys.stdout.encoding or "utf-8"
+            print(message.encode(stdout_encoding, errors="backslashreplace").decode(stdout_encoding, errors="ignore"))
+        with log_path.open("a", encoding="utf-8") as f:
+            f.write(message + "\n")
+
+
+def manifest_path_for(run_id: str) -> Path:
+    return LOGS_DIR / f"pipeline_run_{run_id}.json"
 
 
-def run_step(step: Step, log_path: Path) -> None:
+def new_manifest(run_id: str, mode: str, steps: Sequence[Step]) -> Dict[str, object]:
+    return {
+        "run_id": run_id,
+        "mode": mode,
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "status": "running",
+        "logs": [],
+        "steps": {step.key: {"label": step.label, "status": "pending"} for step in steps},
+    }
+
+
+def load_manifest(run_id: str) -> Dict[str, object]:
+    path = manifest_path_for(run_id)
+    if not path.exists():
+        raise FileNotFoundError(f"Run manifest not found: {path}")
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def save_manifest(manifest: Dict[str, object]) -> Path:
+    path = manifest_path_for(str(manifest["run_id"]))
+    tmp_path = path.with_suffix(".json.tmp")
+    with _MANIFEST_LOCK:
+        tmp_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp_path.replace(path)
+    return path
+
+
+def update_step_record(manifest: Dict[str, object], step: Step, **fields: object) -> None:
+    with _MANIFEST_LOCK:
+        record = manifest["steps"].setdefault(step.key, {"label": step.label})
+        record.update(fields)
+    save_manifest(manifest)
+
+
+def step_succeeded(manifest: Dict[str, object], step: Step) -> bool:
+    record = manifest["steps"].get(step.key) or {}
+    if record.get("status") != "succeeded":
+        return False
+    # Fetch steps only count as done while the workbook they produced is still on disk.
+    return not step.carrier or completed_detail_file(manifest, step) is not None
+
+
+def completed_detail_file(manifest: Dict[str, object], step: Step) -> Optional[Path]:
+    record = manifest["steps"].get(step.key) or {}
+    detail_file = record.get("detail_file")
+    if record.get("status") != "succeeded" or not detail_file or not Path(detail_file).exists():
+        return None
+    return Path(detail_file)
+
+
+def run_step(step: Step, log_path: Path, prefix: str = "", pool: Optional[WarmWorkerPool] = None) -> StepRun:
     log_line("", log_path)
-    log_line(step.label, log_path)
-
-    cmd = [sys.executable, str(step.script)]
-    process = subprocess.Popen(
-        cmd,
-        cwd=str(step.work_dir),
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        text=True,
-        encoding="utf-8",
-        errors="replace",
+    log_line(f"{prefix}{step.label}", log_path)
+
+    output_file: Optional[Path] = None
+
+    def handle_line(line: str) -> None:
+        nonlocal output_file
+        log_line(prefix + line, log_path)
+        matched = OUTPUT_LINE_PATTERN.search(line)
+        if matched:
+            output_file = Path(matched.group(1))
+
+    started = time.perf_counter()
+    if pool is not None:
+        rc, usage = pool.run(step.module, step.is_async, step.args, handle_line, str(step.work_dir))
+    else:
+        cmd = [sys.executable, str(step.script), *step.args]
+        process = subprocess.Popen(
+            cmd,
+            cwd=str(step.work_dir),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+        )
+        assert process.stdout is not None
+        for line in process.stdout:
+            handle_line(line.rstrip("\n"))
+        rc, usage = wait_with_usage(process)
+    return StepRun(rc, output_file, round(time.perf_counter() - started, 3), usage)
+
+
+def new_profile(manifest: Dict[str, object], log_path: Path, args: argparse.Namespace) -> Dict[str, object]:
+    return {
+        "run_id": manifest["run_id"],
+        "log_id": log_path.stem.rsplit("_", 1)[-1],
+        "log": str(log_path),
+        "mode": manifest.get("mode"),
+        "executor": args.executor,
+        "parallel_fetch": args.parallel_fetch,
+        "started_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "steps": [],
+    }
+
+
+def record_profile_step(
+    profile: Dict[str, object],
+    log_path: Path,
+    step: Step,
+    status: str,
+    run: Optional[StepRun] = None,
+) -> None:
+    record: Dict[str, object] = {"key": step.key, "label": step.label, "status": status}
+    if run is not None:
+        output_file = run.output_file if run.output_file and run.output_file.exists() else None
+        record.update(
+            {
+                "wall_seconds": run.wall_seconds,
+                **run.usage,
+                **count_workbook_rows(output_file),
+                "output_file": str(output_file) if output_file else None,
+                "output_bytes": output_file.stat().st_size if output_file else None,
+            }
+        )
+    with _PROFILE_LOCK:
+        profile["steps"].append(record)
+        write_profile(profile_path_for(log_path), profile)
+
+
+def execute_step(
+    step: Step,
+    log_path: Path,
+    manifest: Dict[str, object],
+    profile: Dict[str, object],
+    prefix: str = "",
+    pool: Optional[WarmWorkerPool] = None,
+) -> None:
+    if step_succeeded(manifest, step):
+        log_line("", log_path)
+        log_line(f"{prefix}{step.label}", log_path)
+        log_line(f"{prefix}[SKIP] Already succeeded in run {manifest['run_id']}.", log_path)
+        record_profile_step(profile, log_path, step, "skipped")
+        return
+
+    started = datetime.now()
+    update_step_record(manifest, step, status="running", started_at=started.strftime("%Y-%m-%d %H:%M:%S"))
+    try:
+        run = run_step(step, log_path, prefix, pool)
+        if run.returncode != 0:
+            record_profile_step(profile, log_path, step, "failed", run)
+            raise RuntimeError(f"Step failed ({run.returncode}): {step.label}")
+    except Exception as exc:
+        finished = datetime.now()
+        update_step_record(
+            manifest,
+            step,
+            status="failed",
+            finished_at=finished.strftime("%Y-%m-%d %H:%M:%S"),
+            duration_seconds=round((finished - started).total_seconds(), 3),
+            error=str(exc),
+        )
+        raise
+    finished = datetime.now()
+    output_key = "detail_file" if step.carrier else "output_file"
+    update_step_record(
+        manifest,
+        step,
+        status="succeeded",
+        finished_at=finished.strftime("%Y-%m-%d %H:%M:%S"),
+        duration_seconds=round((finished - started).total_seconds(), 3),
+        error=None,
+        **{output_key: str(run.output_file) if run.output_file else None},
     )
-    assert process.stdout is not None
-    stdout_encoding = sys.stdout.encoding or "utf-8"
-    for line in process.stdout:
-        line = line.rstrip("\n")
-        try:
-            print(line)
-        except UnicodeEncodeError:
-            safe = line.encode(stdout_encoding, errors="backslashreplace").decode(stdout_encoding, errors="ignore")
-            print(safe)
-        with log_path.open("a", encoding="utf-8") as f:
-            f.write(line + "\n")
-    rc = process.wait()
-    if rc != 0:
-        raise RuntimeError(f"Step failed ({rc}): {step.label}")
+    record_profile_step(profile, log_path, step, "succeeded", run)
+
+
+def run_steps_parallel(
+    steps: Sequence[Step],
+    log_path: Path,
+    manifest: Dict[str, object],
+    profile: Dict[str, object],
+    max_workers: int,
+    pool: Optional[WarmWorkerPool] = None,
+) -> None:
+    log_line("", log_path)
+    log_line(f"Running {len(steps)} fetch steps with up to {max_workers} in parallel.", log_path)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(execute_step, step, log_path, manifest, profile, f"[{step.carrier}] ", pool)
+            for step in steps
+        ]
+    errors = []
+    for step, future in zip(steps, futures):
+        exc = future.exception()
+        if exc is not None:
+            log_line(f"[{step.carrier}] [ERROR] {exc}", log_path)
+            errors.append(str(exc))
+    if errors:
+        raise RuntimeError("; ".join(errors))
+
+
+def build_merge_args(manifest: Dict[str, object], fetch_steps: Sequence[Step]) -> List[str]:
+    merge_args: List[str] = []
+    for step in fetch_steps:
+        detail_file = completed_detail_file(manifest, step)
+        if detail_file is not None:
+            merge_args.extend(["--source", f"{step.carrier}={detail_file}"])
+    return merge_args
 
 
 def main(argv: Sequence[str] | None = None) -> int:
@@ -90,41 +321,81 @@ def main(argv: Sequence[str] | None = None) -> int:
     ts = datetime.now().strftime("%y%m%d%H%M%S")
     log_path = LOGS_DIR / f"full_pipeline_{ts}.log"
 
+    fetch_steps: List[Step] = [
+        Step(
+            "[1/4] Run MSC full query...",
+            MSC_DIR,
+            MSC_DIR / "MSC_FETCH.py",
+            "MSC",
+            module="capastudy.carriers.msc_fetch",
+        ),
+        Step(
+            "[2/4] Run MSK full query...",
+            MSK_DIR,
+            MSK_DIR / "MSK_FETCH.py",
+            "MSK",
+            module="capastudy.carriers.msk_fetch",
+        ),
+        Step(
+            "[3/4] Run CSL full query (BACK flow)...",
+            CSL_DIR,
+            CSL_DIR / "CSL_FETCH.py",
+            "CSL",
+            module="capastudy.carriers.csl_fetch_back_test",
+            is_async=True,
+        ),
+    ]
+    merge_step = Step("[4/4] Merge latest outputs...", BASE_DIR, MERGE_SCRIPT, module="capastudy.merge_all_carriers")
+
     try:
         require_path(MSC_DIR / "MSC_FETCH.py")
         require_path(MSK_DIR / "MSK_FETCH.py")
         require_path(CSL_DIR / "CSL_FETCH.py")
         require_path(MERGE_SCRIPT)
+        if args.resume:
+            manifest = load_manifest(args.resume)
+            mode = str(manifest.get("mode") or mode)
+        else:
+            manifest = new_manifest(ts, mode, [*fetch_steps, merge_step])
     except Exception as exc:
         log_line(f"[ERROR] {exc}", log_path)
         log_line(f"Log: {log_path}", log_path)
         return 1
+    manifest["status"] = "running"
+    manifest.setdefault("logs", []).append(str(log_path))
+    manifest_path = save_manifest(manifest)
+    profile = new_profile(manifest, log_path, args)
 
     log_line("========================================", log_path)
     log_line("[START] Full query pipeline", log_path)
     log_line(f"Mode: {mode}", log_path)
+    log_line(f"Parallel fetch: {args.parallel_fetch}", log_path)
+    log_line(f"Executor: {args.executor}", log_path)
     log_line(f"Base: {BASE_DIR}", log_path)
     log_line(f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", log_path)
     log_line(f"Log:  {log_path}", log_path)
+    log_line(f"Run:  {manifest['run_id']}{' (resumed)' if args.resume else ''}", log_path)
+    log_line(f"Manifest: {manifest_path}", log_path)
+    log_line(f"Profile:  {profile_path_for(log_path)}", log_path)
     log_line("========================================", log_path)
 
-    fetch_steps: List[Step] = [
-        Step("[1/4] Run MSC full query...", MSC_DIR, MSC_DIR / "MSC_FETCH.py"),
-        Step("[2/4] Run MSK full query...", MSK_DIR, MSK_DIR / "MSK_FETCH.py"),
-        Step("[3/4] Run CSL full query (BACK flow)...", CSL_DIR, CSL_DIR / "CSL_FETCH.py"),
-    ]
-    merge_step = Step("[4/4] Merge latest outputs...", BASE_DIR, MERGE_SCRIPT)
-
+    pool: Optional[WarmWorkerPool] = None
     try:
+        if args.executor == "warm":
+            pool = WarmWorkerPool(args.parallel_fetch if mode != "merge" else 1)
         if mode != "merge":
-            for step in fetch_steps:
-                run_step(step, log_path)
+            if args.parallel_fetch > 1:
+                run_steps_parallel(fetch_steps, log_path, manifest, profile, args.parallel_fetch, pool)
+            else:
+                for step in fetch_steps:
+                    execute_step(step, log_path, manifest, profile, pool=pool)
         else:
             log_line("", log_path)
             log_line("[1-3/4] Fetch steps skipped for --only-merge.", log_path)
 
         if mode != "fetch":
-            run_step(merge_step, log_path)
+            merge_step.args = build_merge_args(manifest, fetch_steps)
+            execute_step(merge_step, log_path, manifest, profile, pool=pool)
         else:
             log_line("", log_path)
             log_line("[4/4] Merge step skipped for --only-fetch.", log_path)
@@ -134,8 +405,16 @@ def main(argv: Sequence[str] | None = None) -> int:
         log_line("[DONE] Full query pipeline finished.", log_path)
         log_line(f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", log_path)
         log_line("========================================", log_path)
+        manifest["status"] = "succeeded"
+        save_manifest(manifest)
         return 0
     except Exception as exc:
         log_line(f"[ERROR] {exc}", log_path)
         log_line(f"Log: {log_path}", log_path)
+        log_line(f"Resume with: --resume {manifest['run_id']}", log_path)
+        manifest["status"] = "failed"
+        save_manifest(manifest)
         return 1
+    finally:
+        if pool is not None:
+            pool.close()
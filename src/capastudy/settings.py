@@ -39,6 +39,11 @@ CSL_QUERY_DIR = CSL_RUNTIME_DIR / "query"
 MSC_QUERY_DIR = MSC_RUNTIME_DIR / "query"
 MSK_QUERY_DIR = MSK_RUNTIME_DIR / "query"
 
+CSL_API_PORTS_JSON = CSL_RUNTIME_DIR / "api_ports.json"
+CSL_BROWSER_DIR = CSL_RUNTIME_DIR / "browser"
+MSC_CACHE_DIR = MSC_RUNTIME_DIR / "cache"
+MSC_OD_PAIR_STATS_JSON = MSC_RUNTIME_DIR / "od_pair_stats.json"
+
 # Common master/config files
 VESSELS_DIR = PROJECT_ROOT / "vessels"
 VESSEL_DB_XLSX = VESSELS_DIR / "vessels_db.xlsx"
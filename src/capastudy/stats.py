@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from capastudy.settings import LOGS_DIR
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+PROFILE_GLOB = "full_pipeline_*.profile.json"
+ROW_SHEETS = {"voyages": "Total Voyages", "port_calls": "Total PortCalls"}
+TREND_METRICS = ["wall_seconds", "cpu_seconds", "peak_rss_mb", "voyages", "port_calls", "output_bytes"]
+PROC_STATUS_PATH = Path("/proc/self/status")
+PROC_CLEAR_REFS_PATH = Path("/proc/self/clear_refs")
+# rss_scope values: "step" when peak_rss_mb covers only that step, "worker_lifetime" when it is the peak of a
+# long-lived warm worker (every step it ran so far) because the peak could not be reset per step.
+RSS_SCOPE_STEP = "step"
+RSS_SCOPE_WORKER = "worker_lifetime"
+
+
+def rusage_to_metrics(usage) -> Dict[str, Optional[float]]:
+    if usage is None:
+        return {"cpu_seconds": None, "peak_rss_mb": None}
+    # ru_maxrss is kilobytes on Linux and bytes on macOS.
+    rss_divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "cpu_seconds": round(usage.ru_utime + usage.ru_stime, 3),
+        "peak_rss_mb": round(usage.ru_maxrss / rss_divisor, 1),
+    }
+
+
+def self_rusage():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF)
+
+
+def children_rusage():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_CHILDREN)
+
+
+def reset_peak_rss() -> bool:
+    # Linux only: writing "5" to clear_refs resets VmHWM, so the next read covers only what follows.
+    try:
+        PROC_CLEAR_REFS_PATH.write_text("5")
+    except OSError:
+        return False
+    return True
+
+
+def read_peak_rss_mb() -> Optional[float]:
+    try:
+        for line in PROC_STATUS_PATH.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    except (OSError, ValueError, IndexError):
+        return None
+    return None
+
+
+class StepUsage:
+    # Usage of one step inside a long-lived process (warm workers): CPU is a delta of self + reaped children,
+    # peak RSS is VmHWM reset at the start of the step when the platform allows it, else the process lifetime peak.
+    def __init__(self) -> None:
+        self.self_before = self_rusage()
+        self.children_before = children_rusage()
+        self.peak_reset = reset_peak_rss()
+
+    def metrics(self) -> Dict[str, object]:
+        self_after, children_after = self_rusage(), children_rusage()
+        metrics: Dict[str, object] = {**rusage_to_metrics(self_after), "rss_scope": None}
+        if self_after is None or self.self_before is None:
+            return metrics
+        cpu = (self_after.ru_utime + self_after.ru_stime) - (self.self_before.ru_utime + self.self_before.ru_stime)
+        if children_after is not None and self.children_before is not None:
+            cpu += (children_after.ru_utime + children_after.ru_stime) - (
+                self.children_before.ru_utime + self.children_before.ru_stime
+            )
+        metrics["cpu_seconds"] = round(max(cpu, 0.0), 3)
+
+        step_peak = read_peak_rss_mb() if self.peak_reset else None
+        if step_peak is None:
+            metrics["rss_scope"] = RSS_SCOPE_WORKER
+            return metrics
+        # RUSAGE_CHILDREN only keeps the largest child ever reaped, so a child counts only if it set a new maximum.
+        if children_after is not None and self.children_before is not None:
+            if children_after.ru_maxrss > self.children_before.ru_maxrss:
+                step_peak = max(step_peak, rusage_to_metrics(children_after)["peak_rss_mb"])
+        metrics["peak_rss_mb"] = step_peak
+        metrics["rss_scope"] = RSS_SCOPE_STEP
+        return metrics
+
+
+def wait_with_usage(process) -> Tuple[int, Dict[str, object]]:
+    if not hasattr(os, "wait4"):
+        return process.wait(), rusage_to_metrics(None)
+    _pid, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, {**rusage_to_metrics(usage), "rss_scope": RSS_SCOPE_STEP}
+
+
+def count_workbook_rows(path: Optional[Path]) -> Dict[str, Optional[int]]:
+    counts: Dict[str, Optional[int]] = {key: None for key in ROW_SHEETS}
+    if path is None or not path.exists():
+        return counts
+    try:
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True)
+    except Exception:
+        return counts
+    try:
+        for key, sheet in ROW_SHEETS.items():
+            if sheet in workbook.sheetnames:
+                counts[key] = max((workbook[sheet].max_row or 1) - 1, 0)
+    finally:
+        workbook.close()
+    return counts
+
+
+def profile_path_for(log_path: Path) -> Path:
+    return log_path.with_name(f"{log_path.stem}.profile.json")
+
+
+def write_profile(path: Path, profile: Dict[str, object]) -> Path:
+    tmp_path = path.with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps(profile, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp_path.replace(path)
+    return path
+
+
+def load_profiles(logs_dir: Path = LOGS_DIR, last: int = 10) -> List[Dict[str, object]]:
+    profiles: List[Dict[str, object]] = []
+    for path in sorted(logs_dir.glob(PROFILE_GLOB))[-last:]:
+        try:
+            profiles.append(json.loads(path.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            print(f"Skipped unreadable profile: {path}")
+    return profiles
+
+
+def format_metric(value: object) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.1f}"
+    return str(value)
+
+
+def format_record_metric(record: Dict[str, object], metric: str) -> str:
+    text = format_metric(record.get(metric))
+    if metric == "peak_rss_mb" and record.get("rss_scope") == RSS_SCOPE_WORKER and text != "-":
+        text += "*"
+    return text
+
+
+def print_step_table(step_key: str, rows: List[Tuple[str, Dict[str, object]]]) -> None:
+    print(f"\n== {step_key} ==")
+    header = ["run", "status", *TREND_METRICS]
+    print("  ".join(f"{col:>14}" for col in header))
+    for run_label, record in rows:
+        cells = [run_label, record.get("status", "-"), *(format_record_metric(record, m) for m in TREND_METRICS)]
+        print("  ".join(f"{cell:>14}" for cell in cells))
+    print_trend_row(rows)
+    if any(record.get("rss_scope") == RSS_SCOPE_WORKER for _, record in rows):
+        print("  * peak_rss_mb is the warm worker's lifetime peak (earlier steps included), not this step's alone")
+
+
+def print_trend_row(rows: List[Tuple[str, Dict[str, object]]]) -> None:
+    measured = [record for _, record in rows if record.get("status") == "succeeded"]
+    if len(measured) < 2:
+        return
+    trend_cells = ["trend", "first->last"]
+    for metric in TREND_METRICS:
+        first, last = measured[0].get(metric), measured[-1].get(metric)
+        if metric == "peak_rss_mb" and measured[0].get("rss_scope") != measured[-1].get("rss_scope"):
+            trend_cells.append("-")
+            continue
+        if not isinstance(first, (int, float)) or not isinstance(last, (int, float)) or not first:
+            trend_cells.append("-")
+            continue
+        trend_cells.append(f"{(last - first) / first * 100:+.1f}%")
+    print("  ".join(f"{cell:>14}" for cell in trend_cells))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Show per-step pipeline performance stats across recent runs.")
+    parser.add_argument("--last", type=int, default=10, help="Number of most recent runs to include.")
+    parser.add_argument("--step", action="append", default=[], help="Only show these step keys (e.g. MSC, CSL, MERGE).")
+    parser.add_argument("--logs-dir", default=str(LOGS_DIR), help="Directory holding full_pipeline_*.profile.json files.")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    profiles = load_profiles(Path(args.logs_dir), last=max(args.last, 1))
+    if not profiles:
+        print(f"No pipeline profiles found in {args.logs_dir}")
+        return
+
+    print(f"Runs: {len(profiles)} ({profiles[0].get('log_id')} .. {profiles[-1].get('log_id')})")
+    wanted = {item.strip().upper() for item in args.step if item.strip()}
+    by_step: Dict[str, List[Tuple[str, Dict[str, object]]]] = {}
+    for profile in profiles:
+        for record in profile.get("steps") or []:
+            key = str(record.get("key") or "")
+            if wanted and key.upper() not in wanted:
+                continue
+            by_step.setdefault(key, []).append((str(profile.get("log_id")), record))
+    for step_key, rows in by_step.items():
+        print_step_table(step_key, rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import weakref
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+import pandas as pd
+
+
+MINUTE_FORMAT = "%Y-%m-%d %H:%M"
+ISO_FORMAT = "iso"
+# What the carrier query workbooks contain; merge columns try these before pandas inference.
+CANONICAL_FORMATS = ("%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%Y-%m-%dT%H:%M:%S")
+MEMO_LIMIT = 65536
+
+
+def parse_with_format(text: str, fmt: str) -> Optional[datetime]:
+    try:
+        if fmt == ISO_FORMAT:
+            return datetime.fromisoformat(text)
+        return datetime.strptime(text, fmt)
+    except ValueError:
+        return None
+
+
+def detect_format(values: Iterable[object], formats: Sequence[str] = CANONICAL_FORMATS) -> Optional[str]:
+    for value in values:
+        if not isinstance(value, str) or not value.strip():
+            continue
+        for fmt in formats:
+            if parse_with_format(value, fmt) is not None:
+                return fmt
+        return None
+    return None
+
+
+_PARSERS: "weakref.WeakSet[TimestampParser]" = weakref.WeakSet()
+
+
+# One parser per carrier column: the matching format is found once and tried first, repeated strings are memoized.
+class TimestampParser:
+    def __init__(
+        self,
+        formats: Sequence[str],
+        output_format: str = MINUTE_FORMAT,
+        clean: Optional[Callable[[str], str]] = None,
+    ) -> None:
+        self.formats = tuple(formats)
+        self.output_format = output_format
+        self.clean = clean
+        self.detected: Optional[str] = None
+        self.memo: Dict[str, Tuple[Optional[datetime], Optional[str]]] = {}
+        _PARSERS.add(self)
+
+    def reset(self) -> None:
+        self.detected = None
+        self.memo.clear()
+
+    def _lookup(self, text: str) -> Tuple[Optional[datetime], Optional[str]]:
+        cached = self.memo.get(text)
+        if cached is not None:
+            return cached
+        candidate = self.clean(text) if self.clean else text
+        parsed = parse_with_format(candidate, self.detected) if self.detected else None
+        if parsed is None:
+            for fmt in self.formats:
+                if fmt == self.detected:
+                    continue
+                parsed = parse_with_format(candidate, fmt)
+                if parsed is not None:
+                    self.detected = fmt
+                    break
+        result = (parsed, parsed.strftime(self.output_format) if parsed else None)
+        if len(self.memo) >= MEMO_LIMIT:
+            self.memo.clear()
+        self.memo[text] = result
+        return result
+
+    def parse(self, text: str) -> Optional[datetime]:
+        return self._lookup(text)[0]
+
+    def format(self, text: str) -> Optional[str]:
+        return self._lookup(text)[1]
+
+
+@lru_cache(maxsize=MEMO_LIMIT, typed=True)
+def _coerce_cached(value: object) -> Optional[pd.Timestamp]:
+    ts = pd.to_datetime(value, errors="coerce")
+    return None if pd.isna(ts) else ts
+
+
+def reset_caches() -> None:
+    for parser in list(_PARSERS):
+        parser.reset()
+    _coerce_cached.cache_clear()
+
+
+def coerce_timestamp(value: object) -> Optional[pd.Timestamp]:
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return None
+    try:
+        return _coerce_cached(value)
+    except TypeError:
+        ts = pd.to_datetime(value, errors="coerce")
+        return None if pd.isna(ts) else ts
+
+
+def to_timestamp_column(values: Iterable[object], formats: Sequence[str] = CANONICAL_FORMATS) -> pd.Series:
+    # Same result per cell as pd.to_datetime(cell, errors="coerce"), but each distinct value is parsed once
+    # and string values matching the column's detected format are parsed in one vectorized call.
+    series = values if isinstance(values, pd.Series) else pd.Series(list(values), dtype=object)
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    uniques = list(uniques)
+    parsed: list = [pd.NaT] * len(uniques)
+    text_positions = [i for i, value in enumerate(uniques) if isinstance(value, str)]
+    fmt = detect_format((uniques[i] for i in text_positions), formats)
+    if fmt and fmt != ISO_FORMAT:
+        fast = pd.to_datetime(pd.Series([uniques[i] for i in text_positions], dtype=object), format=fmt, errors="coerce")
+        for i, ts in zip(text_positions, fast):
+            parsed[i] = ts
+    for i, value in enumerate(uniques):
+        if pd.isna(parsed[i]):
+            ts = coerce_timestamp(value)
+            parsed[i] = pd.NaT if ts is None else ts
+    resolved = pd.Series(parsed, dtype=object)
+    try:
+        resolved = pd.to_datetime(resolved)
+    except (TypeError, ValueError):
+        pass
+    # Missing cells have code -1, which reindexes to NaT.
+    out = resolved.reindex(codes)
+    out.index = series.index
+    return out
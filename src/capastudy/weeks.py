@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+from datetime import date, datetime
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from capastudy.timestamps import coerce_timestamp, to_timestamp_column
+
+
+# Project week convention (Excel WEEKNUM return type 16): weeks start on Saturday, week 1 holds Jan 1.
+WEEK_START_WEEKDAY = 5  # Monday=0 ... Saturday=5
+DEFAULT_HORIZON_YEARS = (2015, 2035)
+
+
+def _week_start(days: np.ndarray) -> np.ndarray:
+    # 1970-01-01 was a Thursday (weekday 3).
+    weekday = (days.astype("int64") + 3) % 7
+    return days - ((weekday - WEEK_START_WEEKDAY) % 7).astype("timedelta64[D]")
+
+
+def build_week_table(first: date, last: date) -> pd.DataFrame:
+    days = np.arange(np.datetime64(first, "D"), np.datetime64(last, "D") + 1, dtype="datetime64[D]")
+    jan1 = days.astype("datetime64[Y]").astype("datetime64[D]")
+    week_start = _week_start(days)
+    return pd.DataFrame(
+        {
+            "date": days.astype("datetime64[s]"),
+            "week_num": ((days - _week_start(jan1)).astype("int64") // 7 + 1).astype("int16"),
+            "week_start": week_start.astype("datetime64[s]"),
+            "week_end": (week_start + np.timedelta64(6, "D")).astype("datetime64[s]"),
+        }
+    )
+
+
+def to_days(values: Iterable[object]) -> Tuple[pd.Index, np.ndarray]:
+    series = values if isinstance(values, pd.Series) else pd.Series(list(values), dtype=object)
+    ts = to_timestamp_column(series)
+    if not pd.api.types.is_datetime64_any_dtype(ts):
+        # Mixed offsets cannot share a datetime column; use each value's own wall-clock date.
+        parsed = (coerce_timestamp(value) for value in series)
+        days = [np.datetime64(t.date(), "D") if t is not None else np.datetime64("NaT", "D") for t in parsed]
+        return series.index, np.array(days, dtype="datetime64[D]")
+    if ts.dt.tz is not None:
+        ts = ts.dt.tz_localize(None)
+    return series.index, ts.to_numpy(dtype="datetime64[D]")
+
+
+# Date dimension: one row per day with its week number and Saturday-Friday bounds. Lookups index it by day offset;
+# it is rebuilt over whole years whenever data falls outside the current horizon.
+class WeekCalendar:
+    def __init__(self, first_year: int = DEFAULT_HORIZON_YEARS[0], last_year: int = DEFAULT_HORIZON_YEARS[1]) -> None:
+        self.build(first_year, last_year)
+
+    def build(self, first_year: int, last_year: int) -> None:
+        self.first_year = first_year
+        self.last_year = last_year
+        self.origin = np.datetime64(date(first_year, 1, 1), "D")
+        self.table = build_week_table(date(first_year, 1, 1), date(last_year, 12, 31))
+        self.week_num = self.table["week_num"].to_numpy()
+        self.week_start = self.table["week_start"].to_numpy()
+        self.week_end = self.table["week_end"].to_numpy()
+
+    def positions(self, days: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        valid = ~np.isnat(days)
+        if valid.any():
+            years = days[valid].astype("datetime64[Y]").astype("int64") + 1970
+            first_year, last_year = int(years.min()), int(years.max())
+            if first_year < self.first_year or last_year > self.last_year:
+                self.build(min(first_year, self.first_year), max(last_year, self.last_year))
+        pos = np.where(valid, (days - self.origin).astype("int64"), 0)
+        return pos, valid
+
+    def lookup(self, values: Iterable[object]) -> pd.DataFrame:
+        index, days = to_days(values)
+        pos, valid = self.positions(days)
+        nat = np.datetime64("NaT", "s")
+        return pd.DataFrame(
+            {
+                "week_num": pd.arrays.IntegerArray(self.week_num[pos].astype("int64"), ~valid),
+                "week_start": np.where(valid, self.week_start[pos], nat),
+                "week_end": np.where(valid, self.week_end[pos], nat),
+            },
+            index=index,
+        )
+
+    def week_numbers(self, values: Iterable[object]) -> pd.Series:
+        return self.lookup(values)["week_num"].rename(None)
+
+    def week_of(self, value: object) -> Optional[Tuple[int, date, date]]:
+        row = self.lookup([value]).iloc[0]
+        if pd.isna(row["week_num"]):
+            return None
+        return int(row["week_num"]), row["week_start"].date(), row["week_end"].date()
+
+
+WEEK_CALENDAR = WeekCalendar()
+
+
+def week_bounds(day: date | datetime) -> Tuple[date, date]:
+    _, start, end = WEEK_CALENDAR.week_of(pd.Timestamp(day))
+    return start, end
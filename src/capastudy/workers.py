@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import codecs
+import importlib
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import traceback
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from capastudy.cli import load_callable, run_async_main, run_sync_main
+from capastudy.stats import StepUsage, rusage_to_metrics
+
+
+# Heavy third-party modules imported once when a worker starts, before any step runs.
+WARM_MODULES = (
+    "pandas",
+    "openpyxl",
+    "requests",
+    "playwright.async_api",
+    "playwright_stealth",
+    "capastudy.carriers.common",
+    "capastudy.merge_common",
+)
+
+
+class _FdCapture:
+    # Points fds 1/2 at a pipe for one step, so prints and subprocess output alike reach the parent line by line.
+    def __init__(self, conn) -> None:
+        self.conn = conn
+        for stream in (sys.stdout, sys.stderr):
+            stream.flush()
+        self.saved = [os.dup(1), os.dup(2)]
+        read_fd, write_fd = os.pipe()
+        os.dup2(write_fd, 1)
+        os.dup2(write_fd, 2)
+        os.close(write_fd)
+        self.reader = threading.Thread(target=self._pump, args=(read_fd,), daemon=True)
+        self.reader.start()
+        self.stream = open(1, "w", encoding="utf-8", errors="replace", buffering=1, closefd=False)
+
+    def _pump(self, read_fd: int) -> None:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        buffer = ""
+        with os.fdopen(read_fd, "rb", buffering=0) as pipe:
+            while True:
+                chunk = pipe.read(65536)
+                buffer += decoder.decode(chunk, final=not chunk)
+                *lines, buffer = buffer.split("\n")
+                for line in lines:
+                    self.conn.send(("line", line.rstrip("\r")))
+                if not chunk:
+                    break
+        if buffer:
+            self.conn.send(("line", buffer))
+
+    def close(self) -> None:
+        self.stream.flush()
+        self.stream.close()
+        # Restoring 1/2 drops the last write ends, so the reader sees EOF once child processes are gone too.
+        for fd, saved in zip((1, 2), self.saved):
+            os.dup2(saved, fd)
+            os.close(saved)
+        self.reader.join(timeout=10)
+
+
+def warm_imports(modules: Sequence[str] = WARM_MODULES) -> None:
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            continue
+
+
+def run_task(module_name: str, is_async: bool, args: Sequence[str]) -> int:
+    main_func = load_callable(module_name)
+    if is_async:
+        return run_async_main(main_func, args)
+    return run_sync_main(main_func, args)
+
+
+def reset_module_state() -> None:
+    # Singletons and memos a fresh step process would start without; modules are only touched if loaded.
+    common = sys.modules.get("capastudy.carriers.common")
+    if common is not None:
+        common.reset_http_client()
+    for name in ("capastudy.timestamps", "capastudy.merge_common"):
+        module = sys.modules.get(name)
+        if module is not None:
+            module.reset_caches()
+
+
+def _worker_main(conn) -> None:
+    # Steps share the interpreter (that is the point of warming it), but each one starts from the worker's
+    # baseline cwd and environment, with carrier singletons/caches reset and fds 1/2 captured for its output.
+    warm_imports()
+    base_stdout, base_stderr = sys.stdout, sys.stderr
+    base_cwd = os.getcwd()
+    base_environ = dict(os.environ)
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        module_name, is_async, args, work_dir = message
+        capture = _FdCapture(conn)
+        sys.stdout = sys.stderr = capture.stream
+        usage = StepUsage()
+        try:
+            if work_dir:
+                os.chdir(work_dir)
+            rc = run_task(module_name, is_async, args)
+        except SystemExit as exc:
+            if isinstance(exc.code, int) or exc.code is None:
+                rc = exc.code or 0
+            else:
+                print(exc.code)
+                rc = 1
+        except BaseException:
+            traceback.print_exc()
+            rc = 1
+        finally:
+            sys.stdout, sys.stderr = base_stdout, base_stderr
+            capture.close()
+            os.chdir(base_cwd)
+            os.environ.clear()
+            os.environ.update(base_environ)
+            reset_module_state()
+        conn.send(("done", (rc, usage.metrics())))
+
+
+class WarmWorker:
+    def __init__(self, context) -> None:
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def run(
+        self,
+        module_name: str,
+        is_async: bool,
+        args: Sequence[str],
+        on_line: Callable[[str], None],
+        work_dir: Optional[str] = None,
+    ) -> Tuple[int, Dict[str, object]]:
+        self.conn.send((module_name, is_async, list(args), work_dir))
+        while True:
+            try:
+                kind, payload = self.conn.recv()
+            except EOFError:
+                self.process.join(timeout=5)
+                return self.process.exitcode or 1, rusage_to_metrics(None)
+            if kind == "line":
+                on_line(payload)
+            elif kind == "done":
+                rc, metrics = payload
+                return int(rc), metrics
+
+    def close(self) -> None:
+        if self.process.is_alive():
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(timeout=10)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=5)
+        self.conn.close()
+
+
+class WarmWorkerPool:
+    def __init__(self, size: int = 1) -> None:
+        # Spawn keeps workers independent of the parent's output threads.
+        self.context = multiprocessing.get_context("spawn")
+        self.idle: "queue.Queue[WarmWorker]" = queue.Queue()
+        self.lock = threading.Lock()
+        self.workers = [WarmWorker(self.context) for _ in range(max(1, size))]
+        for worker in self.workers:
+            self.idle.put(worker)
+
+    def run(
+        self,
+        module_name: str,
+        is_async: bool,
+        args: Sequence[str],
+        on_line: Callable[[str], None],
+        work_dir: Optional[str] = None,
+    ) -> Tuple[int, Dict[str, object]]:
+        worker = self.idle.get()
+        try:
+            return worker.run(module_name, is_async, args, on_line, work_dir)
+        finally:
+            if not worker.is_alive():
+                worker.close()
+                replacement = WarmWorker(self.context)
+                with self.lock:
+                    self.workers.remove(worker)
+                    self.workers.append(replacement)
+                worker = replacement
+            self.idle.put(worker)
+
+    def close(self) -> None:
+        with self.lock:
+            workers, self.workers = self.workers, []
+        for worker in workers:
+            worker.close()
+
+    def __enter__(self) -> "WarmWorkerPool":
+        return self
+
+    def __exit__(self, *_exc) -> None:
+        self.close()
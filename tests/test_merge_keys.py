@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT / "src"))
+
+from capastudy.merge_enrichment import (  # noqa: E402
+    build_core_key,
+    core_key_column,
+    vessel_key_column,
+    vessel_key_from_row,
+)
+
+
+MERGED_WORKBOOKS = sorted((PROJECT_ROOT / "data" / "merged").glob("ALL_CARRIERS_MERGED_*.xlsx"))
+IMO_MAP = {"EVER GIVEN": 9811000, "ZERO IMO": 0, "MSC ANNA": 9777000}
+
+
+class KeyColumnTests(unittest.TestCase):
+    # The column forms must reproduce the per-row helpers they replaced, cell for cell.
+    def assert_matches_rows(self, df: pd.DataFrame) -> None:
+        vessel_keys = vessel_key_column(df, IMO_MAP)
+        expected = [vessel_key_from_row(row, IMO_MAP) for _, row in df.iterrows()]
+        self.assertEqual(vessel_keys.tolist(), expected)
+        self.assertTrue(vessel_keys.index.equals(df.index))
+
+        keyed = df.assign(VesselKey=vessel_keys)
+        expected_core = [
+            build_core_key(row.get("Carrier"), row.get("LoopAbbrv"), row.get("VesselKey"), row.get("Voyage")) for _, row in keyed.iterrows()
+        ]
+        self.assertEqual(core_key_column(keyed).tolist(), expected_core)
+
+    def test_edge_values(self) -> None:
+        df = pd.DataFrame(
+            {
+                "Carrier": ["csl", " MSC ", None, "MSK", np.nan, ""],
+                "LoopAbbrv": ["aeu1", "", "AEU  3", None, "X", "Y"],
+                "VesselCode": [" abc ", None, "", np.nan, 12345, "  "],
+                "VesselName": ["whatever", "ever  given", "zero imo", "UNKNOWN", "msc anna", None],
+                "Voyage": ["001W", 7, None, "  ", 3.0, "9E"],
+            },
+            index=[10, 11, 12, 13, 14, 15],
+        )
+        self.assert_matches_rows(df)
+
+    def test_missing_columns(self) -> None:
+        self.assert_matches_rows(pd.DataFrame({"Carrier": ["CSL"], "VesselName": ["EVER GIVEN"]}))
+        self.assert_matches_rows(pd.DataFrame({"Carrier": pd.Series([], dtype=object)}))
+
+    @unittest.skipUnless(MERGED_WORKBOOKS, "no merged workbook in data/merged")
+    def test_merged_workbook(self) -> None:
+        voyages = pd.read_excel(MERGED_WORKBOOKS[-1], sheet_name="Total Voyages")
+        names = voyages["VesselName"].dropna().astype(str).str.strip().str.upper().unique()[:20]
+        imo_map = {" ".join(name.split()): 9000000 + i for i, name in enumerate(names)}
+        blanked = voyages.assign(VesselCode=voyages["VesselCode"].where(voyages.index % 3 != 0))
+        for df in (voyages, blanked):
+            self.assertEqual(vessel_key_column(df, imo_map).tolist(), [vessel_key_from_row(row, imo_map) for _, row in df.iterrows()])
+            self.assertEqual(
+                core_key_column(df).tolist(),
+                [build_core_key(row.get("Carrier"), row.get("LoopAbbrv"), row.get("VesselKey"), row.get("Voyage")) for _, row in df.iterrows()],
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import sys
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from capastudy.merge_enrichment import attach_ids_to_port_calls  # noqa: E402
+
+
+VOYAGE_COLUMNS = ["Carrier", "LoopAbbrv", "VesselKey", "Voyage", "LastDepDtlocCos", "voyage_id"]
+PORT_CALL_COLUMNS = ["Carrier", "LoopAbbrv", "VesselCode", "VesselName", "Voyage", "PortName", "DepDtlocCos"]
+
+
+def voyage(loop: str, dep: object, voyage_id: str, carrier: str = "CSL") -> dict:
+    return dict(zip(VOYAGE_COLUMNS, [carrier, loop, "V1", "001", dep, voyage_id]))
+
+
+def port_call(loop: str, dep: object, carrier: str = "CSL") -> dict:
+    return dict(zip(PORT_CALL_COLUMNS, [carrier, loop, "V1", "VESSEL ONE", "001", "PORT", dep]))
+
+
+class AttachIdsToPortCallsTests(unittest.TestCase):
+    # Expected ids are what the row-by-row linking produced before it was vectorized.
+    def link(self, voyages: list, port_calls: list) -> list:
+        out = attach_ids_to_port_calls(
+            pd.DataFrame(port_calls, columns=PORT_CALL_COLUMNS),
+            pd.DataFrame(voyages, columns=VOYAGE_COLUMNS),
+            {},
+        )
+        return out["voyage_id"].tolist()
+
+    def test_single_and_missing_candidates(self) -> None:
+        voyages = [voyage("ONE", None, "only")]
+        calls = [port_call("ONE", "2026-01-05 10:00"), port_call("NONE", "2026-01-05 10:00")]
+        self.assertEqual(self.link(voyages, calls), ["only", ""])
+
+    def test_nearest_departure_wins(self) -> None:
+        voyages = [
+            voyage("AEU1", "2026-01-01 10:00", "early"),
+            voyage("AEU1", "2026-01-08 10:00", "late"),
+            voyage("AEU1", None, "undated"),
+        ]
+        calls = [port_call("AEU1", "2026-01-02 00:00"), port_call("AEU1", "2026-01-07 00:00"), port_call(" aeu1 ", "2026-01-30 00:00")]
+        self.assertEqual(self.link(voyages, calls), ["early", "late", "late"])
+
+    def test_ties_prefer_earlier_departure_then_smaller_id(self) -> None:
+        voyages = [
+            voyage("AEU1", "2026-01-03 10:00", "b"),
+            voyage("AEU1", "2026-01-01 10:00", "z"),
+            voyage("AEU1", "2026-01-03 10:00", "a"),
+        ]
+        calls = [port_call("AEU1", "2026-01-02 10:00"), port_call("AEU1", "2026-01-03 10:00")]
+        self.assertEqual(self.link(voyages, calls), ["z", "a"])
+
+    def test_nat_fallbacks_use_first_ranked_candidate(self) -> None:
+        voyages = [
+            voyage("AEU1", None, "a"),
+            voyage("AEU1", "2026-01-04 10:00", "c"),
+            voyage("AEU1", "2026-01-02 10:00", "d"),
+            voyage("AEU2", None, "y"),
+            voyage("AEU2", None, "x"),
+        ]
+        calls = [port_call("AEU1", None), port_call("AEU1", "not a date"), port_call("AEU2", "2026-01-03 10:00")]
+        self.assertEqual(self.link(voyages, calls), ["d", "d", "x"])
+
+    def test_single_zone_departures_compare_on_wall_clock(self) -> None:
+        voyages = [voyage("AEU1", "2026-01-01T10:00:00Z", "early"), voyage("AEU1", "2026-01-08T10:00:00Z", "late")]
+        calls = [port_call("AEU1", "2026-01-02 00:00"), port_call("AEU1", "2026-01-07T00:00:00Z")]
+        self.assertEqual(self.link(voyages, calls), ["early", "late"])
+
+    def test_tz_aware_datetime_columns(self) -> None:
+        voyages = pd.DataFrame([voyage("AEU1", None, "early"), voyage("AEU1", None, "late")], columns=VOYAGE_COLUMNS)
+        voyages["LastDepDtlocCos"] = pd.to_datetime(["2026-01-01 10:00", "2026-01-08 10:00"]).tz_localize("Asia/Shanghai")
+        calls = pd.DataFrame([port_call("AEU1", None), port_call("AEU1", None)], columns=PORT_CALL_COLUMNS)
+        calls["DepDtlocCos"] = pd.to_datetime(["2026-01-02 00:00", "2026-01-07 00:00"]).tz_localize("UTC")
+        out = attach_ids_to_port_calls(calls, voyages, {})
+        self.assertEqual(out["voyage_id"].tolist(), ["early", "late"])
+
+    def test_mixed_offsets_use_each_value_wall_clock(self) -> None:
+        # 2026-01-04 23:00-05:00 is 2026-01-05 04:00 UTC; by wall clock it is nearer the 2026-01-04 departure.
+        voyages = [
+            voyage("AEU1", "2026-01-04T12:00:00+08:00", "local"),
+            voyage("AEU1", "2026-01-05T12:00:00Z", "utc"),
+            voyage("AEU1", "2026-01-10 12:00", "naive"),
+        ]
+        calls = [
+            port_call("AEU1", "2026-01-04T23:00:00-05:00"),
+            port_call("AEU1", "2026-01-05T11:00:00+01:00"),
+            port_call("AEU1", "2026-01-09 00:00"),
+        ]
+        self.assertEqual(self.link(voyages, calls), ["local", "utc", "naive"])
+
+    def test_id_columns_follow_voyage(self) -> None:
+        out = attach_ids_to_port_calls(
+            pd.DataFrame([port_call("ONE", None)], columns=PORT_CALL_COLUMNS),
+            pd.DataFrame([voyage("ONE", None, "only")], columns=VOYAGE_COLUMNS),
+            {},
+        )
+        self.assertEqual(list(out.columns)[4:8], ["Voyage", "IMO", "VesselKey", "voyage_id"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import hashlib
+import sys
+import unittest
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from capastudy.merge_common import AUDIT_COLUMNS, stable_cell_to_str  # noqa: E402
+from capastudy.merge_state import (  # noqa: E402
+    build_row_hash,
+    ensure_audit_columns,
+    merge_current_entity,
+    resolve_row_hash_format,
+    row_hash_format,
+)
+
+
+def baseline_row_hash(df: pd.DataFrame, compare_cols: List[str]) -> pd.Series:
+    # The original row-wise sha1 that existing state files were written with.
+    def _row_hash(row: pd.Series) -> str:
+        text = "|".join(stable_cell_to_str(row.get(c)) for c in compare_cols)
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    return df.apply(_row_hash, axis=1)
+
+
+def reference_merge(
+    entity_name: str, new_df: pd.DataFrame, current_df: pd.DataFrame, key_col: str, snapshot_date: str, updated_at: str
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    # The row-by-row loop merge_current_entity replaced, kept as the behavioural reference (sha1 hashes).
+    new_core = new_df.copy().drop_duplicates(subset=[key_col], keep="first")
+    cur = ensure_audit_columns(current_df.copy())
+    compare_cols = [c for c in new_core.columns if c not in AUDIT_COLUMNS]
+    new_core["_row_hash"] = baseline_row_hash(new_core, compare_cols)
+    for col in compare_cols + AUDIT_COLUMNS:
+        if col not in cur.columns:
+            cur[col] = pd.NA
+    cur = cur.reindex(columns=compare_cols + AUDIT_COLUMNS)
+    new_core = new_core.reindex(columns=compare_cols + ["_row_hash"])
+    cur_idx = cur.set_index(key_col, drop=False)
+    new_idx = new_core.set_index(key_col, drop=False)
+    cur_keys = set(cur_idx.index.tolist())
+    new_keys = set(new_idx.index.tolist())
+    change_rows: List[Dict[str, object]] = []
+    out = cur_idx.copy()
+
+    for k in sorted(new_keys - cur_keys):
+        row = new_idx.loc[k]
+        out.loc[k, compare_cols] = row[compare_cols]
+        out.loc[k, "first_seen_date"] = snapshot_date
+        out.loc[k, "last_seen_date"] = snapshot_date
+        out.loc[k, "snapshot_date"] = snapshot_date
+        out.loc[k, "updated_at"] = updated_at
+        out.loc[k, "is_active"] = 1
+        out.loc[k, "_row_hash"] = row["_row_hash"]
+        change_rows.append({"entity": entity_name, "change_type": "insert", key_col: k})
+
+    for k in sorted(new_keys & cur_keys):
+        old_hash = stable_cell_to_str(out.at[k, "_row_hash"])
+        new_hash = stable_cell_to_str(new_idx.at[k, "_row_hash"])
+        out.loc[k, "snapshot_date"] = snapshot_date
+        out.loc[k, "last_seen_date"] = snapshot_date
+        out.loc[k, "is_active"] = 1
+        if old_hash != new_hash:
+            out.loc[k, compare_cols] = new_idx.loc[k, compare_cols]
+            out.loc[k, "_row_hash"] = new_hash
+            out.loc[k, "updated_at"] = updated_at
+            change_rows.append({"entity": entity_name, "change_type": "update", key_col: k})
+
+    for k in sorted(cur_keys - new_keys):
+        active_num = pd.to_numeric(out.at[k, "is_active"], errors="coerce")
+        was_active = int(active_num) if pd.notna(active_num) else 1
+        out.loc[k, "snapshot_date"] = snapshot_date
+        out.loc[k, "is_active"] = 0
+        if was_active == 1:
+            out.loc[k, "updated_at"] = updated_at
+            change_rows.append({"entity": entity_name, "change_type": "disappear", key_col: k})
+
+    updated = out.reset_index(drop=True)
+    ordered = list(updated.columns)
+    for col in [key_col] + AUDIT_COLUMNS:
+        if col in ordered:
+            ordered.remove(col)
+    updated = updated.reindex(columns=[key_col] + AUDIT_COLUMNS + ordered)
+    return updated, pd.DataFrame(change_rows)
+
+
+def voyages(rows: List[Tuple[str, str, float]]) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=["voyage_id", "Vessel", "Teu"])
+
+
+FIRST = voyages([("V1", "ALPHA", 1.5), ("V2", "BRAVO", 2.5), ("V3", "CHARLIE", 3.5), ("V4", "DELTA", 4.5), ("V5", "ECHO", 5.5)])
+
+
+class MergeCurrentEntityTests(unittest.TestCase):
+    def assert_matches_reference(self, new_df: pd.DataFrame, current_df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        updated, changes = merge_current_entity("voyages", new_df, current_df, "voyage_id", "2026-01-12", "t1", "sha1")
+        expected, expected_changes = reference_merge("voyages", new_df, current_df, "voyage_id", "2026-01-12", "t1")
+        pd.testing.assert_frame_equal(updated.astype(str), expected.astype(str))
+        pd.testing.assert_frame_equal(changes.astype(str), expected_changes.astype(str))
+        return updated, changes
+
+    def current_state(self) -> pd.DataFrame:
+        current, _ = reference_merge("voyages", FIRST, pd.DataFrame(), "voyage_id", "2026-01-05", "t0")
+        current.loc[current["voyage_id"] == "V5", "is_active"] = 0
+        return current
+
+    def test_first_run_inserts_everything(self) -> None:
+        updated, changes = self.assert_matches_reference(FIRST, pd.DataFrame())
+        self.assertEqual(list(changes["change_type"]), ["insert"] * 5)
+        self.assertEqual(list(updated["voyage_id"]), ["V1", "V2", "V3", "V4", "V5"])
+
+    def test_insert_update_unchanged_missing(self) -> None:
+        new_df = voyages([("V6", "FOXTROT", 6.5), ("V1", "ALPHA", 1.5), ("V2", "BRAVO II", 2.5), ("V3", "CHARLIE", 3.5), ("V5", "ECHO", 5.5)])
+        updated, changes = self.assert_matches_reference(new_df, self.current_state())
+        self.assertEqual(
+            list(zip(changes["change_type"], changes["voyage_id"])),
+            [("insert", "V6"), ("update", "V2"), ("disappear", "V4")],
+        )
+        by_id = updated.set_index("voyage_id")
+        self.assertEqual(by_id.at["V1", "updated_at"], "t0")
+        self.assertEqual(by_id.at["V2", "Vessel"], "BRAVO II")
+        self.assertEqual(int(by_id.at["V4", "is_active"]), 0)
+        self.assertEqual(int(by_id.at["V5", "is_active"]), 1)
+        self.assertEqual(list(updated["voyage_id"]), ["V1", "V2", "V3", "V4", "V5", "V6"])
+
+    def test_inactive_rows_stay_quiet_while_missing(self) -> None:
+        new_df = voyages([("V1", "ALPHA", 1.5)])
+        updated, changes = self.assert_matches_reference(new_df, self.current_state())
+        self.assertNotIn("V5", set(changes["voyage_id"]))
+        self.assertEqual(updated.set_index("voyage_id").at["V5", "updated_at"], "t0")
+
+    def test_duplicate_new_keys_keep_first_row(self) -> None:
+        new_df = voyages([("V1", "ALPHA", 1.5), ("V1", "ALPHA", 99.5), ("V7", "GOLF", 7.5), ("V7", "HOTEL", 8.5)])
+        updated, _ = self.assert_matches_reference(new_df, self.current_state())
+        by_id = updated.set_index("voyage_id")
+        self.assertEqual(by_id.at["V1", "Teu"], 1.5)
+        self.assertEqual(by_id.at["V7", "Vessel"], "GOLF")
+
+    def test_duplicate_current_keys_match_one_to_one(self) -> None:
+        # The loop could not handle a repeated current key at all; the join keeps its first row and matches it once.
+        current = self.current_state()
+        stale = current[current["voyage_id"] == "V2"].assign(Vessel="STALE")
+        current = pd.concat([current, stale], ignore_index=True)
+        new_df = voyages([("V1", "ALPHA", 1.5), ("V2", "BRAVO II", 2.5)])
+        updated, changes = merge_current_entity("voyages", new_df, current, "voyage_id", "2026-01-12", "t1", "sha1")
+        expected, expected_changes = reference_merge(
+            "voyages", new_df, current.drop_duplicates(subset=["voyage_id"]), "voyage_id", "2026-01-12", "t1"
+        )
+        pd.testing.assert_frame_equal(updated.astype(str), expected.astype(str))
+        pd.testing.assert_frame_equal(changes.astype(str), expected_changes.astype(str))
+        self.assertEqual(updated["voyage_id"].tolist().count("V2"), 1)
+        self.assertEqual(list(changes["voyage_id"]).count("V2"), 1)
+
+
+class RowHashTests(unittest.TestCase):
+    def hashes(self, values: list, fmt: str, dtype: object = object) -> list:
+        return build_row_hash(pd.DataFrame({"v": pd.Series(values, dtype=dtype)}), ["v"], fmt).tolist()
+
+    def test_format_prefixes_and_widths(self) -> None:
+        df = FIRST.copy()
+        sha1 = build_row_hash(df, list(df.columns), "sha1")
+        x64 = build_row_hash(df, list(df.columns), "x64")
+        x128 = build_row_hash(df, list(df.columns), "x128")
+        self.assertTrue(all(len(h) == 40 and row_hash_format(h) == "sha1" for h in sha1))
+        self.assertTrue(all(h.startswith("x64:") and len(h) == 20 and row_hash_format(h) == "x64" for h in x64))
+        self.assertTrue(all(h.startswith("x128:") and len(h) == 37 and row_hash_format(h) == "x128" for h in x128))
+        self.assertEqual([h[5:21] for h in x128], [h[4:] for h in x64])
+        self.assertEqual(x64.nunique(), len(df))
+
+    def test_date_text_hashes_like_timestamps(self) -> None:
+        stamps = [pd.Timestamp("2026-01-05 10:00"), pd.Timestamp("2026-01-06"), None]
+        # sha1 canonicalised dates per cell (and writes a missing timestamp as "NaT"); x64/x128 must agree on dates.
+        self.assertEqual(self.hashes(["2026-01-05 10:00", "2026-01-06"], "sha1"), self.hashes(stamps[:2], "sha1", "datetime64[ns]"))
+        for fmt in ("x64", "x128"):
+            expected = self.hashes(stamps, fmt, "datetime64[ns]")
+            self.assertEqual(self.hashes(["2026-01-05 10:00", "2026-01-06", None], fmt), expected, fmt)
+            self.assertEqual(self.hashes(["2026-01-05 10:00:00", " 2026-01-06 00:00:00", ""], fmt, "string"), expected, fmt)
+            self.assertEqual(self.hashes([stamps[0], "2026-01-06", None], fmt), expected, fmt)
+
+    def test_mixed_offset_text_hashes_by_wall_clock(self) -> None:
+        expected = self.hashes([pd.Timestamp("2026-01-05 10:00"), pd.Timestamp("2026-01-05 10:00")], "x64", "datetime64[ns]")
+        self.assertEqual(self.hashes(["2026-01-05T10:00:00+08:00", "2026-01-05T10:00:00Z"], "x64"), expected)
+
+    def test_partial_dates_and_codes_stay_text(self) -> None:
+        self.assertNotEqual(
+            self.hashes(["2026-01-05", "TBA"], "x64")[0],
+            self.hashes([pd.Timestamp("2026-01-05"), None], "x64", "datetime64[ns]")[0],
+        )
+        self.assertNotEqual(self.hashes(["001"], "x64"), self.hashes(["1"], "x64"))
+
+    def test_numbers_hash_the_same_when_a_column_turns_float(self) -> None:
+        self.assertEqual(self.hashes([1, 2], "x64", "int64"), self.hashes([1.0, 2.0], "x64", "float64"))
+        self.assertEqual(self.hashes([1, None], "x64")[0], self.hashes([1.0, float("nan")], "x64", "float64")[0])
+        self.assertNotEqual(self.hashes([1.5], "x64"), self.hashes([2.5], "x64"))
+
+
+def legacy_voyages() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "voyage_id": ["V1", "V2", "V3"],
+            "Vessel": ["ALPHA", "BRAVO", None],
+            "IMO": pd.array([9811000, None, 9777000], dtype="Int64"),
+            "weekNum": pd.array([None, 2, None], dtype="Int64"),
+            "LastDepDtlocCos": pd.to_datetime(["2026-01-05 10:00", None, "2026-01-06 00:00"]),
+            "Teu": [1.5, float("nan"), 3.5],
+        }
+    )
+
+
+class LegacySha1Tests(unittest.TestCase):
+    def test_sha1_matches_baseline_row_formula(self) -> None:
+        df = legacy_voyages()
+        cols = list(df.columns)
+        self.assertEqual(build_row_hash(df, cols, "sha1").tolist(), baseline_row_hash(df, cols).tolist())
+        # Pinned cell strings: nullable NA is "<NA>", NaT is "NaT", NaN and None are empty (numbers read as epoch dates).
+        epoch = "1970-01-01 00:00:00"
+        texts = [
+            f"V1|ALPHA|{epoch}|<NA>|2026-01-05 10:00:00|{epoch}",
+            "V2|BRAVO|<NA>|" + epoch + "|NaT|",
+            f"V3||{epoch}|<NA>|2026-01-06 00:00:00|{epoch}",
+        ]
+        expected = [hashlib.sha1(text.encode("utf-8")).hexdigest() for text in texts]
+        self.assertEqual(build_row_hash(df, cols, "sha1").tolist(), expected)
+
+    def test_unchanged_frame_over_legacy_state_is_quiet(self) -> None:
+        df = legacy_voyages()
+        current, _ = reference_merge("voyages", df, pd.DataFrame(), "voyage_id", "2026-01-05", "t0")
+        updated, changes = merge_current_entity("voyages", df, current, "voyage_id", "2026-01-12", "t1")
+        self.assertTrue(changes.empty)
+        self.assertEqual(updated["_row_hash"].tolist(), current["_row_hash"].tolist())
+        self.assertEqual(set(updated["updated_at"]), {"t0"})
+
+
+class RowHashMigrationTests(unittest.TestCase):
+    def sha1_state(self) -> pd.DataFrame:
+        current, _ = merge_current_entity("voyages", FIRST, pd.DataFrame(), "voyage_id", "2026-01-05", "t0", "sha1")
+        return current
+
+    def test_auto_keeps_stored_format(self) -> None:
+        current = self.sha1_state()
+        self.assertEqual(resolve_row_hash_format("auto", current["_row_hash"]), "sha1")
+        self.assertEqual(resolve_row_hash_format("auto", pd.Series([], dtype=object)), "x64")
+        self.assertEqual(resolve_row_hash_format("x128", current["_row_hash"]), "x128")
+        updated, changes = merge_current_entity("voyages", FIRST, current, "voyage_id", "2026-01-12", "t1")
+        self.assertTrue(changes.empty)
+        self.assertEqual(updated["_row_hash"].tolist(), current["_row_hash"].tolist())
+
+    def test_explicit_format_migrates_without_spurious_updates(self) -> None:
+        current = self.sha1_state()
+        new_df = FIRST.copy()
+        new_df.loc[new_df["voyage_id"] == "V3", "Vessel"] = "CHARLIE II"
+        updated, changes = merge_current_entity("voyages", new_df, current, "voyage_id", "2026-01-12", "t1", "x64")
+        self.assertEqual(list(zip(changes["change_type"], changes["voyage_id"])), [("update", "V3")])
+        self.assertTrue(all(row_hash_format(h) == "x64" for h in updated["_row_hash"]))
+        self.assertEqual(updated["_row_hash"].tolist(), build_row_hash(new_df, list(new_df.columns), "x64").tolist())
+        self.assertEqual(updated.set_index("voyage_id").at["V1", "updated_at"], "t0")
+
+        again, changes = merge_current_entity("voyages", new_df, updated, "voyage_id", "2026-01-19", "t2")
+        self.assertTrue(changes.empty)
+        self.assertEqual(again["_row_hash"].tolist(), updated["_row_hash"].tolist())
+
+
+if __name__ == "__main__":
+    unittest.main()
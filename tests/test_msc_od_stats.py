@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import json
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from capastudy.carriers.msc_od_stats import (  # noqa: E402
+    MAX_RUNS,
+    full_sweep_due,
+    greedy_cover,
+    load_od_stats,
+    pair_coverage,
+    record_run,
+    save_od_stats,
+    select_pairs,
+)
+
+
+NOW = datetime(2026, 1, 10, 12, 0, 0)
+PRIMARY = (("ANTWERP", 1), ("NEW YORK", 2))
+ALTERNATE = (("ANTWERP", 1), ("BALTIMORE", 3))
+SECOND_START = (("ROTTERDAM", 4), ("NEW YORK", 2))
+
+
+def stats_with_runs(services_per_run: list, last_full: datetime = NOW - timedelta(days=1)) -> dict:
+    return {
+        "last_full_sweep": {"SVC": last_full.isoformat(timespec="seconds")},
+        "runs": [{"run_at": NOW.isoformat(), "from_date": "2026-01-01", "services": {"SVC": entry}} for entry in services_per_run],
+    }
+
+
+def observed(calls: list) -> dict:
+    return {"voyages": sorted({call.split("|")[0] for call in calls}), "calls": calls}
+
+
+class GreedyCoverTests(unittest.TestCase):
+    def test_ties_go_to_rule_order(self) -> None:
+        items = {"a": {"x", "y"}, "b": {"x", "y"}}
+        self.assertEqual(greedy_cover(items, ["a", "b"]), ["a"])
+        self.assertEqual(greedy_cover(items, ["b", "a"]), ["b"])
+
+    def test_picks_largest_then_marginal(self) -> None:
+        items = {"a": {"1"}, "b": {"1", "2", "3"}, "c": {"3", "4"}, "d": {"2"}}
+        self.assertEqual(greedy_cover(items, ["a", "b", "c", "d"]), ["b", "c"])
+
+    def test_ignores_labels_outside_order(self) -> None:
+        self.assertEqual(greedy_cover({"a": {"1"}, "z": {"1", "2"}}, ["a"]), ["a"])
+        self.assertEqual(greedy_cover({}, ["a"]), [])
+
+
+class FullSweepDueTests(unittest.TestCase):
+    def test_due_dates(self) -> None:
+        stats = {"last_full_sweep": {"SVC": (NOW - timedelta(days=7)).isoformat(timespec="seconds"), "BAD": "not a date"}}
+        self.assertTrue(full_sweep_due(stats, "SVC", 7, NOW))
+        self.assertFalse(full_sweep_due(stats, "SVC", 7, NOW - timedelta(seconds=1)))
+        self.assertTrue(full_sweep_due(stats, "NEW", 7, NOW))
+        self.assertTrue(full_sweep_due(stats, "BAD", 7, NOW))
+
+    def test_select_pairs_returns_all_when_due(self) -> None:
+        stats = stats_with_runs([{"1>2": observed(["V|1|A"])}], last_full=NOW - timedelta(days=8))
+        selected, reason = select_pairs(stats, "SVC", [PRIMARY, ALTERNATE], window=3, full_sweep_days=7, now=NOW)
+        self.assertEqual(selected, [PRIMARY, ALTERNATE])
+        self.assertEqual(reason, "full sweep due")
+
+
+class SelectPairsTests(unittest.TestCase):
+    def test_keeps_pairs_never_observed(self) -> None:
+        stats = stats_with_runs([{"1>2": observed(["V|1|A", "V|1|B"])}])
+        selected, _ = select_pairs(stats, "SVC", [PRIMARY, ALTERNATE], window=3, full_sweep_days=7, now=NOW)
+        self.assertEqual(selected, [PRIMARY, ALTERNATE])
+
+    def test_drops_observed_pairs_covered_by_earlier_rules(self) -> None:
+        stats = stats_with_runs(
+            [
+                {
+                    "1>2": observed(["V|1|A", "V|1|B"]),
+                    "1>3": observed(["V|1|A"]),
+                    "4>2": observed(["V|1|A", "V|1|B"]),
+                }
+            ]
+        )
+        selected, reason = select_pairs(stats, "SVC", [PRIMARY, ALTERNATE, SECOND_START], window=3, full_sweep_days=7, now=NOW)
+        self.assertEqual(selected, [PRIMARY])
+        self.assertEqual(reason, "set cover over last 1 runs")
+
+    def test_alternate_end_kept_for_extra_calls(self) -> None:
+        stats = stats_with_runs([{"1>2": observed(["V|1|A"]), "1>3": observed(["V|1|A", "V|1|C"])}])
+        selected, _ = select_pairs(stats, "SVC", [PRIMARY, ALTERNATE], window=3, full_sweep_days=7, now=NOW)
+        self.assertEqual(selected, [ALTERNATE])
+
+    def test_window_limits_history_but_not_observed_set(self) -> None:
+        old = {"1>2": observed(["V|1|A"]), "1>3": observed(["V|1|C"])}
+        recent = {"1>2": observed(["V|2|A"]), "1>3": observed([])}
+        stats = stats_with_runs([old, recent])
+        selected, reason = select_pairs(stats, "SVC", [PRIMARY, ALTERNATE], window=1, full_sweep_days=7, now=NOW)
+        self.assertEqual(selected, [PRIMARY])
+        self.assertEqual(reason, "set cover over last 1 runs")
+
+
+class RecordAndSaveTests(unittest.TestCase):
+    def test_record_run_marks_full_sweep_only_for_recorded_services(self) -> None:
+        stats = {"last_full_sweep": {}, "runs": []}
+        coverage = {
+            "SVC": {
+                "1>2": pair_coverage([{"VesselCode": "V", "Voyage": "1"}], [{"VesselCode": "V", "Voyage": "1", "PortName": "A"}]),
+                "1>3": pair_coverage([{"VesselCode": "V", "Voyage": "1"}], []),
+            }
+        }
+        pairs = {"SVC": [PRIMARY, ALTERNATE, SECOND_START]}
+        record_run(stats, pairs, coverage, full_services=["SVC", "OTHER"], from_date="2026-01-01", now=NOW)
+        self.assertEqual(stats["last_full_sweep"], {"SVC": "2026-01-10T12:00:00"})
+        entry = stats["runs"][-1]["services"]["SVC"]
+        self.assertEqual(list(entry), ["1>2", "1>3"])
+        self.assertEqual(entry["1>2"]["marginal_calls"], 1)
+        self.assertEqual(entry["1>2"]["marginal_voyages"], 0)
+        self.assertEqual(entry["1>3"]["calls"], [])
+
+    def test_save_trims_to_max_runs_atomically(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "stats" / "od.json"
+            stats = {"last_full_sweep": {}, "runs": [{"run_at": str(i)} for i in range(MAX_RUNS + 5)]}
+            save_od_stats(stats, path)
+            saved = json.loads(path.read_text(encoding="utf-8"))
+            self.assertEqual([run["run_at"] for run in saved["runs"]], [str(i) for i in range(5, MAX_RUNS + 5)])
+            self.assertEqual(list(path.parent.iterdir()), [path])
+            self.assertEqual(load_od_stats(path), saved)
+
+    def test_load_missing_or_corrupt_file(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "od.json"
+            self.assertEqual(load_od_stats(path), {"last_full_sweep": {}, "runs": []})
+            path.write_text("{", encoding="utf-8")
+            self.assertEqual(load_od_stats(path), {"last_full_sweep": {}, "runs": []})
+
+
+if __name__ == "__main__":
+    unittest.main()
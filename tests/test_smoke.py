@@ -42,6 +42,11 @@ class SmokeTests(unittest.TestCase):
     def test_msk_help(self) -> None:
         self.assert_help_command(str(Path("MSK FETCH") / "MSK_FETCH.py"), "--help", expected="fetch msk")
 
+    def test_csl_shard_options_need_back_mode(self) -> None:
+        result = self.run_command(str(Path("CSL FETCH") / "CSL_FETCH.py"), "--mode", "api", "--shards", "2")
+        self.assertEqual(result.returncode, 2)
+        self.assertIn("--shards only apply to --mode back", result.stderr)
+
 
 if __name__ == "__main__":
     unittest.main()
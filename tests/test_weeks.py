@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import sys
+import unittest
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Optional, Tuple
+
+import pandas as pd
+
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from capastudy.merge_common import excel_weeknum_column, excel_weeknum_type16  # noqa: E402
+from capastudy.timestamps import coerce_timestamp  # noqa: E402
+from capastudy.weeks import WEEK_CALENDAR, WeekCalendar, week_bounds  # noqa: E402
+
+
+def reference_weeknum(value: object) -> Optional[int]:
+    # Excel WEEKNUM type 16 arithmetic that merge_common used before the calendar table.
+    dt = coerce_timestamp(value)
+    if dt is None:
+        return None
+    d = dt.date()
+    jan1 = d.replace(month=1, day=1)
+    week1_start = jan1 - timedelta(days=(jan1.weekday() - 5) % 7)
+    return ((d - week1_start).days // 7) + 1
+
+
+def reference_week_bounds(reference_date: date) -> Tuple[date, date]:
+    # Saturday-start week arithmetic that msk_fetch.build_query_window used before week_bounds.
+    start = reference_date - timedelta(days=(reference_date.weekday() - 5) % 7)
+    return start, start + timedelta(days=6)
+
+
+def as_optional_ints(series: pd.Series) -> list:
+    return [None if pd.isna(value) else int(value) for value in series]
+
+
+class WeekCalendarTests(unittest.TestCase):
+    def test_every_day_1990_to_2060_matches_reference(self) -> None:
+        days = pd.Series(pd.date_range("1990-01-01", "2060-12-31", freq="D"))
+        calendar = WeekCalendar()
+        got = as_optional_ints(calendar.week_numbers(days))
+        self.assertEqual(got, [reference_weeknum(day) for day in days])
+        self.assertEqual((calendar.first_year, calendar.last_year), (1990, 2060))
+
+    def test_out_of_horizon_years_rebuild_the_table(self) -> None:
+        calendar = WeekCalendar(2015, 2035)
+        self.assertEqual(calendar.week_of("1999-12-31 23:00"), (reference_weeknum("1999-12-31"), date(1999, 12, 25), date(1999, 12, 31)))
+        self.assertEqual((calendar.first_year, calendar.last_year), (1999, 2035))
+        self.assertEqual(calendar.week_of(datetime(2061, 1, 1))[0], reference_weeknum("2061-01-01"))
+        self.assertEqual((calendar.first_year, calendar.last_year), (1999, 2061))
+        self.assertIsNone(calendar.week_of(None))
+        self.assertIsNone(calendar.week_of("not a date"))
+
+    def test_column_matches_reference_for_text_and_invalid_cells(self) -> None:
+        values = pd.Series(["2026-01-02 23:59", "2026-01-03 00:00", None, "not a date", "", "1980-12-31", "2070-01-01 08:00"], dtype=object)
+        expected = [reference_weeknum(value) for value in values]
+        self.assertEqual(as_optional_ints(excel_weeknum_column(values)), expected)
+        self.assertEqual([excel_weeknum_type16(value) for value in values], expected)
+        self.assertEqual(str(excel_weeknum_column(values).dtype), "Int64")
+
+    def test_tz_aware_and_mixed_offset_columns_use_wall_clock_dates(self) -> None:
+        single_zone = pd.Series(["2026-01-02T23:30:00Z", "2026-01-03T00:30:00Z"], dtype=object)
+        mixed = pd.Series(["2026-01-02T23:30:00-05:00", "2026-01-03T00:30:00+08:00", "2025-12-31T22:00:00Z", None, "bad"], dtype=object)
+        localized = pd.Series(pd.to_datetime(["2026-01-02 23:30", "2026-01-03 00:30"]).tz_localize("Asia/Shanghai"))
+        for values in (single_zone, mixed, localized):
+            self.assertEqual(as_optional_ints(excel_weeknum_column(values)), [reference_weeknum(value) for value in values])
+        self.assertEqual(as_optional_ints(excel_weeknum_column(mixed))[:3], [1, 2, 53])
+
+    def test_index_is_preserved(self) -> None:
+        values = pd.Series(["2026-01-03", None], index=[7, 3], dtype=object)
+        result = excel_weeknum_column(values)
+        self.assertEqual(list(result.index), [7, 3])
+        self.assertIsNone(result.name)
+
+
+class WeekBoundsTests(unittest.TestCase):
+    def test_matches_reference_2020_to_2030(self) -> None:
+        days = pd.Series(pd.date_range("2020-01-01", "2030-12-31", freq="D"))
+        table = WeekCalendar().lookup(days)
+        got = list(zip(table["week_start"].dt.date, table["week_end"].dt.date))
+        self.assertEqual(got, [reference_week_bounds(day.date()) for day in days])
+        day = date(2025, 12, 1)
+        while day <= date(2027, 1, 31):
+            self.assertEqual(week_bounds(day), reference_week_bounds(day), day)
+            day += timedelta(days=1)
+
+    def test_accepts_datetimes_and_spans_year_end(self) -> None:
+        self.assertEqual(week_bounds(datetime(2026, 1, 2, 23, 59)), (date(2025, 12, 27), date(2026, 1, 2)))
+        self.assertEqual(week_bounds(date(2026, 1, 3)), (date(2026, 1, 3), date(2026, 1, 9)))
+        self.assertEqual(week_bounds(date(1985, 6, 15)), reference_week_bounds(date(1985, 6, 15)))
+        self.assertLessEqual(WEEK_CALENDAR.first_year, 1985)
+
+    def test_msk_query_window(self) -> None:
+        from capastudy.carriers.msk_fetch import build_query_window
+
+        for reference_date in (date(2026, 1, 2), date(2026, 1, 3), date(2028, 2, 29)):
+            start, end = reference_week_bounds(reference_date)
+            expected = (start - timedelta(weeks=8), end + timedelta(weeks=12), start, end)
+            self.assertEqual(build_query_window(reference_date), tuple(d.isoformat() for d in expected))
+
+
+if __name__ == "__main__":
+    unittest.main()